@@ -0,0 +1,29 @@
+"""Added chat leases table
+
+Revision ID: 06d20bc62eee
+Revises: 996a56a4db9e
+Create Date: 2026-10-19 19:07:58.812883
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '06d20bc62eee'
+down_revision = '996a56a4db9e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('chat_leases',
+                    sa.Column('peer_id', sa.BigInteger(), autoincrement=False, nullable=False),
+                    sa.Column('owner', sa.String(), nullable=False),
+                    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+                    sa.PrimaryKeyConstraint('peer_id')
+                    )
+
+
+def downgrade() -> None:
+    op.drop_table('chat_leases')
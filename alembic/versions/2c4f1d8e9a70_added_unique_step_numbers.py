@@ -0,0 +1,32 @@
+"""Added unique step numbers
+
+Revision ID: 2c4f1d8e9a70
+Revises: 9381f13466bd
+Create Date: 2026-10-19 20:41:09.518342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c4f1d8e9a70'
+down_revision = '9381f13466bd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Одновременные вступления могли занять одно место в очереди: очередь нумеруется заново,
+    # при равных местах раньше идёт тот, кто записан раньше
+    op.execute(
+        "UPDATE step_orders s SET step_number = d.step_number "
+        "FROM (SELECT id, row_number() OVER (PARTITION BY game_id ORDER BY step_number, id) AS step_number "
+        "FROM step_orders) d "
+        "WHERE s.id = d.id AND s.step_number <> d.step_number"
+    )
+    op.create_index('ix_step_orders_game_step', 'step_orders', ['game_id', 'step_number'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_step_orders_game_step', table_name='step_orders')
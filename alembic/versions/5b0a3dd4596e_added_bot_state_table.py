@@ -0,0 +1,28 @@
+"""Added bot state table
+
+Revision ID: 5b0a3dd4596e
+Revises: a7cfe60651b4
+Create Date: 2026-10-19 18:48:32.560813
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0a3dd4596e'
+down_revision = 'a7cfe60651b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('bot_state',
+                    sa.Column('key', sa.String(), nullable=False),
+                    sa.Column('value', sa.String(), nullable=False),
+                    sa.PrimaryKeyConstraint('key')
+                    )
+
+
+def downgrade() -> None:
+    op.drop_table('bot_state')
@@ -0,0 +1,36 @@
+"""Added game events table
+
+Revision ID: 5ec681b67da7
+Revises: b8d2f6a41c93
+Create Date: 2026-10-19 19:14:16.139824
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5ec681b67da7'
+down_revision = 'b8d2f6a41c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('game_events',
+                    sa.Column('id', sa.BigInteger(), nullable=False),
+                    sa.Column('game_id', sa.Integer(), nullable=False),
+                    sa.Column('peer_id', sa.BigInteger(), nullable=False),
+                    sa.Column('kind', sa.String(), nullable=False),
+                    sa.Column('vk_id', sa.BigInteger(), nullable=True),
+                    sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), server_default='{}', nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_game_events_game_id', 'game_events', ['game_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_game_events_game_id', table_name='game_events')
+    op.drop_table('game_events')
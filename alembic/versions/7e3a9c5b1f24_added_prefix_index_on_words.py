@@ -0,0 +1,25 @@
+"""Added prefix index on words
+
+Revision ID: 7e3a9c5b1f24
+Revises: 2c4f1d8e9a70
+Create Date: 2026-10-19 20:58:33.107245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3a9c5b1f24'
+down_revision = '2c4f1d8e9a70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_words_key_prefix', 'words', ['key'], unique=False,
+                    postgresql_ops={'key': 'text_pattern_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_words_key_prefix', table_name='words')
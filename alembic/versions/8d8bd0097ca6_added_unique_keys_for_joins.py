@@ -0,0 +1,46 @@
+"""Added unique keys for joins
+
+Revision ID: 8d8bd0097ca6
+Revises: 5b0a3dd4596e
+Create Date: 2026-10-19 19:02:27.252280
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d8bd0097ca6'
+down_revision = '5b0a3dd4596e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Повторы могли появиться из-за гонок при вступлении: у игрока остаётся первая запись,
+    # у чата - первая игра (она же находилась по peer_id), в очереди - первое место игрока
+    op.execute(
+        "UPDATE step_orders s SET user_id = d.keep "
+        "FROM (SELECT id, min(id) OVER (PARTITION BY vk_id) AS keep FROM users) d "
+        "WHERE s.user_id = d.id AND d.id <> d.keep"
+    )
+    op.execute(
+        "UPDATE scores s SET user_id = d.keep "
+        "FROM (SELECT id, min(id) OVER (PARTITION BY vk_id) AS keep FROM users) d "
+        "WHERE s.user_id = d.id AND d.id <> d.keep"
+    )
+    op.execute("DELETE FROM users u USING users k WHERE u.vk_id = k.vk_id AND u.id > k.id")
+    op.execute("DELETE FROM games g USING games k WHERE g.peer_id = k.peer_id AND g.id > k.id")
+    op.execute(
+        "DELETE FROM step_orders s USING step_orders k "
+        "WHERE s.game_id = k.game_id AND s.user_id = k.user_id AND s.id > k.id"
+    )
+    op.create_unique_constraint('users_vk_id_key', 'users', ['vk_id'])
+    op.create_unique_constraint('games_peer_id_key', 'games', ['peer_id'])
+    op.create_index('ix_step_orders_game_user', 'step_orders', ['game_id', 'user_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_step_orders_game_user', table_name='step_orders')
+    op.drop_constraint('games_peer_id_key', 'games', type_='unique')
+    op.drop_constraint('users_vk_id_key', 'users', type_='unique')
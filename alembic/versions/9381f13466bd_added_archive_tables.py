@@ -0,0 +1,49 @@
+"""Added archive tables
+
+Revision ID: 9381f13466bd
+Revises: 06d20bc62eee
+Create Date: 2026-10-19 19:12:01.754758
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9381f13466bd'
+down_revision = '06d20bc62eee'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('games_archive',
+                    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('peer_id', sa.BigInteger(), nullable=False),
+                    sa.Column('status', sa.String(), nullable=True),
+                    sa.Column('start_time', sa.DateTime(), nullable=True),
+                    sa.Column('end_time', sa.DateTime(), nullable=True),
+                    sa.Column('word_id', sa.Integer(), nullable=True),
+                    sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_games_archive_peer_id'), 'games_archive', ['peer_id'], unique=False)
+    op.create_table('step_orders_archive',
+                    sa.Column('game_id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('step_number', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('game_id', 'user_id')
+                    )
+    op.create_table('score_totals_archive',
+                    sa.Column('game_id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('total', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('game_id', 'user_id')
+                    )
+
+
+def downgrade() -> None:
+    op.drop_table('score_totals_archive')
+    op.drop_table('step_orders_archive')
+    op.drop_index(op.f('ix_games_archive_peer_id'), table_name='games_archive')
+    op.drop_table('games_archive')
@@ -0,0 +1,29 @@
+"""Added trigram indexes on words
+
+Revision ID: 961f43c62f5f
+Revises: 3b2eb681e837
+Create Date: 2026-10-19 18:40:45.824374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '961f43c62f5f'
+down_revision = '3b2eb681e837'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_words_key_trgm', 'words', ['key'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'key': 'gin_trgm_ops'})
+    op.create_index('ix_words_desc_trgm', 'words', ['desc'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'desc': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_words_desc_trgm', table_name='words')
+    op.drop_index('ix_words_key_trgm', table_name='words')
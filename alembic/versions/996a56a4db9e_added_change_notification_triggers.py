@@ -0,0 +1,87 @@
+"""Added change notification triggers
+
+Revision ID: 996a56a4db9e
+Revises: 8d8bd0097ca6
+Create Date: 2026-10-19 19:05:01.743846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '996a56a4db9e'
+down_revision = '8d8bd0097ca6'
+branch_labels = None
+depends_on = None
+
+
+# Уведомления на уровне оператора: одно на UPDATE, сколько бы строк он ни затронул,
+# и ни одного, если строк не затронуто (например, у CAS с устаревшей version).
+# Ключи изменённых строк перечисляются, только пока их не больше NOTIFY_MAX_ROWS,
+# иначе приходит null и подписчики сбрасывают кэш целиком.
+NOTIFY_MAX_ROWS = 100
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE FUNCTION notify_games_changed() RETURNS trigger AS $$
+        DECLARE
+            changed_games json;
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM changed) THEN
+                RETURN NULL;
+            END IF;
+            SELECT CASE WHEN count(*) <= {limit} THEN json_agg(json_build_array(peer_id, version)) END
+            INTO changed_games
+            FROM (SELECT peer_id, version FROM changed LIMIT {limit} + 1) t;
+            PERFORM pg_notify('game_changes', json_build_object(
+                'origin', current_setting('application_name'),
+                'op', TG_OP,
+                'games', changed_games
+            )::text);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """.format(limit=NOTIFY_MAX_ROWS))
+    for event, table in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        op.execute(
+            "CREATE TRIGGER games_notify_{event} AFTER {event} ON games "
+            "REFERENCING {table} TABLE AS changed "
+            "FOR EACH STATEMENT EXECUTE FUNCTION notify_games_changed()".format(event=event.lower(), table=table)
+        )
+
+    op.execute("""
+        CREATE FUNCTION notify_words_changed() RETURNS trigger AS $$
+        DECLARE
+            changed_ids json;
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM changed) THEN
+                RETURN NULL;
+            END IF;
+            SELECT CASE WHEN count(*) <= {limit} THEN json_agg(id) END
+            INTO changed_ids
+            FROM (SELECT id FROM changed LIMIT {limit} + 1) t;
+            PERFORM pg_notify('word_changes', json_build_object(
+                'origin', current_setting('application_name'),
+                'op', TG_OP,
+                'ids', changed_ids
+            )::text);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """.format(limit=NOTIFY_MAX_ROWS))
+    for event, table in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        op.execute(
+            "CREATE TRIGGER words_notify_{event} AFTER {event} ON words "
+            "REFERENCING {table} TABLE AS changed "
+            "FOR EACH STATEMENT EXECUTE FUNCTION notify_words_changed()".format(event=event.lower(), table=table)
+        )
+
+
+def downgrade() -> None:
+    for event in ("insert", "update", "delete"):
+        op.execute("DROP TRIGGER words_notify_{} ON words".format(event))
+        op.execute("DROP TRIGGER games_notify_{} ON games".format(event))
+    op.execute("DROP FUNCTION notify_words_changed()")
+    op.execute("DROP FUNCTION notify_games_changed()")
@@ -0,0 +1,24 @@
+"""Added version to games
+
+Revision ID: a7cfe60651b4
+Revises: e1e856dfeac2
+Create Date: 2026-10-19 18:47:01.507198
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7cfe60651b4'
+down_revision = 'e1e856dfeac2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('games', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('games', 'version')
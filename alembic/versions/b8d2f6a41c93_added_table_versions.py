@@ -0,0 +1,50 @@
+"""Added table versions
+
+Revision ID: b8d2f6a41c93
+Revises: 7e3a9c5b1f24
+Create Date: 2026-10-19 21:17:52.640918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d2f6a41c93'
+down_revision = '7e3a9c5b1f24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('table_versions',
+                    sa.Column('name', sa.String(), nullable=False),
+                    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+                    sa.PrimaryKeyConstraint('name')
+                    )
+    op.execute("INSERT INTO table_versions (name, version) VALUES ('words', 0)")
+    # Версия меняется в той же транзакции, что и слова: до коммита её не видно, как и самих изменений.
+    # Оператор, не затронувший строк (вставка уже существующих слов), версию не трогает
+    op.execute("""
+        CREATE FUNCTION bump_words_version() RETURNS trigger AS $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM changed) THEN
+                UPDATE table_versions SET version = version + 1 WHERE name = 'words';
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for event, table in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        op.execute(
+            "CREATE TRIGGER words_version_{event} AFTER {event} ON words "
+            "REFERENCING {table} TABLE AS changed "
+            "FOR EACH STATEMENT EXECUTE FUNCTION bump_words_version()".format(event=event.lower(), table=table)
+        )
+
+
+def downgrade() -> None:
+    for event in ("insert", "update", "delete"):
+        op.execute("DROP TRIGGER words_version_{} ON words".format(event))
+    op.execute("DROP FUNCTION bump_words_version()")
+    op.drop_table('table_versions')
@@ -0,0 +1,28 @@
+"""Added peer marks table
+
+Revision ID: e1e856dfeac2
+Revises: 961f43c62f5f
+Create Date: 2026-10-19 18:45:22.303594
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1e856dfeac2'
+down_revision = '961f43c62f5f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('peer_marks',
+                    sa.Column('peer_id', sa.BigInteger(), autoincrement=False, nullable=False),
+                    sa.Column('message_id', sa.BigInteger(), nullable=False),
+                    sa.PrimaryKeyConstraint('peer_id')
+                    )
+
+
+def downgrade() -> None:
+    op.drop_table('peer_marks')
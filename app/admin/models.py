@@ -4,7 +4,8 @@ from sqlalchemy import (
     Column,
     Integer,
     Text,
-    Boolean
+    Boolean,
+    Index
 )
 
 from app.store.database.sqlalchemy_base import db
@@ -26,5 +27,13 @@ class WordModel(db):
     desc = Column(Text, nullable=False)
     is_used = Column(Boolean, default=False)
 
+    # Триграммные индексы для поиска похожих слов (pg_trgm), btree - для поиска по префиксу ключа:
+    # по одной-двум буквам триграммный индекс отбирает почти весь словарь
+    __table_args__ = (
+        Index("ix_words_key_trgm", "key", postgresql_using="gin", postgresql_ops={"key": "gin_trgm_ops"}),
+        Index("ix_words_desc_trgm", "desc", postgresql_using="gin", postgresql_ops={"desc": "gin_trgm_ops"}),
+        Index("ix_words_key_prefix", "key", postgresql_ops={"key": "text_pattern_ops"}),
+    )
+
     def __str__(self):
         return "{} ({})".format(self.desc, self.key)
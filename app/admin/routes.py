@@ -7,7 +7,9 @@ if typing.TYPE_CHECKING:
 
 
 def setup_routes(app: Application):
-    from app.admin.views import WordAddView, WordListView
+    from app.admin.views import WordAddView, WordListView, WordImportView, WordSearchView
 
     app.router.add_view("/admin.add_word", WordAddView)
     app.router.add_view("/admin.words", WordListView)
+    app.router.add_view("/admin.import_words", WordImportView)
+    app.router.add_view("/admin.search_words", WordSearchView)
@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, pre_load, validate
 
 
 class WordSchema(Schema):
@@ -10,3 +10,38 @@ class WordSchema(Schema):
 
 class WordsListSchema(Schema):
     words = fields.Nested(WordSchema, many=True)
+    next_after_id = fields.Integer(allow_none=True)
+
+
+class WordListQuerySchema(Schema):
+    after_id = fields.Integer(load_default=0, validate=validate.Range(min=0))
+    limit = fields.Integer(load_default=100, validate=validate.Range(min=1, max=1000))
+    is_used = fields.Boolean(load_default=None, allow_none=True)
+    prefix = fields.String(load_default=None)
+    export = fields.Boolean(load_default=False)
+
+
+class WordSearchQuerySchema(Schema):
+    q = fields.String(required=True, validate=validate.Length(min=1, max=200))
+    limit = fields.Integer(load_default=20, validate=validate.Range(min=1, max=100))
+
+    @pre_load
+    def strip_query(self, data, **kwargs):
+        # Длина проверяется уже без пробелов: q из одних пробелов искал бы все слова
+        if isinstance(data.get("q"), str):
+            data = dict(data, q=data["q"].strip())
+        return data
+
+
+class WordSearchHitSchema(WordSchema):
+    score = fields.Float()
+
+
+class WordSearchResultSchema(Schema):
+    words = fields.Nested(WordSearchHitSchema, many=True)
+
+
+class WordImportResultSchema(Schema):
+    inserted = fields.Integer()
+    duplicates = fields.Integer()
+    invalid = fields.Integer()
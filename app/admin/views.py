@@ -1,13 +1,26 @@
-from aiohttp.web_exceptions import HTTPConflict
-from aiohttp.web_response import json_response
+from dataclasses import asdict
 
-from app.admin.schemas import WordSchema, WordsListSchema
+from aiohttp.web_exceptions import HTTPConflict, HTTPBadRequest, HTTPNotModified
+from aiohttp.web_response import Response, StreamResponse
+from marshmallow import ValidationError
+
+from app.admin.schemas import (
+    WordSchema,
+    WordsListSchema,
+    WordImportResultSchema,
+    WordListQuerySchema,
+    WordSearchQuerySchema,
+    WordSearchResultSchema,
+)
+from app.admin.word_import import IMPORT_BATCH_SIZE, import_format, read_rows
+from app.base.json_codec import dumps, dumps_bytes, loads
 from app.web.app import View
+from app.web.utils import etag_matches, json_response
 
 
 class WordAddView(View):
     async def post(self):
-        data = await self.request.json()
+        data = await self.request.json(loads=loads)
         word = await self.store.admins.get_word_by_key(data["key"])
         if word:
             raise HTTPConflict(reason="The given word is already exist")
@@ -16,7 +29,86 @@ class WordAddView(View):
             return json_response(data=WordSchema().dump(word))
 
 
+class WordImportView(View):
+    async def post(self):
+        fmt = import_format(self.request.content_type, self.request.query.get("format"))
+        result = {"inserted": 0, "duplicates": 0, "invalid": 0}
+        batch = {}
+
+        async def flush():
+            inserted = await self.store.admins.create_words(
+                [{"key": key, "desc": desc} for key, desc in batch.items()]
+            )
+            result["inserted"] += inserted
+            result["duplicates"] += len(batch) - inserted
+            batch.clear()
+
+        # Тело читается потоком, в памяти не больше одной пачки
+        async for row in read_rows(self.request.content, fmt):
+            if row is None:
+                result["invalid"] += 1
+                continue
+            key, desc = row
+            if key in batch:
+                result["duplicates"] += 1
+                continue
+            batch[key] = desc
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await flush()
+        if batch:
+            await flush()
+        return json_response(data=WordImportResultSchema().dump(result))
+
+
+class WordSearchView(View):
+    async def get(self):
+        try:
+            params = WordSearchQuerySchema().load(self.request.query)
+        except ValidationError as err:
+            raise HTTPBadRequest(text=dumps(err.messages), content_type="application/json")
+        hits = await self.store.admins.search_words(params["q"], params["limit"])
+        words = [dict(asdict(word), score=score) for word, score in hits]
+        return json_response(data=WordSearchResultSchema().dump({"words": words}))
+
+
 class WordListView(View):
     async def get(self):
-        words = await self.store.admins.list_words()
-        return json_response(data=WordsListSchema().dump({"words": words}))
+        try:
+            params = WordListQuerySchema().load(self.request.query)
+        except ValidationError as err:
+            raise HTTPBadRequest(text=dumps(err.messages), content_type="application/json")
+        if params.pop("export"):
+            return await self.export(params["is_used"], params["prefix"])
+
+        # Пока слова не менялись, ни запроса в базу, ни сериализации.
+        # Версия читается до слов: выборка бывает новее своего ETag, но не старше
+        admins = self.store.admins
+        version = await admins.current_version()
+        etag = admins.etag(version)
+        if etag_matches(self.request.headers.get("If-None-Match"), etag):
+            raise HTTPNotModified(headers={"ETag": etag})
+        key = (version, *sorted(params.items()))
+        body = admins.list_cache.get(key)
+        if body is None:
+            words = await admins.list_words(**params)
+            next_after_id = words[-1].id if len(words) == params["limit"] else None
+            body = dumps_bytes(WordsListSchema().dump({"words": words, "next_after_id": next_after_id}))
+            admins.cache_list(key, body)
+        return Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+    # Полная выгрузка: {"words": [...]} отдаётся по частям, не собирая весь список в памяти
+    async def export(self, is_used, prefix):
+        response = StreamResponse(headers={"Content-Type": "application/json"})
+        response.enable_chunked_encoding()
+        await response.prepare(self.request)
+        await response.write(b'{"words": [')
+        schema = WordSchema(many=True)
+        first = True
+        async for words in self.store.admins.stream_words(is_used=is_used, prefix=prefix):
+            chunk = dumps_bytes(schema.dump(words))[1:-1]
+            if chunk:
+                await response.write(chunk if first else b"," + chunk)
+                first = False
+        await response.write(b"]}")
+        await response.write_eof()
+        return response
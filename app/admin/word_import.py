@@ -0,0 +1,134 @@
+import codecs
+import csv
+from collections import deque
+from typing import AsyncIterable, AsyncIterator, Optional
+
+from app.base.json_codec import loads
+
+IMPORT_BATCH_SIZE = 1000
+# Запись CSV с незакрытой кавычкой иначе копила бы в памяти всё тело до конца
+MAX_CSV_RECORD = 64 * 1024
+
+NDJSON = "ndjson"
+CSV = "csv"
+
+# Запись, которую не удалось прочитать: не UTF-8, битый JSON или незакрытая кавычка
+_INVALID = object()
+
+
+class InvalidRow(Exception):
+    pass
+
+
+def import_format(content_type: str, requested: Optional[str] = None) -> str:
+    if requested in (NDJSON, CSV):
+        return requested
+    return CSV if content_type in ("text/csv", "application/csv") else NDJSON
+
+
+class _Lines:
+    """Очередь строк для csv.reader: он забирает их, только когда запись уже целиком пришла."""
+
+    def __init__(self):
+        self.lines: deque = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def read_rows(content: AsyncIterable[bytes], fmt: str) -> AsyncIterator[Optional[tuple[str, str]]]:
+    """Записи загрузки по мере чтения тела: (key, desc) или None для невалидной.
+
+    Пустые строки и заголовок CSV пропускаются.
+    """
+    records = _csv_records(content) if fmt == CSV else _ndjson_records(content)
+    async for record in records:
+        try:
+            row = parse_record(record, fmt)
+        except InvalidRow:
+            yield None
+            continue
+        if row is not None:
+            yield row
+
+
+async def _ndjson_records(content: AsyncIterable[bytes]) -> AsyncIterator:
+    async for line in content:
+        try:
+            text = line.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            yield _INVALID
+            continue
+        if text:
+            try:
+                yield loads(text)
+            except ValueError:
+                yield _INVALID
+
+
+async def _csv_records(content: AsyncIterable[bytes]) -> AsyncIterator:
+    # Один csv.reader на всё тело: поле в кавычках переносит строку, поэтому текст
+    # копится, пока не кончится строка с закрытыми кавычками, и только тогда отдаётся reader'у
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    lines = _Lines()
+    reader = csv.reader(lines)
+    pending = []
+    size = quotes = 0
+    async for chunk in content:
+        try:
+            text = decoder.decode(chunk)
+        except UnicodeDecodeError:
+            decoder.reset()
+            pending.clear()
+            size = quotes = 0
+            yield _INVALID
+            continue
+        pending.append(text)
+        size += len(text)
+        quotes += text.count('"')
+        if text.endswith("\n") and not quotes % 2:
+            lines.lines.extend(pending)
+            for row in reader:
+                yield row
+        elif size > MAX_CSV_RECORD:
+            yield _INVALID
+        else:
+            continue
+        pending.clear()
+        size = quotes = 0
+    try:
+        pending.append(decoder.decode(b"", final=True))
+    except UnicodeDecodeError:
+        yield _INVALID
+        return
+    if quotes % 2:
+        yield _INVALID
+    elif any(pending):
+        # Последняя строка без перевода строки
+        lines.lines.extend(pending)
+        for row in reader:
+            yield row
+
+
+def parse_record(record, fmt: str) -> Optional[tuple[str, str]]:
+    """Запись загрузки -> (key, desc); None для пустой строки и заголовка CSV."""
+    if record is _INVALID:
+        raise InvalidRow
+    if fmt == CSV:
+        if not record or record == ["key", "desc"]:
+            return None
+        if len(record) != 2:
+            raise InvalidRow
+        key, desc = record
+    else:
+        if not isinstance(record, dict):
+            raise InvalidRow
+        key, desc = record.get("key"), record.get("desc")
+    if not isinstance(key, str) or not isinstance(desc, str) or not key.strip() or not desc.strip():
+        raise InvalidRow
+    return key.strip(), desc.strip()
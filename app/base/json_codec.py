@@ -0,0 +1,24 @@
+"""JSON для ответов VK и админских ответов: orjson, если установлен, иначе stdlib json."""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+else:
+    loads = json.loads
+
+    def dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps_bytes(obj) -> bytes:
+        return dumps(obj).encode()
@@ -0,0 +1,69 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+# Максимум запросов к базе и вызовов VK API на одну команду.
+# Команда с ветвлениями оценивается по самой дорогой ветке.
+BUDGETS = {
+    "/играть": (3, 2),
+    "/начать": (4, 1),
+    "/буква": (9, 5),
+    "/слово": (9, 5),
+    "/завершить": (4, 4),
+    "turn_timeout": (3, 2),
+    "other": (0, 1),
+}
+
+
+@dataclass
+class UpdateStats:
+    command: str
+    queries: int = 0
+    vk_calls: int = 0
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+_current_stats: ContextVar[Optional[UpdateStats]] = ContextVar("current_update_stats", default=None)
+
+
+@contextmanager
+def collect_update_stats(command: str):
+    stats = UpdateStats(command=command)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def count_query(*_):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+
+
+def count_vk_call():
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.vk_calls += 1
+
+
+def over_budget(stats: UpdateStats) -> bool:
+    budget = BUDGETS.get(stats.command)
+    if budget is None:
+        return False
+    max_queries, max_vk_calls = budget
+    return stats.queries > max_queries or stats.vk_calls > max_vk_calls
+
+
+def check_budget(stats: UpdateStats):
+    if over_budget(stats):
+        raise BudgetExceeded(
+            "{}: {} queries, {} VK calls, budget is {} / {}".format(
+                stats.command, stats.queries, stats.vk_calls, *BUDGETS[stats.command]
+            )
+        )
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import typing
+import weakref
+from asyncio import Task
+from collections import deque
+from typing import Optional
+from weakref import WeakKeyDictionary, WeakSet
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+    from app.web.config import MonitorConfig
+
+
+def task_name(task: Task) -> str:
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or repr(coro)
+
+
+def innermost_coro(task: Task):
+    """Корутина, на await которой задача сейчас стоит."""
+    coro = task.get_coro()
+    while hasattr(getattr(coro, "cr_await", None), "cr_await"):
+        coro = coro.cr_await
+    return coro
+
+
+def task_location(task: Task) -> Optional[str]:
+    stack = task.get_stack(limit=1)
+    if stack:
+        frame = stack[-1]
+        return "{}:{}".format(frame.f_code.co_filename, frame.f_lineno)
+
+
+class LoopMonitor:
+    """Задержка цикла событий и задачи, которые перестали продвигаться.
+
+    Задача считается зависшей, если между проверками она всё время стоит
+    на одном и том же await одной и той же корутины. Долгоживущие циклы,
+    которые засыпают и просыпаются, зависшими не считаются: на каждом
+    витке они ждут в новой корутине. Задачи, которые законно ждут
+    бесконечно (очередь, соединение LISTEN), регистрируются через register_idle.
+    """
+
+    def __init__(self, app: "Application", config: "MonitorConfig"):
+        self.app = app
+        self.config = config
+        self.logger = logging.getLogger("loop_monitor")
+        self.lag_samples: deque[float] = deque(maxlen=config.history)
+        self.max_lag = 0.0
+        self._task: Optional[Task] = None
+        self._first_seen: "WeakKeyDictionary[Task, float]" = WeakKeyDictionary()
+        # Задача -> (корутина, где стоит, позиция в ней, с какого времени)
+        self._progress: "WeakKeyDictionary[Task, tuple[weakref.ref, int, float]]" = WeakKeyDictionary()
+        self._reported: "WeakSet[Task]" = WeakSet()
+        self._idle: "WeakSet[Task]" = WeakSet()
+        if config.enabled:
+            app.on_startup.append(self.start)
+            app.on_cleanup.append(self.stop)
+
+    async def start(self, app: "Application"):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, app: "Application"):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.config.interval
+            await asyncio.sleep(self.config.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lag_samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.config.lag_threshold:
+                self.logger.warning("Event loop lag %.3fs", lag)
+            self._scan_tasks(loop.time())
+
+    def register_idle(self, task: Task):
+        """Задача может ждать сколько угодно долго, это не зависание."""
+        self._idle.add(task)
+
+    def _ignored(self, task: Task) -> bool:
+        return task in self._idle or task_name(task) in self.config.ignore
+
+    def _stalled_for(self, task: Task, now: float) -> float:
+        """Сколько секунд задача стоит на одном месте."""
+        progress = self._progress.get(task)
+        return now - progress[2] if progress else 0.0
+
+    def _scan_tasks(self, now: float):
+        current = asyncio.current_task()
+        for task in asyncio.all_tasks():
+            if task is self._task or task is current or task.done():
+                continue
+            self._first_seen.setdefault(task, now)
+            coro = innermost_coro(task)
+            frame = getattr(coro, "cr_frame", None)
+            position = frame.f_lasti if frame is not None else -1
+            progress = self._progress.get(task)
+            if progress is None or progress[0]() is not coro or progress[1] != position:
+                try:
+                    self._progress[task] = (weakref.ref(coro), position, now)
+                except TypeError:
+                    # Не корутина (например, генератор без поддержки weakref) - отслеживать нечего
+                    self._progress.pop(task, None)
+                self._reported.discard(task)
+                continue
+            stalled = now - progress[2]
+            if stalled > self.config.stuck_threshold and task not in self._reported and not self._ignored(task):
+                self._reported.add(task)
+                self.logger.warning(
+                    "Task %s made no progress for %.1fs, waiting at %s",
+                    task_name(task), stalled, task_location(task),
+                )
+
+    def snapshot(self) -> dict:
+        now = asyncio.get_running_loop().time()
+        inventory = {}
+        stuck = []
+        for task in asyncio.all_tasks():
+            if task.done():
+                continue
+            name = task_name(task)
+            age = now - self._first_seen.get(task, now)
+            entry = inventory.setdefault(name, {"count": 0, "max_age": 0.0})
+            entry["count"] += 1
+            entry["max_age"] = round(max(entry["max_age"], age), 3)
+            stalled = self._stalled_for(task, now)
+            if stalled > self.config.stuck_threshold and not self._ignored(task):
+                stuck.append({
+                    "name": name, "age": round(age, 3), "stalled": round(stalled, 3), "location": task_location(task),
+                })
+        samples = sorted(self.lag_samples)
+        return {
+            "lag": {
+                "last": round(self.lag_samples[-1], 4) if samples else None,
+                "p50": round(samples[len(samples) // 2], 4) if samples else None,
+                "max": round(self.max_lag, 4),
+            },
+            "tasks": inventory,
+            "stuck": sorted(stuck, key=lambda t: t["stalled"], reverse=True),
+        }
+
+
+def setup_monitoring(app: "Application"):
+    app.loop_monitor = LoopMonitor(app, app.config.monitor)
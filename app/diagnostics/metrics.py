@@ -0,0 +1,45 @@
+import typing
+from collections import defaultdict
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return "{}{{{}}}".format(name, ",".join("{}={}".format(k, v) for k, v in sorted(labels.items())))
+
+
+class Metrics:
+    """Счётчики и сводки в памяти процесса, отдаются через /admin.metrics."""
+
+    def __init__(self):
+        self.counters: dict[str, float] = defaultdict(float)
+        self.summaries: dict[str, dict] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self.counters[_key(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        summary = self.summaries.get(key)
+        if summary is None:
+            self.summaries[key] = {"count": 1, "sum": value, "max": value}
+        else:
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "summaries": {
+                key: {**summary, "avg": summary["sum"] / summary["count"]}
+                for key, summary in self.summaries.items()
+            },
+        }
+
+
+def setup_metrics(app: "Application"):
+    app.metrics = Metrics()
@@ -0,0 +1,85 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import tracemalloc
+import typing
+from typing import Optional
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+    from app.web.config import ProfilingConfig
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class Profiler:
+    def __init__(self, config: "ProfilingConfig"):
+        self.config = config
+        self._profile: Optional[cProfile.Profile] = None
+        self._stop_handle: Optional[asyncio.TimerHandle] = None
+        self.last_stats: Optional[str] = None
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+
+    def start(self, seconds: Optional[float] = None):
+        if self.running:
+            raise ProfilerBusy("Profiler is already running")
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        if seconds:
+            self._stop_handle = asyncio.get_running_loop().call_later(seconds, self.stop)
+
+    def stop(self) -> Optional[str]:
+        if self._stop_handle:
+            self._stop_handle.cancel()
+            self._stop_handle = None
+        if self._profile is None:
+            return self.last_stats
+        self._profile.disable()
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).sort_stats(self.config.sort).print_stats(self.config.limit)
+        self._profile = None
+        self.last_stats = out.getvalue()
+        return self.last_stats
+
+    async def run_for(self, seconds: float) -> str:
+        self.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stats = self.stop()
+        return stats
+
+    def memory_snapshot(self) -> list[str]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.config.tracemalloc_frames)
+        self._baseline = tracemalloc.take_snapshot()
+        return [str(stat) for stat in self._baseline.statistics("lineno")[:self.config.limit]]
+
+    def memory_diff(self, filename: Optional[str] = None) -> list[str]:
+        if self._baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot()
+        baseline = self._baseline
+        if filename:
+            filters = [tracemalloc.Filter(True, "*{}*".format(filename))]
+            snapshot = snapshot.filter_traces(filters)
+            baseline = baseline.filter_traces(filters)
+        stats = snapshot.compare_to(baseline, "lineno")
+        return [str(stat) for stat in stats[:self.config.limit]]
+
+    def memory_stop(self):
+        self._baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def setup_profiling(app: "Application"):
+    if app.config.profiling.enabled:
+        app.profiler = Profiler(app.config.profiling)
@@ -0,0 +1,35 @@
+import typing
+
+from aiohttp.web_app import Application
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+def setup_routes(app: Application):
+    from app.diagnostics.views import (
+        HealthView,
+        ReadyView,
+        LoopStatsView,
+        MetricsView,
+        ProfileView,
+        ProfileStartView,
+        ProfileStopView,
+        MemorySnapshotView,
+        MemoryDiffView,
+        MemoryStopView,
+    )
+
+    app.router.add_view("/healthz", HealthView)
+    app.router.add_view("/readyz", ReadyView)
+    app.router.add_view("/admin.loop_stats", LoopStatsView)
+    app.router.add_view("/admin.metrics", MetricsView)
+
+    # Профилирование подключается только явно через конфиг
+    if app.config.profiling.enabled:
+        app.router.add_view("/admin.profile", ProfileView)
+        app.router.add_view("/admin.profile_start", ProfileStartView)
+        app.router.add_view("/admin.profile_stop", ProfileStopView)
+        app.router.add_view("/admin.memory_snapshot", MemorySnapshotView)
+        app.router.add_view("/admin.memory_diff", MemoryDiffView)
+        app.router.add_view("/admin.memory_stop", MemoryStopView)
@@ -0,0 +1,97 @@
+"""Сводка по трейсам бота.
+
+    python -m app.diagnostics.trace_report traces.jsonl --top 10
+"""
+import argparse
+import glob
+import json
+from collections import defaultdict
+
+
+def load_traces(path: str) -> list[dict]:
+    traces = []
+    # RotatingFileHandler дописывает к именам старых файлов .1, .2, ...
+    for file_name in sorted(glob.glob(path + "*")):
+        with open(file_name, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    traces.append(json.loads(line))
+    return traces
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[idx]
+
+
+def phase_of(span_name: str) -> str:
+    if span_name.startswith("vk."):
+        return span_name
+    return span_name.split(".", 1)[0]
+
+
+def print_slowest(traces: list[dict], top: int):
+    print("Slowest traces:")
+    for trace in sorted(traces, key=lambda t: t["duration_ms"], reverse=True)[:top]:
+        per_phase = defaultdict(float)
+        for span in trace["spans"]:
+            if span["name"] != "dispatch":
+                per_phase[phase_of(span["name"])] += span["duration_ms"]
+        breakdown = ", ".join(
+            "{}={:.1f}ms".format(name, ms)
+            for name, ms in sorted(per_phase.items(), key=lambda i: i[1], reverse=True)
+        )
+        print("  {} {:>9.1f}ms {:<10} {}".format(
+            trace["trace_id"], trace["duration_ms"], trace.get("command", ""), breakdown
+        ))
+
+
+def print_phases(traces: list[dict]):
+    durations = defaultdict(list)
+    total = sum(t["duration_ms"] for t in traces) or 1.0
+    for trace in traces:
+        for span in trace["spans"]:
+            durations[phase_of(span["name"])].append(span["duration_ms"])
+
+    print("Per-phase breakdown:")
+    print("  {:<16} {:>7} {:>11} {:>9} {:>9} {:>9} {:>7}".format(
+        "phase", "count", "total_ms", "p50", "p95", "max", "share"
+    ))
+    for name, values in sorted(durations.items(), key=lambda i: sum(i[1]), reverse=True):
+        print("  {:<16} {:>7} {:>11.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>6.1f}%".format(
+            name, len(values), sum(values),
+            percentile(values, 0.5), percentile(values, 0.95), max(values),
+            100 * sum(values) / total,
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise bot traces")
+    parser.add_argument("path", nargs="?", default="traces.jsonl")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--command", help="only traces of this command, e.g. /буква")
+    args = parser.parse_args()
+
+    traces = load_traces(args.path)
+    if args.command:
+        traces = [t for t in traces if t.get("command") == args.command]
+    if not traces:
+        print("No traces found")
+        return
+
+    print("{} traces, p50 {:.1f}ms, p95 {:.1f}ms\n".format(
+        len(traces),
+        percentile([t["duration_ms"] for t in traces], 0.5),
+        percentile([t["duration_ms"] for t in traces], 0.95),
+    ))
+    print_slowest(traces, args.top)
+    print()
+    print_phases(traces)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import logging
+import random
+import time
+import typing
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.base.json_codec import dumps
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+    from app.web.config import TracingConfig
+
+# Сколько трейсов ждут обработки после poll, прежде чем самые старые будут выброшены
+MAX_PENDING_TRACES = 1024
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    def __init__(self, trace_id: str, origin: Optional[float] = None):
+        now = time.perf_counter()
+        self.trace_id = trace_id
+        self._origin = origin if origin is not None else now
+        self.started_at = time.time() - (now - self._origin)
+        self.spans: list[dict] = []
+        self.attrs: dict = {}
+
+    def add_span(self, name: str, started: float, duration: float, **attrs):
+        span = {
+            "name": name,
+            "start_ms": round((started - self._origin) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if attrs:
+            span.update(attrs)
+        self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self._origin) * 1000, 3),
+            **self.attrs,
+            "spans": self.spans,
+        }
+
+
+class Tracer:
+    def __init__(self, config: "TracingConfig"):
+        self.config = config
+        self.enabled = config.enabled and config.sample_rate > 0
+        self._pending: "OrderedDict[str, Trace]" = OrderedDict()
+        self._logger: Optional[logging.Logger] = None
+        if self.enabled:
+            self._logger = logging.getLogger("tracing")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(
+                config.path, maxBytes=config.max_bytes, backupCount=config.backup_count
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def new_trace(self, poll_started: Optional[float] = None, poll_duration: Optional[float] = None) -> str:
+        trace_id = uuid.uuid4().hex[:16]
+        if self.enabled and random.random() < self.config.sample_rate:
+            trace = Trace(trace_id, origin=poll_started)
+            if poll_started is not None:
+                trace.add_span("vk.poll", poll_started, poll_duration)
+            self._pending[trace_id] = trace
+            if len(self._pending) > MAX_PENDING_TRACES:
+                self._pending.popitem(last=False)
+        return trace_id
+
+    @contextmanager
+    def activate(self, trace_id: Optional[str], **attrs):
+        trace = self._pending.pop(trace_id, None) if trace_id else None
+        if trace is None:
+            yield None
+            return
+        trace.attrs.update(attrs)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            self._logger.info(dumps(trace.to_dict()))
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        trace = _current_trace.get()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace.add_span(name, started, time.perf_counter() - started, **attrs)
+
+    @staticmethod
+    def record(name: str, started: float, duration: float, **attrs):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, started, duration, **attrs)
+
+    def instrument_engine(self, engine):
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._trace_started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, "_trace_started", None)
+            if started is not None:
+                self.record(
+                    "db", started, time.perf_counter() - started,
+                    statement=" ".join(statement.split())[:120],
+                )
+
+
+def setup_tracing(app: "Application"):
+    app.tracer = Tracer(app.config.tracing)
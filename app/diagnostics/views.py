@@ -0,0 +1,86 @@
+from aiohttp.web_exceptions import HTTPConflict, HTTPBadRequest
+
+from app.diagnostics.profiler import ProfilerBusy
+from app.base.json_codec import loads
+from app.web.app import View
+from app.web.utils import json_response
+
+
+class HealthView(View):
+    # Процесс жив; 503 - только если запуск окончательно не удался
+    async def get(self):
+        if self.request.app.bootstrap.error:
+            return json_response(data={"status": "failed"}, status=503)
+        return json_response(data={"status": "ok"})
+
+
+class ReadyView(View):
+    async def get(self):
+        bootstrap = self.request.app.bootstrap
+        return json_response(data=bootstrap.report(), status=200 if bootstrap.ready else 503)
+
+
+class LoopStatsView(View):
+    async def get(self):
+        return json_response(data=self.request.app.loop_monitor.snapshot())
+
+
+class MetricsView(View):
+    async def get(self):
+        return json_response(data=self.request.app.metrics.snapshot())
+
+
+class ProfilerView(View):
+    @property
+    def profiler(self):
+        return self.request.app.profiler
+
+    async def read_seconds(self) -> float:
+        data = await self.request.json(loads=loads) if self.request.can_read_body else {}
+        try:
+            return float(data.get("seconds", 0))
+        except (TypeError, ValueError):
+            raise HTTPBadRequest(reason="seconds must be a number")
+
+
+class ProfileView(ProfilerView):
+    async def post(self):
+        seconds = await self.read_seconds()
+        if not seconds:
+            raise HTTPBadRequest(reason="seconds is required")
+        try:
+            stats = await self.profiler.run_for(seconds)
+        except ProfilerBusy as err:
+            raise HTTPConflict(reason=str(err))
+        return json_response(data={"stats": stats})
+
+
+class ProfileStartView(ProfilerView):
+    async def post(self):
+        seconds = await self.read_seconds()
+        try:
+            self.profiler.start(seconds)
+        except ProfilerBusy as err:
+            raise HTTPConflict(reason=str(err))
+        return json_response(data={"running": True, "seconds": seconds or None})
+
+
+class ProfileStopView(ProfilerView):
+    async def post(self):
+        return json_response(data={"stats": self.profiler.stop()})
+
+
+class MemorySnapshotView(ProfilerView):
+    async def post(self):
+        return json_response(data={"top": self.profiler.memory_snapshot()})
+
+
+class MemoryDiffView(ProfilerView):
+    async def get(self):
+        return json_response(data={"diff": self.profiler.memory_diff(self.request.query.get("filename"))})
+
+
+class MemoryStopView(ProfilerView):
+    async def post(self):
+        self.profiler.memory_stop()
+        return json_response(data={"tracing": False})
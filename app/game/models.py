@@ -1,5 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Optional
 
 from sqlalchemy import (
     Column,
@@ -7,8 +8,10 @@ from sqlalchemy import (
     String,
     DateTime,
     BigInteger,
-    ForeignKey
+    ForeignKey,
+    Index
 )
+from sqlalchemy.dialects.postgresql import JSONB
 
 from app.store.database.sqlalchemy_base import db
 
@@ -24,6 +27,7 @@ class Game:
     word_state: str
     whos_step: int
     deadline: datetime
+    version: int = 1
 
 
 @dataclass
@@ -48,6 +52,17 @@ class Score:
     score: int
 
 
+@dataclass
+class GameEvent:
+    game_id: int
+    peer_id: int
+    kind: str
+    vk_id: Optional[int] = None
+    data: dict = field(default_factory=dict)
+    created_at: Optional[datetime] = None
+    id: Optional[int] = None
+
+
 class GameModel(db):
     __tablename__ = "games"
 
@@ -55,11 +70,14 @@ class GameModel(db):
     start_time = Column(DateTime, nullable=True)
     end_time = Column(DateTime, nullable=True)
     status = Column(String, nullable=True)
-    peer_id = Column(BigInteger, nullable=False)
+    # Одна игра на чат: вступление находит или создаёт её через INSERT ... ON CONFLICT
+    peer_id = Column(BigInteger, nullable=False, unique=True)
     word_id = Column(Integer, ForeignKey("words.id", ondelete="CASCADE"), nullable=True)
     word_state = Column(String, nullable=True)
     whos_step = Column(BigInteger, nullable=True)
     deadline = Column(DateTime, nullable=True)
+    # Увеличивается при каждом изменении: обновления идут compare-and-swap по id и version
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     def __str__(self):
         return "{}, {}, {}".format(self.id, self.peer_id, self.status)
@@ -69,7 +87,7 @@ class UserModel(db):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True)
-    vk_id = Column(BigInteger, nullable=False)
+    vk_id = Column(BigInteger, nullable=False, unique=True)
 
 
 class StepOrderModel(db):
@@ -80,6 +98,13 @@ class StepOrderModel(db):
     game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), nullable=False)
     step_number = Column(Integer, nullable=False)
 
+    # Игрок стоит в очереди игры один раз, индекс же ищет очередь игры.
+    # Место в очереди тоже одно: на нём ловятся одновременные вступления в игру
+    __table_args__ = (
+        Index("ix_step_orders_game_user", "game_id", "user_id", unique=True),
+        Index("ix_step_orders_game_step", "game_id", "step_number", unique=True),
+    )
+
 
 class ScoreModel(db):
     __tablename__ = "scores"
@@ -88,3 +113,85 @@ class ScoreModel(db):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), nullable=False)
     score = Column(Integer, nullable=True, default=0)
+
+
+class PeerMarkModel(db):
+    """Последний обработанный id сообщения в чате - для отсева повторной доставки."""
+    __tablename__ = "peer_marks"
+
+    peer_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    message_id = Column(BigInteger, nullable=False)
+
+
+class BotStateModel(db):
+    """Состояние бота между перезапусками: курсор long poll, время остановки."""
+    __tablename__ = "bot_state"
+
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+
+
+class TableVersionModel(db):
+    """Версии таблиц для кэшей и ETag; растут триггерами при каждом изменении таблицы."""
+    __tablename__ = "table_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+
+class ChatLeaseModel(db):
+    """Какой экземпляр бота ведёт чат и до какого времени, если перестанет продлевать."""
+    __tablename__ = "chat_leases"
+
+    peer_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+# Архив законченных игр. Горячие таблицы держат только идущие игры чатов,
+# сюда игры переносятся пачками вместе с очерёдностью ходов и итогами.
+class GameArchiveModel(db):
+    __tablename__ = "games_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    peer_id = Column(BigInteger, nullable=False, index=True)
+    status = Column(String, nullable=True)
+    start_time = Column(DateTime, nullable=True)
+    end_time = Column(DateTime, nullable=True)
+    word_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class StepOrderArchiveModel(db):
+    __tablename__ = "step_orders_archive"
+
+    game_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    step_number = Column(Integer, nullable=False)
+
+
+class ScoreTotalArchiveModel(db):
+    """Сумма очков игрока за игру: отдельные начисления при переносе не сохраняются."""
+    __tablename__ = "score_totals_archive"
+
+    game_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    total = Column(Integer, nullable=False)
+
+
+class GameEventModel(db):
+    """Журнал событий игр: только вставки, строки не меняются и не удаляются."""
+    __tablename__ = "game_events"
+
+    id = Column(BigInteger, primary_key=True)
+    # Без внешнего ключа: игры уходят в архив, а их события остаются
+    game_id = Column(Integer, nullable=False)
+    peer_id = Column(BigInteger, nullable=False)
+    kind = Column(String, nullable=False)
+    vk_id = Column(BigInteger, nullable=True)
+    data = Column(JSONB, nullable=False, default=dict, server_default="{}")
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_game_events_game_id", "game_id", "id"),
+    )
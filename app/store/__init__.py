@@ -17,8 +17,25 @@ class Store:
         self.bots_manager = BotManager(app)
 
 
+def setup_storage(app: "Application"):
+    backend = app.config.storage.backend
+    if backend == "postgres":
+        from app.store.storage.postgres import PostgresStorage
+
+        app.database = Database(app)
+        app.storage = PostgresStorage(app)
+    elif backend == "memory":
+        from app.store.storage.memory import MemoryStorage
+
+        app.database = None
+        app.storage = MemoryStorage(app)
+    else:
+        raise ValueError("Unknown storage backend: {}".format(backend))
+
+
 def setup_store(app: "Application"):
-    app.database = Database(app)
-    app.on_startup.append(app.database.connect)
-    app.on_cleanup.append(app.database.disconnect)
+    setup_storage(app)
+    # Storage.connect вызывается из app.web.bootstrap
     app.store = Store(app)
+    # Хранилище закрывается последним: при остановке accessor'ы ещё дописывают в него состояние
+    app.on_cleanup.append(app.storage.disconnect)
@@ -1,29 +1,82 @@
-from typing import Optional
+import typing
+from typing import AsyncIterator, Optional
 
-from sqlalchemy import select
-
-from app.admin.models import Word, WordModel
+from app.admin.models import Word
 from app.base.base_accessor import BaseAccessor
 
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+# Сколько разных выборок /admin.words держать в кэше для текущей версии
+LIST_CACHE_SIZE = 256
+
 
 class WordAccessor(BaseAccessor):
+    def __init__(self, app: "Application", *args, **kwargs):
+        super().__init__(app, *args, **kwargs)
+        # Последняя прочитанная из хранилища версия слов; None - перечитать при следующем запросе
+        self.version: Optional[int] = None
+        self._changes = 0
+        self.list_cache: dict[tuple, bytes] = {}
+        # Слова, изменённые другим экземпляром или в обход бота
+        app.storage.word_listeners.append(lambda ids: self.words_changed())
+
+    async def current_version(self) -> int:
+        """Версия слов; пока они не менялись, без обращения к хранилищу."""
+        if self.version is not None and self.app.storage.tracks_word_changes:
+            return self.version
+        changes = self._changes
+        version = await self.app.storage.words_version()
+        # Если слова изменились, пока версия читалась, она могла уже устареть
+        if changes == self._changes:
+            self.version = version
+        return version
+
+    @staticmethod
+    def etag(version: int) -> str:
+        return '"words-{}"'.format(version)
+
+    def words_changed(self):
+        self._changes += 1
+        self.version = None
+        self.list_cache.clear()
+
+    def cache_list(self, key: tuple, body: bytes):
+        if len(self.list_cache) >= LIST_CACHE_SIZE:
+            self.list_cache.clear()
+        self.list_cache[key] = body
+
     async def create_word(self, key: str, desc: str) -> Word:
-        new_word = WordModel(key=key, desc=desc)
-        async with self.app.database.session.begin() as session:
-            session.add(new_word)
-        return Word(id=new_word.id, key=new_word.key, desc=new_word.desc, is_used=new_word.is_used)
+        word = await self.app.storage.create_word(key, desc)
+        self.words_changed()
+        return word
+
+    # Вставка пачкой, уже существующие ключи пропускаются. Возвращает число вставленных слов
+    async def create_words(self, words: list[dict]) -> int:
+        inserted = await self.app.storage.create_words(words)
+        if inserted:
+            self.words_changed()
+        return inserted
+
+    async def update_word(self, _id: int):
+        await self.app.storage.mark_word_used(_id)
+        self.words_changed()
 
     async def get_word_by_key(self, key: str) -> Optional[Word]:
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(WordModel)
-                .where(WordModel.key == key)
-            )).scalars().first()
-            if res:
-                return Word(id=res.id, key=res.key, desc=res.desc, is_used=res.is_used)
-
-    async def list_words(self) -> list[Word]:
-        Q = select(WordModel)
-        async with self.app.database.session.begin() as session:
-            res = (await session.execute(Q)).scalars().all()
-            return res
+        return await self.app.storage.get_word_by_key(key)
+
+    # Keyset-пагинация: следующая страница начинается после последнего id предыдущей
+    async def list_words(self, after_id: int = 0, limit: int = 100, is_used: Optional[bool] = None,
+                         prefix: Optional[str] = None) -> list[Word]:
+        return await self.app.storage.list_words(after_id, limit, is_used, prefix)
+
+    # Поиск похожих слов по key и desc; совпадения по префиксу ключа идут первыми
+    async def search_words(self, query: str, limit: int = 20) -> list[tuple[Word, float]]:
+        return await self.app.storage.search_words(query, limit)
+
+    # Выгрузка всех слов порциями, в памяти одновременно не больше chunk_size строк
+    async def stream_words(self, is_used: Optional[bool] = None, prefix: Optional[str] = None,
+                           chunk_size: int = 1000) -> AsyncIterator[list[Word]]:
+        async for chunk in self.app.storage.stream_words(is_used, prefix, chunk_size):
+            yield chunk
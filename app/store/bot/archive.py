@@ -0,0 +1,71 @@
+import asyncio
+import typing
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Optional
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+class GameArchiver:
+    """Переносит законченные игры в архивные таблицы.
+
+    Раз в interval секунд пачками по batch_size, пока есть что переносить.
+    Игры, законченные меньше grace секунд назад, не трогаются: по ним ещё
+    могут подводиться итоги. Несколько экземпляров бота могут работать
+    одновременно - занятые другим строки пропускаются.
+    """
+
+    def __init__(self, app: "Application", statuses: tuple[str, ...]):
+        self.app = app
+        self.config = app.config.archive
+        self.statuses = list(statuses)
+        self.logger = getLogger("game_archiver")
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.config.enabled:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            # Начатый перенос откатывается вместе с транзакцией, но дожидаемся его до закрытия хранилища
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def archive_chat(self, peer_id: int) -> bool:
+        """Переносит законченную игру чата, не дожидаясь фоновой задачи, чтобы в чате началась новая.
+
+        grace соблюдается и здесь: итоги игры может ещё подводить другой экземпляр бота.
+        """
+        ended_before = datetime.now() - timedelta(seconds=self.config.grace)
+        moved = await self.app.storage.archive_games(self.statuses, ended_before, 1, peer_id)
+        if moved:
+            self.app.metrics.inc("bot.archive.games")
+        return bool(moved)
+
+    async def run_once(self) -> int:
+        ended_before = datetime.now() - timedelta(seconds=self.config.grace)
+        total = 0
+        while True:
+            moved = await self.app.storage.archive_games(self.statuses, ended_before, self.config.batch_size)
+            total += len(moved)
+            self.app.metrics.inc("bot.archive.games", value=len(moved))
+            if len(moved) < self.config.batch_size:
+                return total
+            await asyncio.sleep(self.config.pause)
+
+    async def _loop(self):
+        while True:
+            try:
+                moved = await self.run_once()
+                if moved:
+                    self.logger.info("Archived %d games", moved)
+            except Exception:
+                self.logger.exception("Archiving failed")
+            await asyncio.sleep(self.config.interval)
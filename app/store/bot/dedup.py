@@ -0,0 +1,80 @@
+import typing
+from collections import deque
+from typing import Iterable
+
+from app.store.vk_api.dataclasses import UpdateMessage
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+class RecentMessages:
+    """Последние size ключей: кольцевой буфер задаёт порядок вытеснения, множество - поиск."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._ring: deque = deque()
+        self._seen: set = set()
+
+    def __contains__(self, key) -> bool:
+        return key in self._seen
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def add(self, key):
+        if len(self._ring) >= self.size:
+            self._seen.discard(self._ring.popleft())
+        self._ring.append(key)
+        self._seen.add(key)
+
+
+class Deduplicator:
+    """Отсев повторно доставленных сообщений по (peer_id, id).
+
+    После переподключения long poll или отката ts VK присылает уже
+    обработанные сообщения ещё раз. Недавние ключи держатся в памяти;
+    при persist ещё и наибольший id по чату сохраняется в хранилище (peer_marks),
+    чтобы повтор распознавался и после перезапуска.
+    """
+
+    def __init__(self, app: "Application"):
+        self.app = app
+        self.recent = RecentMessages(app.config.dedup.size)
+        self.marks: dict[int, int] = {}
+        self._dirty: set[int] = set()
+
+    @property
+    def persist(self) -> bool:
+        return self.app.config.dedup.persist
+
+    async def load_marks(self, peers: Iterable[int]):
+        peers = [peer for peer in set(peers) if peer not in self.marks]
+        if not self.persist or not peers:
+            return
+        self.marks.update({peer: 0 for peer in peers})
+        self.marks.update(await self.app.storage.load_marks(peers))
+
+    def is_duplicate(self, msg: UpdateMessage) -> bool:
+        # id == 0 бывает у сообщений без id, их не с чем сравнивать
+        if not msg.id:
+            return False
+        if (msg.from_id, msg.id) in self.recent:
+            return True
+        return self.persist and msg.id <= self.marks.get(msg.from_id, 0)
+
+    def mark(self, msg: UpdateMessage):
+        """Запоминает принятое сообщение; отброшенное лимитами повтор ещё может доставить."""
+        if not msg.id:
+            return
+        self.recent.add((msg.from_id, msg.id))
+        if self.persist and msg.id > self.marks.get(msg.from_id, 0):
+            self.marks[msg.from_id] = msg.id
+            self._dirty.add(msg.from_id)
+
+    async def save_marks(self):
+        if not self._dirty:
+            return
+        marks = {peer: self.marks[peer] for peer in self._dirty}
+        self._dirty.clear()
+        await self.app.storage.save_marks(marks)
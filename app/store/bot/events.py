@@ -0,0 +1,138 @@
+import asyncio
+import typing
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from logging import getLogger
+from typing import Optional
+
+from app.game.models import Game, GameEvent
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+JOIN = "join"
+START = "start"
+LETTER = "letter"
+WORD = "word"
+TURN = "turn"
+TURN_TIMEOUT = "turn_timeout"
+FINISH = "finish"
+
+
+@dataclass
+class GameReplay:
+    """Состояние игры, собранное из её событий."""
+    game_id: int
+    peer_id: int
+    status: Optional[str] = None
+    players: list[int] = field(default_factory=list)
+    word_id: Optional[int] = None
+    word_state: Optional[str] = None
+    whos_step: Optional[int] = None
+    scores: Counter = field(default_factory=Counter)
+    turns: int = 0
+
+
+def replay(events: list[GameEvent]) -> Optional[GameReplay]:
+    """Проигрывает события одной игры по порядку; None, если событий нет."""
+    if not events:
+        return None
+    state = GameReplay(game_id=events[0].game_id, peer_id=events[0].peer_id)
+    for event in events:
+        data = event.data
+        state.status = data.get("status", state.status)
+        if event.kind == JOIN:
+            state.players.extend(vk_id for vk_id in data["players"] if vk_id not in state.players)
+        elif event.kind == START:
+            state.word_id = data["word_id"]
+        state.word_state = data.get("word_state", state.word_state)
+        state.whos_step = data.get("whos_step", state.whos_step)
+        if data.get("score"):
+            state.scores[event.vk_id] += data["score"]
+        if event.kind in (TURN, TURN_TIMEOUT):
+            state.turns += 1
+    return state
+
+
+class EventLog:
+    """Журнал событий игр с записью пачками.
+
+    События копятся в памяти и раз в flush_interval секунд (или как только
+    набралось batch_size) уходят в базу одной вставкой. Строка игры остаётся
+    источником правды для обработчиков: журнал её не заменяет, а позволяет
+    восстановить ход игры и очки для разбора и аналитики. Если база
+    недоступна, события ждут следующей попытки, но не больше max_pending.
+    """
+
+    def __init__(self, app: "Application"):
+        self.app = app
+        self.config = app.config.events
+        self.logger = getLogger("game_events")
+        self.pending: list[GameEvent] = []
+        self._wakeup = asyncio.Event()
+        # Пачки пишутся по одной, чтобы id событий шли в порядке записи
+        self._flushing = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, game: Game, kind: str, vk_id: Optional[int] = None, **data):
+        if not self.config.enabled:
+            return
+        self.pending.append(GameEvent(
+            game_id=game.id, peer_id=game.peer_id, kind=kind, vk_id=vk_id, data=data, created_at=datetime.now()
+        ))
+        if len(self.pending) >= self.config.batch_size:
+            self._wakeup.set()
+
+    async def start(self):
+        if self.config.enabled:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+        except Exception:
+            self.logger.exception("Could not write %d game events on shutdown", len(self.pending))
+
+    async def flush(self):
+        async with self._flushing:
+            while self.pending:
+                batch = self.pending[:self.config.batch_size]
+                del self.pending[:len(batch)]
+                try:
+                    await self.app.storage.append_events(batch)
+                except BaseException:
+                    # Пачка возвращается в начало очереди, чтобы порядок событий сохранился;
+                    # и при отмене: stop допишет её сам
+                    self.pending[:0] = batch
+                    overflow = len(self.pending) - self.config.max_pending
+                    if overflow > 0:
+                        del self.pending[:overflow]
+                        self.app.metrics.inc("bot.events.dropped", value=overflow)
+                    raise
+                self.app.metrics.inc("bot.events.written", value=len(batch))
+                self.app.metrics.observe("bot.events.batch", len(batch))
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.config.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                self.logger.exception("Could not write game events")
+
+    async def rebuild(self, game_id: int) -> Optional[GameReplay]:
+        """Состояние игры из журнала; ещё не записанные события сначала дописываются."""
+        await self.flush()
+        return replay(await self.app.storage.game_events(game_id))
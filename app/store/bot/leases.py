@@ -0,0 +1,163 @@
+import asyncio
+import socket
+import time
+import typing
+from logging import getLogger
+from typing import Iterable, Optional
+
+from app.store.vk_api.decoder import decode_updates
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+# Канал NOTIFY, через который команды пересылаются экземпляру, ведущему чат
+FORWARD_CHANNEL = "chat_forward"
+
+
+class ChatLeases:
+    """Аренда чатов между экземплярами бота.
+
+    Чат ведёт тот экземпляр, за которым он записан в chat_leases. Аренда
+    продлевается раз в heartbeat секунд; если экземпляр умер и перестал её
+    продлевать, через ttl чат забирает любой другой при первой же команде
+    или срабатывании таймера хода. Своей аренду экземпляр считает на
+    heartbeat меньше ttl, чтобы не продолжать вести чат, который база уже
+    могла отдать другому.
+    """
+
+    def __init__(self, app: "Application"):
+        self.app = app
+        self.config = app.config.leases
+        self.logger = getLogger("chat_leases")
+        # peer_id -> когда аренда последний раз подтверждена базой (time.monotonic)
+        self.owned: dict[int, float] = {}
+        self.last_used: dict[int, float] = {}
+        self.forwarded: asyncio.Queue = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._consumer: Optional[asyncio.Task] = None
+        # Пересланная пачка сейчас обрабатывается: при остановке её надо дождаться
+        self._handling = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    @property
+    def node(self) -> str:
+        return self.config.node or socket.gethostname()
+
+    @property
+    def state_scope(self) -> str:
+        """Под каким scope экземпляр хранит своё состояние; один экземпляр - общее."""
+        return self.node if self.enabled else ""
+
+    @property
+    def forward(self) -> bool:
+        return self.config.forward and self.app.database is not None
+
+    async def start(self):
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        if self.forward:
+            await self.app.database.listen(FORWARD_CHANNEL, self.on_forward)
+            self._consumer = asyncio.create_task(self._handle_forwarded())
+            # Пересланных команд может не быть часами
+            self.app.loop_monitor.register_idle(self._consumer)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        consumer, self._consumer = self._consumer, None
+        if consumer is not None:
+            if not self._handling:
+                consumer.cancel()
+            try:
+                # Начатая пачка доигрывается и отправляет ответы, пока чаты ещё за этим экземпляром
+                await asyncio.wait_for(consumer, timeout=self.app.config.bot.drain_timeout)
+            except asyncio.CancelledError:
+                pass
+            except asyncio.TimeoutError:
+                self.logger.warning("Forwarded updates did not finish in %.1fs, cancelled",
+                                    self.app.config.bot.drain_timeout)
+        if self.owned:
+            # Отпущенные чаты другие экземпляры подхватят сразу, не дожидаясь ttl
+            try:
+                await self.app.storage.release_chats(self.node, list(self.owned))
+            except Exception:
+                self.logger.exception("Could not release chat leases")
+            self.owned.clear()
+
+    def is_owned(self, peer_id: int, now: float) -> bool:
+        confirmed = self.owned.get(peer_id)
+        return confirmed is not None and now - confirmed < self.config.ttl - self.config.heartbeat
+
+    async def claim(self, peers: Iterable[int]) -> dict[int, Optional[str]]:
+        """Владелец каждого чата; свободные и просроченные чаты забираются себе."""
+        now = time.monotonic()
+        owners = {}
+        unknown = []
+        for peer_id in set(peers):
+            if self.is_owned(peer_id, now):
+                owners[peer_id] = self.node
+            else:
+                unknown.append(peer_id)
+        if unknown:
+            for peer_id, owner in (await self.app.storage.claim_chats(self.node, unknown, self.config.ttl)).items():
+                owners[peer_id] = owner
+                if owner == self.node:
+                    if peer_id not in self.owned:
+                        self.app.metrics.inc("bot.lease.acquired")
+                    self.owned[peer_id] = now
+        for peer_id, owner in owners.items():
+            if owner == self.node:
+                self.last_used[peer_id] = now
+        return owners
+
+    async def renew(self):
+        now = time.monotonic()
+        idle = [peer_id for peer_id in self.owned if now - self.last_used.get(peer_id, 0) > self.config.idle_release]
+        if idle:
+            await self.app.storage.release_chats(self.node, idle)
+            for peer_id in idle:
+                self._drop(peer_id)
+        if not self.owned:
+            return
+        peers = list(self.owned)
+        kept = set(await self.app.storage.renew_chats(self.node, peers, self.config.ttl))
+        for peer_id in peers:
+            if peer_id in kept:
+                self.owned[peer_id] = now
+            elif peer_id in self.owned:
+                # Продление опоздало, и чат уже забрал другой экземпляр
+                self._drop(peer_id)
+                self.app.metrics.inc("bot.lease.lost")
+                self.logger.warning("Lost the lease on chat %s", peer_id)
+
+    def _drop(self, peer_id: int):
+        self.owned.pop(peer_id, None)
+        self.last_used.pop(peer_id, None)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.config.heartbeat)
+            try:
+                await self.renew()
+            except Exception:
+                self.logger.exception("Could not renew chat leases")
+
+    def on_forward(self, message: Optional[dict]):
+        if message and message["owner"] == self.node:
+            self.forwarded.put_nowait(decode_updates(message))
+
+    async def _handle_forwarded(self):
+        while True:
+            updates = await self.forwarded.get()
+            self._handling = True
+            try:
+                await self.app.store.bots_manager.handle_updates(updates, forwarded=True)
+            except Exception:
+                self.logger.exception("Forwarded updates failed")
+            finally:
+                self._handling = False
+            if self._consumer is None:
+                return
@@ -1,13 +1,21 @@
 import asyncio
+import time
 import typing
 from asyncio import Task
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
-
-from sqlalchemy import select, update, func
-
-from app.admin.models import WordModel
-from app.game.models import GameModel, UserModel, Game, User, StepOrderModel, ScoreModel, Score
+from logging import getLogger
+
+from app.diagnostics.budget import UpdateStats, collect_update_stats, over_budget
+from app.base.json_codec import dumps
+from app.store.bot import events
+from app.store.bot.archive import GameArchiver
+from app.store.bot.dedup import Deduplicator
+from app.store.bot.leases import FORWARD_CHANNEL, ChatLeases
+from app.store.bot.ratelimit import RateLimiter
 from app.store.vk_api.dataclasses import Update, Message
+from app.store.vk_api.decoder import encode_update
+from app.store.vk_api.transport import VkApiError
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
@@ -23,6 +31,8 @@ BEFORE_START = """
 Дождитесь остальных игроков или начинайте игру с помощью команды /начать.
 После начала игры у Вас будет 1 минута на ответ.
 """
+GAME_OVER = "Игра закончена. Чтобы сыграть снова, вступите в новую игру командой /играть"
+RESULTS_PENDING = "Итоги прошлой игры ещё подводятся, вступите в игру через несколько секунд"
 
 OPTIONS = {
     "enter": "/играть",
@@ -42,118 +52,346 @@ CANCEL = "cancelled"
 FINISH = "finished"
 
 CHECK_STEP_INTERVAL = 5
+# Сколько раз перечитывать игру, если её успел изменить параллельный обработчик
+CAS_RETRIES = 3
+NAMES_CACHE_SIZE = 10000
+# Предел полезной нагрузки NOTIFY - 8000 байт
+FORWARD_MAX_BYTES = 7900
+
+
+class GameConflict(Exception):
+    pass
+
+
+# trace_id есть только у обновлений из decoder; Update из dataclasses.py его не несёт
+def trace_of(update) -> typing.Optional[str]:
+    return getattr(update, "trace_id", None)
+
+
+def command_name(text: str) -> str:
+    command = text.split(" ", 1)[0]
+    return command if command in OPTIONS.values() else "other"
 
 
 class BotManager:
     def __init__(self, app: "Application"):
         self.app = app
+        self.logger = getLogger("bot_manager")
         self.change_step_task: typing.Optional[Task] = None
-
-    async def handle_updates(self, updates: list[Update]):
-        if updates:
-            msg = updates[-1].object.message
-            if msg.text.startswith("/"):
-                if msg.text == OPTIONS["enter"]:
-                    await self.app.store.vk_api.send_message(
-                        Message(
-                            user_id=msg.from_id,
-                            text="Вы вступили в игру"
-                        )
-                    )
-                    game = await self.get_game_by_peer_id(msg.from_id)
-                    if not game:
-                        game = await self.create_game(msg)
-                    user = await self.add_user(msg)
-                    await self.create_step_order(game, user)
-                elif msg.text == OPTIONS["start"]:
-                    if not await self.is_game_started(msg):
-                        await self.start_game(msg)
-                    else:
+        # Таймер сейчас меняет ходы, а не спит: при остановке его надо дождаться
+        self.changing_steps = False
+        ingress = app.config.ingress
+        self.user_limiter = RateLimiter(ingress.user_rate, ingress.user_burst, ingress.max_keys)
+        self.chat_limiter = RateLimiter(ingress.chat_rate, ingress.chat_burst, ingress.max_keys)
+        self.dedup = Deduplicator(app)
+        self.leases = ChatLeases(app)
+        self.archiver = GameArchiver(app, (FINISH, CANCEL))
+        self.event_log = events.EventLog(app)
+        # Неиспользованные слова (key, desc, id), чтобы /начать не ходил за словом в базу
+        self.word_pool: deque = deque()
+        app.storage.word_listeners.append(self.on_words_changed)
+        # vk_id -> (имя, до какого времени свежее); просроченные имена тоже годятся, если VK недоступен
+        self.names: OrderedDict[int, tuple[str, float]] = OrderedDict()
+
+    async def warm_start(self, state: dict[str, str]):
+        """Подхватывает идущие игры после перезапуска."""
+        stopped_at = state.get("stopped_at")
+        if stopped_at:
+            # Время, пока бот был остановлен, не засчитывается игрокам в ход. Среди нескольких
+            # экземпляров только в чатах, которые никто не забрал себе: остальные всё это время вели
+            peers = await self.app.storage.leased_chats(self.leases.node) if self.leases.enabled else None
+            downtime = timedelta(seconds=max(0.0, time.time() - float(stopped_at)))
+            await self.app.storage.shift_deadlines(START, downtime, peers)
+        # Идущие игры читаются уже со сдвинутыми дедлайнами и остаются в кэше хранилища,
+        # так что первые команды после перезапуска не ходят за игрой в базу
+        started = await self.app.storage.games_with_status(START)
+        if stopped_at:
+            # После аварийной остановки сдвигать дедлайны на старый простой уже нельзя
+            await self.app.storage.delete_state(self.leases.state_scope, "stopped_at")
+        self.logger.info("Warm start: %d running games", len(started))
+
+    async def shutdown(self):
+        await self.stop_timer()
+        await self.leases.stop()
+        await self.archiver.stop()
+        await self.event_log.stop()
+
+    async def handle_updates(self, updates: list[Update], forwarded: bool = False):
+        if self.leases.enabled:
+            updates = await self.route(updates, forwarded)
+        busy_sent = set()
+        # peer_id -> вступления, отложенные до конца пачки или до другой команды этого чата
+        joins: dict[int, list[Update]] = {}
+        try:
+            await self.dedup.load_marks(update.object.message.from_id for update in updates)
+            for update in updates:
+                msg = update.object.message
+                reason = self.rejected_by(update)
+                if reason:
+                    self.app.metrics.inc("bot.ingress.dropped", reason=reason)
+                    # Про перегрузку сообщаем каждому чату один раз за пачку
+                    if reason == "lag" and msg.from_id not in busy_sent:
+                        busy_sent.add(msg.from_id)
                         await self.app.store.vk_api.send_message(
-                            Message(
-                                user_id=msg.from_id,
-                                text="Игра уже начата"
-                            )
+                            Message(user_id=msg.from_id, text=self.app.config.ingress.busy_text)
                         )
-                elif msg.text == OPTIONS["finish"]:
-                    await self.finish_game(msg)
-                    await self.cancel_game(msg)
-                    await self.stop_task()
-                elif msg.text.startswith(OPTIONS["symbol"]):
-                    await self.check_symbol(msg)
-                elif msg.text.startswith(OPTIONS["word"]):
-                    await self.check_word(msg)
-                else:
+                    continue
+                if msg.text == OPTIONS["enter"]:
+                    joins.setdefault(msg.from_id, []).append(update)
+                    continue
+                if msg.from_id in joins:
+                    await self.flush_joins(msg.from_id, joins.pop(msg.from_id))
+                await self.dispatch(command_name(msg.text), trace_of(update), msg.from_id,
+                                    lambda: self.handle_update(update))
+            for peer_id, queued in joins.items():
+                await self.flush_joins(peer_id, queued)
+        finally:
+            await self.dedup.save_marks()
+
+    async def dispatch(self, command, trace_id, peer_id, handler):
+        with self.app.tracer.activate(trace_id, command=command), collect_update_stats(command) as stats:
+            with self.app.tracer.span("dispatch", command=command):
+                try:
+                    await handler()
+                    self.app.bootstrap.mark_first_reply()
+                except GameConflict:
+                    self.app.metrics.inc("bot.game.conflict", command=command)
+                    self.logger.warning("%s in chat %s gave up after %d retries", command, peer_id, CAS_RETRIES)
+                except Exception:
+                    # Ошибка одной команды не должна терять остальную пачку: ts long poll уже сдвинут
+                    self.app.metrics.inc("bot.update.failed", command=command)
+                    self.logger.exception("%s in chat %s failed", command, peer_id)
+        self.record_stats(stats)
+
+    # Свои чаты обрабатываются здесь, чужие пересылаются владельцу или пропускаются
+    async def route(self, updates: list[Update], forwarded: bool) -> list[Update]:
+        node = self.leases.node
+        owners = await self.leases.claim(update.object.message.from_id for update in updates)
+        mine = []
+        foreign: dict[str, list[dict]] = {}
+        for update in updates:
+            owner = owners.get(update.object.message.from_id)
+            if owner == node:
+                mine.append(update)
+            elif owner and self.leases.forward and not forwarded:
+                foreign.setdefault(owner, []).append(encode_update(update))
+            else:
+                # При long poll те же события получают все экземпляры, и владелец обработает их сам
+                self.app.metrics.inc("bot.lease.skipped")
+        payloads = []
+        for owner, encoded in foreign.items():
+            payload = dumps({"origin": self.app.database.origin, "owner": owner, "updates": encoded})
+            if len(payload.encode()) > FORWARD_MAX_BYTES:
+                self.app.metrics.inc("bot.lease.skipped", value=len(encoded))
+                self.logger.warning("%d updates for %s are too large to forward", len(encoded), owner)
+                continue
+            self.app.metrics.inc("bot.lease.forwarded", value=len(encoded))
+            payloads.append(payload)
+        if payloads:
+            await self.app.database.publish(FORWARD_CHANNEL, payloads)
+        return mine
+
+    # Все /играть чата из одной пачки - одним запросом и одним ответом
+    async def flush_joins(self, peer_id, updates):
+        self.app.metrics.observe("bot.join.batch", len(updates))
+        await self.dispatch(
+            OPTIONS["enter"], trace_of(updates[0]), peer_id,
+            lambda: self.join_players(peer_id, [update.object.message.vk_user_id for update in updates])
+        )
+
+    def rejected_by(self, update) -> typing.Optional[str]:
+        """Причина отбросить сообщение до обращения к базе или None."""
+        msg = update.object.message
+        if self.dedup.is_duplicate(msg):
+            return "duplicate"
+        reason = self._ingress_rejected_by(update)
+        if reason is None:
+            self.dedup.mark(msg)
+        return reason
+
+    def _ingress_rejected_by(self, update) -> typing.Optional[str]:
+        msg = update.object.message
+        ingress = self.app.config.ingress
+        if not ingress.enabled:
+            return None
+        # Отставание меряется от получения обновления, а не от date сообщения: после перезапуска
+        # бот дочитывает накопившееся с сохранённого ts, и эти команды старые, но не ждали в очереди у бота
+        received = getattr(update, "received", 0)
+        if received:
+            lag = time.monotonic() - received
+            self.app.metrics.observe("bot.ingress.lag", lag)
+            if lag > ingress.max_lag:
+                return "lag"
+        if not self.user_limiter.allow(msg.vk_user_id):
+            return "user_rate"
+        if not self.chat_limiter.allow(msg.from_id):
+            return "chat_rate"
+        return None
+
+    def record_stats(self, stats: UpdateStats):
+        self.app.metrics.observe("bot.update.queries", stats.queries, command=stats.command)
+        self.app.metrics.observe("bot.update.vk_calls", stats.vk_calls, command=stats.command)
+        if over_budget(stats):
+            self.app.metrics.inc("bot.update.over_budget", command=stats.command)
+            self.logger.warning(
+                "%s took %d queries and %d VK calls, over budget", stats.command, stats.queries, stats.vk_calls
+            )
+        else:
+            self.logger.debug("%s took %d queries and %d VK calls", stats.command, stats.queries, stats.vk_calls)
+
+    async def handle_update(self, update: Update):
+        msg = update.object.message
+        if msg.text.startswith("/"):
+            if msg.text == OPTIONS["enter"]:
+                await self.join_players(msg.from_id, [msg.vk_user_id])
+            elif msg.text == OPTIONS["start"]:
+                if not await self.start_game(msg):
                     await self.app.store.vk_api.send_message(
                         Message(
                             user_id=msg.from_id,
-                            text=GAME_RULES
+                            text="Игра уже начата"
                         )
                     )
+            elif msg.text == OPTIONS["finish"]:
+                await self.finish_game(msg)
+                await self.cancel_game(msg)
+            elif msg.text.startswith(OPTIONS["symbol"]):
+                await self.check_symbol(msg)
+            elif msg.text.startswith(OPTIONS["word"]):
+                await self.check_word(msg)
             else:
-                pass
-
-    # Создание игры
-    async def create_game(self, data):
-        new_game = GameModel(peer_id=data.from_id, status=PREPARE)
-        async with self.app.database.session.begin() as session:
-            session.add(new_game)
+                await self.app.store.vk_api.send_message(
+                    Message(
+                        user_id=msg.from_id,
+                        text=GAME_RULES
+                    )
+                )
+        else:
+            pass
+
+    # Вступление в игру; игра чата создаётся при первом вступлении
+    async def join_players(self, peer_id, players):
+        joined = await self.app.storage.join_game(peer_id, players, PREPARE, closed=(FINISH, CANCEL))
+        # Прошлая игра чата закончилась, но ещё не ушла в архив: уносим её, чтобы началась новая
+        if joined is None and await self.archiver.archive_chat(peer_id):
+            joined = await self.app.storage.join_game(peer_id, players, PREPARE, closed=(FINISH, CANCEL))
+        if joined is None:
+            await self.app.store.vk_api.send_message(
+                Message(
+                    user_id=peer_id,
+                    text=RESULTS_PENDING
+                )
+            )
+            return None
+        game, created = joined
         await self.app.store.vk_api.send_message(
             Message(
-                user_id=data.from_id,
-                text=BEFORE_START
+                user_id=peer_id,
+                text="Вы вступили в игру"
             )
         )
-        return Game(
-            id=new_game.id,
-            start_time=new_game.start_time,
-            end_time=new_game.end_time,
-            status=new_game.status,
-            peer_id=new_game.peer_id,
-            word_id=new_game.word_id,
-            word_state=new_game.word_state,
-            whos_step=new_game.whos_step,
-            deadline=new_game.deadline
-        )
+        self.event_log.record(game, events.JOIN, players=list(players), status=game.status)
+        if created:
+            await self.app.store.vk_api.send_message(
+                Message(
+                    user_id=peer_id,
+                    text=BEFORE_START
+                )
+            )
+        return game
 
-    # Начало игры
+    # Начало игры; False, если игра уже идёт
     async def start_game(self, data):
-        word, desc, word_id = await self.get_word()
-        encrypted_word = len(word) * "*"
+        word = None
+        for _ in range(CAS_RETRIES):
+            game = await self.get_game_by_peer_id(data.from_id)
+            if not game:
+                # В чате ещё никто не вступил в игру
+                return True
+            if game.status in (FINISH, CANCEL):
+                await self.app.store.vk_api.send_message(
+                    Message(
+                        user_id=data.from_id,
+                        text=GAME_OVER
+                    )
+                )
+                return True
+            if game.status == START:
+                return False
+            if word is None:
+                word, desc, word_id = await self.get_word()
+                encrypted_word = len(word) * "*"
+            if await self.update_game(data, game, word_id, encrypted_word):
+                self.event_log.record(
+                    game, events.START, data.vk_user_id,
+                    status=START, word_id=word_id, word_state=encrypted_word, whos_step=data.vk_user_id
+                )
+                break
+            self.count_conflict("start")
+        else:
+            raise GameConflict(data.from_id)
         await self.app.store.vk_api.send_message(
             Message(
                 user_id=data.from_id,
                 text="{}\n Загадка: {}".format(encrypted_word, desc)
             )
         )
-        await self.create_change_step_task(data.from_id)
-        await self.update_game(data, word_id, encrypted_word)
         await self.update_word(word_id)
-
-    async def create_change_step_task(self, from_id):
-        await asyncio.sleep(CHECK_STEP_INTERVAL)
-        self.change_step_task = asyncio.create_task(self.change_step(from_id))
-
-    async def stop_task(self):
-        await asyncio.wait_for(self.change_step_task, timeout=None)
-        self.change_step_task.cancel()
-
-    async def change_step(self, from_id):
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(GameModel)
-                .where(GameModel.deadline <= datetime.now())
-            )).scalars().all()
-            if res:
-                for i in res:
-                    cur = await self.change_player(i.peer_id)
-                    await self.app.store.vk_api.send_message(
-                        Message(
-                            user_id=i.peer_id,
-                            text="Ходит {}".format(await self.get_name(cur))
-                        )
-                    )
-        await self.create_change_step_task(from_id)
+        return True
+
+    def count_conflict(self, operation):
+        self.app.metrics.inc("bot.game.cas_retry", operation=operation)
+
+    # Обновление игры, только если её version не изменилась с момента чтения
+    async def cas_update_game(self, game, **values):
+        return await self.app.storage.cas_update_game(game, **values)
+
+    # Таймер хода один на процесс: запускается при старте и обходит просроченные ходы всех чатов.
+    # Закончившаяся игра выпадает из обхода сама - у неё сбрасывается дедлайн.
+    async def start_timer(self):
+        if self.change_step_task is None:
+            self.change_step_task = asyncio.create_task(self.turn_timer())
+
+    async def stop_timer(self):
+        task, self.change_step_task = self.change_step_task, None
+        if task is None:
+            return
+        if not self.changing_steps:
+            # Таймер спит, прерывать нечего
+            task.cancel()
+        try:
+            # Начатая смена ходов дописывает игры и отправляет свои сообщения
+            await asyncio.wait_for(task, timeout=self.app.config.bot.drain_timeout)
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            self.logger.warning("Turn timer did not finish in %.1fs, cancelled", self.app.config.bot.drain_timeout)
+
+    async def turn_timer(self):
+        while True:
+            await asyncio.sleep(CHECK_STEP_INTERVAL)
+            self.changing_steps = True
+            try:
+                await self.change_step()
+            except Exception:
+                self.logger.exception("Turn timer failed")
+            finally:
+                self.changing_steps = False
+            if self.change_step_task is None:
+                return
+
+    async def change_step(self):
+        expired = await self.app.storage.expired_games(START, datetime.now())
+        if self.leases.enabled and expired:
+            owners = await self.leases.claim(expired)
+            expired = [peer_id for peer_id in expired if owners.get(peer_id) == self.leases.node]
+        for peer_id in expired:
+            with collect_update_stats("turn_timeout") as stats:
+                try:
+                    await self.change_player(peer_id, expired_only=True)
+                except GameConflict:
+                    self.app.metrics.inc("bot.game.conflict", command="turn_timeout")
+            self.record_stats(stats)
 
     # Проверка буквы в слове
     async def check_symbol(self, data):
@@ -167,7 +405,17 @@ class BotManager:
                     )
                 )
             elif len(symbol) == 2:
-                state, word = await self.check_symbol_in_word(symbol[1], data)
+                result = await self.check_symbol_in_word(symbol[1], data)
+                if result is None:
+                    # Пока проверяли букву, ход передали другому игроку
+                    await self.app.store.vk_api.send_message(
+                        Message(
+                            user_id=data.from_id,
+                            text="Сейчас не Ваш ход"
+                        )
+                    )
+                    return
+                state, word = result
                 if state:
                     await self.add_score(data, "symbol")
                     await self.app.store.vk_api.send_message(
@@ -178,7 +426,6 @@ class BotManager:
                     )
                     if "*" not in word:
                         await self.finish_game(data)
-                        await self.stop_task()
                 else:
                     await self.app.store.vk_api.send_message(
                         Message(
@@ -214,7 +461,16 @@ class BotManager:
                     )
                 )
             elif len(word) == 2:
-                state, w = await self.check_word_in_word(word[1], data)
+                result = await self.check_word_in_word(word[1], data)
+                if result is None:
+                    await self.app.store.vk_api.send_message(
+                        Message(
+                            user_id=data.from_id,
+                            text="Сейчас не Ваш ход"
+                        )
+                    )
+                    return
+                state, w = result
                 if state:
                     await self.add_score(data, "word")
                     await self.app.store.vk_api.send_message(
@@ -224,7 +480,6 @@ class BotManager:
                         )
                     )
                     await self.finish_game(data)
-                    await self.stop_task()
                 else:
                     await self.app.store.vk_api.send_message(
                         Message(
@@ -248,345 +503,252 @@ class BotManager:
                 )
             )
 
-    # Завершение игры
+    # Завершение игры. От прочитанного состояния не зависит, поэтому version не сравнивается,
+    # а только увеличивается: параллельные CAS-обновления перечитают игру и увидят, что она закончена.
+    # Повторное завершение (слово угадано одновременно с /завершить) ничего не делает.
     async def finish_game(self, data):
-        async with self.app.database.session() as session:
-            await session.execute(
-                update(GameModel).
-                where(GameModel.peer_id == data.from_id).
-                values(
-                    end_time=datetime.now(),
-                    status=FINISH
-                )
-            )
-            await session.commit()
+        game = await self.app.storage.set_game_status(data.from_id, FINISH, unless=(FINISH, CANCEL))
+        if not game:
+            return
+        self.event_log.record(game, events.FINISH, status=FINISH)
         await self.app.store.vk_api.send_message(
             Message(
                 user_id=data.from_id,
                 text="Вы завершили игру"
             )
         )
-        await self.results(data)
-        await self.find_winner(data)
+        scores = await self.results(data)
+        await self.find_winner(data, scores)
 
     async def get_game_by_peer_id(self, peer_id):
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(GameModel)
-                .where(GameModel.peer_id == peer_id)
-            )).scalars().first()
-            if res:
-                return Game(
-                    id=res.id,
-                    start_time=res.start_time,
-                    end_time=res.end_time,
-                    status=res.status,
-                    peer_id=res.peer_id,
-                    word_id=res.word_id,
-                    word_state=res.word_state,
-                    whos_step=res.whos_step,
-                    deadline=res.deadline
-                )
-
-    async def add_user(self, data):
-        user = await self.get_user_by_vk_id(data.vk_user_id)
-        if not user:
-            new_user = UserModel(vk_id=data.vk_user_id)
-            async with self.app.database.session.begin() as session:
-                session.add(new_user)
-            return User(
-                id=new_user.id,
-                vk_id=new_user.vk_id
-            )
+        return await self.app.storage.get_game(peer_id)
 
     async def get_user_by_vk_id(self, vk_id):
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(UserModel)
-                .where(UserModel.vk_id == vk_id)
-            )).scalars().first()
-            if res:
-                return User(
-                    id=res.id,
-                    vk_id=res.vk_id
-                )
+        return await self.app.storage.get_user_by_vk_id(vk_id)
 
     async def get_user_by_id(self, _id):
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(UserModel)
-                .where(UserModel.id == _id)
-            )).scalars().first()
-            if res:
-                return User(
-                    id=res.id,
-                    vk_id=res.vk_id
-                )
+        return await self.app.storage.get_user_by_id(_id)
 
     async def is_right_player(self, data):
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(GameModel)
-                .where(GameModel.peer_id == data.from_id)
-                .where(GameModel.start_time != None)
-                .where(GameModel.end_time == None)
-            )).scalars().first()
-            if res:
-                if res.whos_step == data.vk_user_id:
-                    return True
-                else:
-                    return False
-
-    async def update_game(self, data, word_id, encrypted_word):
-        async with self.app.database.session() as session:
-            await session.execute(
-                update(GameModel).
-                where(GameModel.peer_id == data.from_id).
-                values(
-                    start_time=datetime.now(),
-                    status=START,
-                    word_id=word_id,
-                    word_state=encrypted_word,
-                    whos_step=data.vk_user_id,
-                    deadline=datetime.now() + timedelta(seconds=30)
-                )
-            )
-            await session.commit()
+        game = await self.get_game_by_peer_id(data.from_id)
+        if game and game.start_time is not None and game.end_time is None:
+            return game.whos_step == data.vk_user_id
+
+    async def update_game(self, data, game, word_id, encrypted_word):
+        return await self.cas_update_game(
+            game,
+            start_time=datetime.now(),
+            status=START,
+            word_id=word_id,
+            word_state=encrypted_word,
+            whos_step=data.vk_user_id,
+            deadline=datetime.now() + timedelta(seconds=30)
+        )
 
     async def update_word(self, _id):
-        async with self.app.database.session() as session:
-            await session.execute(
-                update(WordModel).
-                where(WordModel.id == _id).
-                values(
-                    is_used=True
-                )
-            )
-            await session.commit()
-
-    async def create_step_order(self, game, user):
-        # TODO если игра уже закончена, обновить существующую очередность для этого же чата
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(StepOrderModel)
-                .where(StepOrderModel.game_id == game.id)
-                .order_by(StepOrderModel.step_number.desc())
-            )).scalars().first()
-            if not res:
-                count = 1
-                new_order = StepOrderModel(user_id=user.id, game_id=game.id, step_number=count)
-            else:
-                new_order = StepOrderModel(user_id=user.id, game_id=game.id, step_number=res.step_number + 1)
-            async with self.app.database.session.begin() as session:
-                session.add(new_order)
+        await self.app.store.admins.update_word(_id)
 
     async def get_word(self):
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(WordModel)
-                .where(WordModel.is_used == False)
-            )).scalars().first()
-            if res:
-                return res.key, res.desc, res.id
-
+        if not self.word_pool:
+            await self.fill_word_pool()
+        if self.word_pool:
+            return self.word_pool.popleft()
+
+    # Слова, которые пометил использованными другой экземпляр, из пула убираются
+    def on_words_changed(self, ids):
+        if ids is None:
+            self.word_pool.clear()
+            return
+        changed = set(ids)
+        self.word_pool = deque(word for word in self.word_pool if word[2] not in changed)
+
+    async def fill_word_pool(self):
+        self.word_pool = deque(await self.app.storage.unused_words(self.app.config.bot.word_pool_size))
+
+    # Слово и игра для хода игрока; None, если сейчас ходит не он
+    async def get_word_and_game(self, data):
+        res = await self.app.storage.get_word_and_game(data.from_id)
+        if res and res[1].whos_step == data.vk_user_id:
+            return res[0].lower(), res[1]
+
+    # При конфликте буква накладывается заново на свежее состояние слова
     async def check_symbol_in_word(self, symbol, data):
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(WordModel, GameModel)
-                .join(GameModel, WordModel.id == GameModel.word_id)
-                .where(GameModel.peer_id == data.from_id)
-            )).all()
-            if res:
-                word = res[0].WordModel.key.lower()
-                word_state = res[0].GameModel.word_state
-                word_state_list = list(word_state)
-                if symbol.lower() in word:
-                    word_list = list(word)
-                    symbol_idx = []
-                    for i, j in enumerate(word_list):
-                        if j == symbol.lower():
-                            symbol_idx.append(i)
-
-                    for i in symbol_idx:
-                        word_state_list[i] = symbol
-                    word_state = "".join(word_state_list)
-                    await self.update_word_state(word_state, data)
-                    return True, word_state
-                else:
-                    return False, word_state
+        for _ in range(CAS_RETRIES):
+            res = await self.get_word_and_game(data)
+            if not res:
+                return
+            word, game = res
+            word_state = game.word_state
+            word_state_list = list(word_state)
+            if symbol.lower() not in word:
+                self.event_log.record(game, events.LETTER, data.vk_user_id, letter=symbol, hit=False)
+                return False, word_state
+            word_list = list(word)
+            symbol_idx = []
+            for i, j in enumerate(word_list):
+                if j == symbol.lower():
+                    symbol_idx.append(i)
+
+            for i in symbol_idx:
+                word_state_list[i] = symbol
+            word_state = "".join(word_state_list)
+            if await self.update_word_state(word_state, game):
+                self.event_log.record(
+                    game, events.LETTER, data.vk_user_id,
+                    letter=symbol, hit=True, word_state=word_state, score=SCORES["symbol"]
+                )
+                return True, word_state
+            self.count_conflict("symbol")
+        raise GameConflict(data.from_id)
 
     async def check_word_in_word(self, given_word, data):
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(WordModel, GameModel)
-                .join(GameModel, WordModel.id == GameModel.word_id)
-                .where(GameModel.peer_id == data.from_id)
-            )).all()
-            if res:
-                word = res[0].WordModel.key.lower()
-                word_state = res[0].GameModel.word_state
-                if word.lower() == given_word:
-                    await self.update_word_state(word, data)
-                    return True, given_word
-                else:
-                    return False, word_state
-
-    async def update_word_state(self, updated_word, data):
-        async with self.app.database.session() as session:
-            await session.execute(
-                update(GameModel).
-                where(GameModel.peer_id == data.from_id).
-                values(
-                    word_state=updated_word
+        for _ in range(CAS_RETRIES):
+            res = await self.get_word_and_game(data)
+            if not res:
+                return
+            word, game = res
+            if word.lower() != given_word:
+                self.event_log.record(game, events.WORD, data.vk_user_id, word=given_word, hit=False)
+                return False, game.word_state
+            if await self.update_word_state(word, game):
+                self.event_log.record(
+                    game, events.WORD, data.vk_user_id, word=given_word, hit=True, word_state=word, score=SCORES["word"]
                 )
-            )
-            await session.commit()
+                return True, given_word
+            self.count_conflict("word")
+        raise GameConflict(data.from_id)
 
-    async def get_current_player(self, from_id):
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(GameModel.whos_step)
-                .where(GameModel.peer_id == from_id)
-            )).scalars().first()
-            if res:
-                return res
+    async def update_word_state(self, updated_word, game):
+        return await self.cas_update_game(game, word_state=updated_word)
 
-    async def change_player(self, from_id):
-        cur = (await self.get_user_by_vk_id(await self.get_current_player(from_id))).id
+    async def get_current_player(self, from_id):
         game = await self.get_game_by_peer_id(from_id)
-        async with self.app.database.session() as session:
-            count = (await session.execute(
-                select(func.max(StepOrderModel.step_number))
-                .where(StepOrderModel.game_id == game.id)
-            )).scalars().first()
-            await session.commit()
-            if count:
-                if cur < count:
-                    cur += 1
-                else:
-                    cur = 1
-            new_cur = await self.update_whos_step(from_id, cur)
-            await self.app.store.vk_api.send_message(
-                Message(
-                    user_id=from_id,
-                    text="Ходит {}".format(await self.get_name(new_cur))
-                )
-            )
-            return new_cur
-
-    async def update_whos_step(self, from_id, cur):
-        new_cur = (await self.get_user_by_id(cur)).vk_id
-        async with self.app.database.session() as session:
-            await session.execute(
-                update(GameModel).
-                where(GameModel.peer_id == from_id).
-                values(
-                    whos_step=new_cur,
-                    deadline=datetime.now() + timedelta(seconds=30)
-                )
+        if game and game.whos_step:
+            return game.whos_step
+
+    async def get_step_order(self, game_id):
+        return await self.app.storage.get_step_order(game_id)
+
+    # Передача хода. expired_only - вызов из таймера: ход передаётся, только если время вышло.
+    # Если ход уже передал параллельный обработчик, второй раз он не передаётся.
+    async def change_player(self, from_id, expired_only=False):
+        seen = None
+        for _ in range(CAS_RETRIES):
+            game = await self.get_game_by_peer_id(from_id)
+            if not game:
+                return
+            if seen is not None and game.whos_step != seen:
+                return game.whos_step
+            if expired_only and (game.status != START or game.deadline is None or game.deadline > datetime.now()):
+                return
+            seen = game.whos_step
+            order = await self.get_step_order(game.id)
+            if game.whos_step in order:
+                new_cur = order[(order.index(game.whos_step) + 1) % len(order)]
+            else:
+                new_cur = order[0] if order else game.whos_step
+            if await self.update_whos_step(game, new_cur):
+                self.event_log.record(game, events.TURN_TIMEOUT if expired_only else events.TURN, whos_step=new_cur)
+                break
+            self.count_conflict("whos_step")
+        else:
+            raise GameConflict(from_id)
+        await self.app.store.vk_api.send_message(
+            Message(
+                user_id=from_id,
+                text="Ходит {}".format(await self.get_name(new_cur))
             )
-            await session.commit()
-            return new_cur
+        )
+        return new_cur
+
+    async def update_whos_step(self, game, new_cur):
+        return await self.cas_update_game(
+            game,
+            whos_step=new_cur,
+            deadline=datetime.now() + timedelta(seconds=30)
+        )
 
     async def add_score(self, data, state):
         user = await self.get_user_by_vk_id(data.vk_user_id)
         game = await self.get_game_by_peer_id(data.from_id)
-        new_score = ScoreModel(
-            user_id=user.id,
-            game_id=game.id,
-            score=SCORES[state]
-        )
-        async with self.app.database.session() as session:
-            session.add(new_score)
-            await session.commit()
-        return Score(
-            id=new_score.id,
-            user_id=new_score.user_id,
-            game_id=new_score.game_id,
-            score=new_score.score
-        )
+        return await self.app.storage.add_score(user.id, game.id, SCORES[state])
 
+    # Суммы очков игроков по убыванию: [(vk_id, имя, очки)]
     async def results(self, data):
         game = await self.get_game_by_peer_id(data.from_id)
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(ScoreModel.user_id, func.sum(ScoreModel.score))
-                .group_by(ScoreModel.user_id, ScoreModel.game_id)
-                .having(ScoreModel.game_id == game.id)
-            )).all()
-            await session.commit()
-            result = []
-            if res:
-                for score in res:
-                    vk_id = (await self.get_user_by_id(score[0])).vk_id
-                    name = await self.get_name(vk_id)
-                    result.append((name, score[1]))
-            await self.app.store.vk_api.send_message(
-                Message(
-                    user_id=data.from_id,
-                    text="Результаты: {}".format([i for i in result])
-                )
+        res = await self.app.storage.game_results(game.id)
+        names = await self.get_names([vk_id for vk_id, _ in res])
+        scores = [(vk_id, names.get(vk_id), score) for vk_id, score in res]
+        await self.app.store.vk_api.send_message(
+            Message(
+                user_id=data.from_id,
+                text="Результаты: {}".format([(name, score) for _, name, score in scores])
             )
+        )
+        return scores
 
     async def get_name(self, player):
-        res = await self.app.store.vk_api.get_user_info(
-            player
-        )
-        if res:
-            data = (await res.json())["response"][0]
-            return "{} {}".format(data["first_name"], data["last_name"])
+        return (await self.get_names([player])).get(player)
+
+    # Имена нескольких игроков: из кэша, недостающие - одним вызовом users.get.
+    # Если VK не отвечает, берутся просроченные имена из кэша или id игрока.
+    async def get_names(self, players):
+        if not players:
+            return {}
+        now = time.monotonic()
+        names = {}
+        missing = []
+        for player in players:
+            cached = self.names.get(player)
+            if cached and cached[1] > now:
+                names[player] = cached[0]
+            else:
+                missing.append(player)
+        if missing:
+            try:
+                res = await self.app.store.vk_api.get_user_info(
+                    ",".join(str(player) for player in missing)
+                )
+            except VkApiError as err:
+                self.app.metrics.inc("vk.degraded", method="users.get")
+                self.logger.warning("Using cached names: %s", err)
+                res = None
+            if res:
+                expires = now + self.app.config.vk_http.names_ttl
+                for data in res["response"]:
+                    name = "{} {}".format(data["first_name"], data["last_name"])
+                    names[data["id"]] = name
+                    self.names[data["id"]] = (name, expires)
+                    self.names.move_to_end(data["id"])
+                while len(self.names) > NAMES_CACHE_SIZE:
+                    self.names.popitem(last=False)
+            for player in missing:
+                if player not in names:
+                    cached = self.names.get(player)
+                    names[player] = cached[0] if cached else "id{}".format(player)
+        return names
 
     async def cancel_game(self, data):
-        async with self.app.database.session() as session:
-            await session.execute(
-                update(GameModel).
-                where(GameModel.peer_id == data.from_id).
-                values(
-                    end_time=datetime.now(),
-                    status=CANCEL
-                )
-            )
-            await session.commit()
+        game = await self.app.storage.set_game_status(data.from_id, CANCEL)
+        if game:
+            self.event_log.record(game, events.FINISH, status=CANCEL)
 
     async def end_game(self, data):
-        async with self.app.database.session() as session:
-            await session.execute(
-                update(GameModel).
-                where(GameModel.peer_id == data.from_id).
-                values(
-                    end_time=datetime.now(),
-                    status=FINISH
-                )
-            )
-            await session.commit()
+        game = await self.app.storage.set_game_status(data.from_id, FINISH)
+        if game:
+            self.event_log.record(game, events.FINISH, status=FINISH)
 
-    async def find_winner(self, data):
-        game = await self.get_game_by_peer_id(data.from_id)
-        async with self.app.database.session() as session:
-            res = (await session.execute(
-                select(ScoreModel.user_id, func.sum(ScoreModel.score))
-                .group_by(ScoreModel.user_id, ScoreModel.game_id)
-                .having(ScoreModel.game_id == game.id)
-                .order_by(func.sum(ScoreModel.score).desc())
-            )).scalars().first()
-            await session.commit()
-            if res:
-                vk_id = (await self.get_user_by_id(res)).vk_id
-                await self.app.store.vk_api.send_message(
-                    Message(
-                        user_id=data.from_id,
-                        text="Победитель: {}".format(await self.get_name(vk_id))
-                    )
+    async def find_winner(self, data, scores):
+        if scores:
+            _, name, _ = scores[0]
+            await self.app.store.vk_api.send_message(
+                Message(
+                    user_id=data.from_id,
+                    text="Победитель: {}".format(name)
                 )
+            )
 
     async def is_game_started(self, data):
-        async with self.app.database.session.begin() as session:
-            res = (await session.execute(
-                select(GameModel)
-                .where(GameModel.peer_id == data.from_id)
-            )).scalars().first()
-            if res:
-                if res.status == START:
-                    return True
-                else:
-                    return False
+        game = await self.get_game_by_peer_id(data.from_id)
+        if game:
+            return game.status == START
@@ -1,22 +1,40 @@
-import logging
+import asyncio
 import typing
-from typing import Optional
+import uuid
+from logging import getLogger
+from typing import Callable, Optional
 
-from sqlalchemy import text
+import asyncpg
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker, close_all_sessions
+from app.base.json_codec import loads
+from app.diagnostics.budget import count_query
 from app.store.database import db
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
+# Обработчик уведомления; None - уведомления могли потеряться, закэшированное надо сбросить целиком
+Handler = Callable[[Optional[dict]], None]
+
+LISTEN_RETRY = 1.0
+
 
 class Database:
     def __init__(self, app: "Application"):
         self.app = app
+        self.logger = getLogger("database")
         self._engine: Optional[AsyncEngine] = None
         self._db: Optional[declarative_base] = None
         self.session: Optional[sessionmaker] = None
+        # application_name соединений этого процесса; триггеры кладут его в уведомления как origin
+        self.origin = "bot-{}".format(uuid.uuid4().hex[:8])
+        self.handlers: dict[str, list[Handler]] = {}
+        self._listen_task: Optional[asyncio.Task] = None
+        # Завершается, когда соединение LISTEN открылось в первый раз, или ошибкой этого открытия
+        self._listen_ready: Optional[asyncio.Future] = None
+        self._listen_conn: Optional[asyncpg.Connection] = None
 
     async def connect(self, *_: list, **__: dict) -> None:
         self._db = db
@@ -27,20 +45,111 @@ class Database:
                 self.app.config.database.host,
                 self.app.config.database.database
             ),
-            echo=True
+            echo=self.app.config.database.echo,
+            connect_args={"server_settings": {"application_name": self.origin}},
         )
+        self.app.tracer.instrument_engine(self._engine.sync_engine)
+        event.listen(self._engine.sync_engine, "after_cursor_execute", count_query)
 
         self.session = sessionmaker(self._engine, expire_on_commit=False, autoflush=True, class_=AsyncSession)
 
-    async def disconnect(self, *_: list, **__: dict) -> None:
+    async def warm_up(self) -> None:
+        # Соединения пула открываются заранее и параллельно, а не на первых командах
+        async def ping():
+            async with self._engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        await asyncio.gather(*(ping() for _ in range(self.app.config.database.warm_connections)))
+
+    async def listen(self, channel: str, handler: Handler) -> None:
+        """Подписка на NOTIFY channel. Свои уведомления (origin этого процесса) не доставляются.
+
+        Слушает отдельное соединение вне пула. После его потери и переподключения
+        каждый обработчик получает None: пропущенное за это время уже не узнать.
+        """
+        new_channel = channel not in self.handlers
+        self.handlers.setdefault(channel, []).append(handler)
+        if self._listen_task is None:
+            self._listen_ready = asyncio.get_running_loop().create_future()
+            self._listen_task = asyncio.create_task(self._listen(self._listen_ready))
+            # Соединение LISTEN ждёт уведомлений сколько угодно долго
+            self.app.loop_monitor.register_idle(self._listen_task)
+        elif new_channel and self._listen_conn:
+            await self._listen_conn.add_listener(channel, self._on_notify)
+        task = self._listen_task
         try:
-            session = AsyncSession(self._engine)
-            for table in self.app.database._db.metadata.tables:
-                await session.execute(text(f"TRUNCATE {table} CASCADE"))
-                await session.execute(text(f"ALTER SEQUENCE {table}_id_seq RESTART WITH 1"))
+            await asyncio.shield(self._listen_ready)
+        except (OSError, asyncpg.PostgresError):
+            # Первое соединение не открылось: подписка не состоялась, следующая попробует заново
+            self.handlers[channel].remove(handler)
+            if not self.handlers[channel]:
+                del self.handlers[channel]
+            if self._listen_task is task:
+                self._listen_task = None
+            raise
+
+    async def _listen(self, ready: asyncio.Future):
+        config = self.app.config.database
+        while True:
+            closed = asyncio.Event()
+            try:
+                conn = await asyncpg.connect(
+                    host=config.host, port=config.port, user=config.user, password=config.password,
+                    database=config.database, server_settings={"application_name": self.origin + "-listen"},
+                )
+            except (OSError, asyncpg.PostgresError) as err:
+                if not ready.done():
+                    ready.set_exception(err)
+                    return
+                self.logger.warning("LISTEN connection failed: %r", err)
+                await asyncio.sleep(LISTEN_RETRY)
+                continue
+            conn.add_termination_listener(lambda _: closed.set())
+            try:
+                for channel in self.handlers:
+                    await conn.add_listener(channel, self._on_notify)
+                self._listen_conn = conn
+                if ready.done():
+                    for channel in self.handlers:
+                        self._dispatch(channel, None)
+                else:
+                    ready.set_result(None)
+                await closed.wait()
+                self.logger.warning("LISTEN connection lost, reconnecting")
+            finally:
+                self._listen_conn = None
+                if not conn.is_closed():
+                    await conn.close()
+
+    async def publish(self, channel: str, payloads: list[str]) -> None:
+        """NOTIFY пачкой одним запросом; доставляется после коммита, как и уведомления триггеров."""
+        async with self.session.begin() as session:
+            await session.execute(
+                text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+                {"channel": channel, "payloads": payloads},
+            )
 
-            await session.commit()
-        except Exception as err:
-            logging.warning(err)
+    def _on_notify(self, conn, pid, channel: str, payload: str):
+        message = loads(payload)
+        if message.get("origin") != self.origin:
+            self._dispatch(channel, message)
 
+    def _dispatch(self, channel: str, message: Optional[dict]):
+        for handler in self.handlers.get(channel, ()):
+            try:
+                handler(message)
+            except Exception:
+                self.logger.exception("Handler for %s failed", channel)
+
+    async def disconnect(self, *_: list, **__: dict) -> None:
+        task, self._listen_task = self._listen_task, None
+        if task:
+            task.cancel()
+            # Слушающее соединение закрывается в самой задаче, до dispose
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
         close_all_sessions()
+        if self._engine:
+            await self._engine.dispose()
@@ -0,0 +1,234 @@
+import typing
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+from app.admin.models import Word
+from app.game.models import Game, GameEvent, User, Score
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+# Более короткие запросы search_words ищут только по префиксу ключа: похожесть по одной-двум буквам ничего не значит
+MIN_SIMILAR_QUERY = 3
+
+
+def state_key(scope: str, key: str) -> str:
+    """Ключ bot_state: состояние экземпляра хранится под "<scope>:<key>"."""
+    return "{}:{}".format(scope, key) if scope else key
+
+
+def scoped_state(scope: str, state: dict[str, str]) -> dict[str, str]:
+    """Состояние одного scope из всех строк bot_state, с ключами без префикса."""
+    if not scope:
+        return {key: value for key, value in state.items() if ":" not in key}
+    prefix = scope + ":"
+    return {key[len(prefix):]: value for key, value in state.items() if key.startswith(prefix)}
+
+
+class Storage(ABC):
+    """Всё, что BotManager и WordAccessor хранят между командами.
+
+    Игры, игроки, очерёдность ходов, очки, слова и служебное состояние бота.
+    Методы получают и возвращают dataclass'ы из app.game.models и
+    app.admin.models, так что реализации взаимозаменяемы.
+    """
+
+    def __init__(self, app: "Application"):
+        self.app = app
+        # Вызываются, когда слова изменил кто-то другой: с id изменённых слов или None - "могло измениться что угодно"
+        self.word_listeners: list[Callable[[Optional[list[int]]], None]] = []
+        # word_listeners узнают обо всех изменениях слов; иначе words_version нельзя держать в памяти
+        self.tracks_word_changes = True
+
+    async def connect(self, *_: list, **__: dict):
+        return
+
+    async def warm_up(self):
+        return
+
+    async def disconnect(self, *_: list, **__: dict):
+        return
+
+    # Игры
+    @abstractmethod
+    async def join_game(self, peer_id: int, vk_ids: list[int], status: str,
+                        closed: Iterable[str] = ()) -> Optional[tuple[Game, bool]]:
+        """Добавляет игроков в конец очереди игры чата, создавая игру со статусом status и игроков.
+
+        Уже стоящие в очереди пропускаются. Возвращает игру и True, если она только что создана,
+        или None, если игра чата в статусе из closed: в законченную игру не вступают.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_game(self, peer_id: int) -> Optional[Game]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def cas_update_game(self, game: Game, **values) -> bool:
+        """Обновляет игру, только если её version не изменилась с момента чтения."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_game_status(self, peer_id: int, status: str, unless: Iterable[str] = ()) -> Optional[Game]:
+        """Ставит статус и end_time и сбрасывает дедлайн хода, если текущий статус не из unless.
+
+        Возвращает обновлённую игру или None, если обновлять было нечего.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def expired_games(self, status: str, now: datetime) -> list[int]:
+        """peer_id игр в статусе status, у которых вышло время хода."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def games_with_status(self, status: str) -> list[Game]:
+        """Игры в статусе status; хранилище с кэшем заодно кладёт их в кэш."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def shift_deadlines(self, status: str, delta: timedelta, peers: Optional[list[int]] = None):
+        """Сдвигает дедлайны игр со статусом status; peers - только в этих чатах."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_word_and_game(self, peer_id: int) -> Optional[tuple[str, Game]]:
+        """Загаданное в чате слово и сама игра."""
+        raise NotImplementedError
+
+    # Игроки
+    @abstractmethod
+    async def get_user_by_vk_id(self, vk_id: int) -> Optional[User]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_user_by_id(self, _id: int) -> Optional[User]:
+        raise NotImplementedError
+
+    # Очерёдность ходов
+    @abstractmethod
+    async def get_step_order(self, game_id: int) -> list[int]:
+        """vk_id игроков в порядке ходов."""
+        raise NotImplementedError
+
+    # Очки
+    @abstractmethod
+    async def add_score(self, user_id: int, game_id: int, score: int) -> Score:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def game_results(self, game_id: int) -> list[tuple[int, int]]:
+        """Суммы очков игроков по убыванию: [(vk_id, очки)]."""
+        raise NotImplementedError
+
+    # Журнал событий игр
+    @abstractmethod
+    async def append_events(self, events: list[GameEvent]):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def game_events(self, game_id: int) -> list[GameEvent]:
+        """События игры в порядке записи."""
+        raise NotImplementedError
+
+    # Архив
+    @abstractmethod
+    async def archive_games(self, statuses: list[str], ended_before: datetime, limit: int,
+                            peer_id: Optional[int] = None) -> list[int]:
+        """Переносит в архив до limit игр со статусом из statuses, законченных раньше ended_before.
+
+        Очерёдность ходов переносится как есть, очки - суммами по игрокам.
+        Возвращает peer_id перенесённых игр.
+        """
+        raise NotImplementedError
+
+    # Слова
+    @abstractmethod
+    async def create_word(self, key: str, desc: str) -> Word:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_words(self, words: list[dict]) -> int:
+        """Вставка пачкой, уже существующие ключи пропускаются. Возвращает число вставленных слов."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def mark_word_used(self, _id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_word_by_key(self, key: str) -> Optional[Word]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def list_words(self, after_id: int = 0, limit: int = 100, is_used: Optional[bool] = None,
+                         prefix: Optional[str] = None) -> list[Word]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def search_words(self, query: str, limit: int = 20) -> list[tuple[Word, float]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream_words(self, is_used: Optional[bool] = None, prefix: Optional[str] = None,
+                     chunk_size: int = 1000) -> AsyncIterator[list[Word]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def words_version(self) -> int:
+        """Растёт при каждом изменении слов; у всех экземпляров бота одна и та же."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def unused_words(self, limit: int) -> list[tuple[str, str, int]]:
+        """Неиспользованные слова как (key, desc, id)."""
+        raise NotImplementedError
+
+    # Состояние бота. scope отделяет состояние одного экземпляра от других; пустой - общее
+    @abstractmethod
+    async def load_state(self, scope: str = "") -> dict[str, str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_state(self, scope: str = "", **values):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_state(self, scope: str, *keys: str):
+        raise NotImplementedError
+
+    # Аренда чатов между экземплярами бота
+    @abstractmethod
+    async def claim_chats(self, owner: str, peers: list[int], ttl: float) -> dict[int, Optional[str]]:
+        """Берёт в аренду свободные и просроченные чаты и продлевает свои.
+
+        Возвращает владельца каждого чата: owner для своих, чужой владелец или None, если не известен.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def renew_chats(self, owner: str, peers: list[int], ttl: float) -> list[int]:
+        """Продлевает аренду; возвращает чаты, которые всё ещё за owner."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def release_chats(self, owner: str, peers: list[int]):
+        """Отпускает аренду: чат сразу свободен, но owner остаётся его последним владельцем."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def leased_chats(self, owner: str) -> list[int]:
+        """Чаты, последним владельцем которых записан owner, включая отпущенные и просроченные."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def load_marks(self, peers: list[int]) -> dict[int, int]:
+        """Последние обработанные id сообщений по чатам."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_marks(self, marks: dict[int, int]):
+        """Сохраняет id, если он больше уже сохранённого."""
+        raise NotImplementedError
@@ -0,0 +1,344 @@
+import heapq
+import itertools
+import re
+import time
+import typing
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, Optional
+
+from app.admin.models import Word
+from app.game.models import Game, GameEvent, User, Score
+from app.store.storage.base import MIN_SIMILAR_QUERY, Storage, scoped_state, state_key
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+# Порог похожести, как у оператора % в pg_trgm
+SIMILARITY_THRESHOLD = 0.3
+
+
+def trigrams(text: str) -> frozenset[str]:
+    """Триграммы в духе pg_trgm: по словам, в нижнем регистре, с пробелами по краям."""
+    result = set()
+    for word in re.findall(r"\w+", text.lower()):
+        padded = "  {} ".format(word)
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(result)
+
+
+def similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MemoryStorage(Storage):
+    """Всё хранится в словарях процесса, без базы.
+
+    Для работы одним процессом без Postgres, для тестов и бенчмарков,
+    где нужна стоимость самих обработчиков без задержек базы. Данные
+    теряются при перезапуске.
+
+    Игры ищутся по индексу peer_id, просроченные ходы - по куче дедлайнов.
+    Наружу отдаются копии, поэтому CAS по version работает так же, как в базе.
+    """
+
+    def __init__(self, app: "Application"):
+        super().__init__(app)
+        self._ids = itertools.count(1)
+        self.games: dict[int, Game] = {}
+        self.games_by_peer: dict[int, int] = {}
+        # (deadline, game_id); устаревшие записи выбрасываются при чтении
+        self.deadlines: list[tuple[datetime, int]] = []
+        self.users: dict[int, User] = {}
+        self.users_by_vk: dict[int, int] = {}
+        # game_id -> user_id в порядке ходов (словарь как упорядоченное множество)
+        self.step_orders: dict[int, dict[int, None]] = defaultdict(dict)
+        self.scores: dict[int, Counter] = defaultdict(Counter)
+        self.words: dict[int, Word] = {}
+        self.words_by_key: dict[str, int] = {}
+        # id слов по возрастанию - для keyset-пагинации
+        self.word_ids: list[int] = []
+        # Неиспользованные слова в порядке добавления
+        self.unused: dict[int, None] = {}
+        self.word_changes = 0
+        self.word_trigrams: dict[int, tuple[frozenset, frozenset]] = {}
+        self.state: dict[str, str] = {}
+        self.marks: dict[int, int] = {}
+        self.events: dict[int, list[GameEvent]] = defaultdict(list)
+        # game_id -> (игра, user_id в порядке ходов, очки по user_id)
+        self.archive: dict[int, tuple[Game, list[int], dict[int, int]]] = {}
+        # peer_id -> (владелец, до какого time.monotonic())
+        self.leases: dict[int, tuple[str, float]] = {}
+
+    def _next_id(self) -> int:
+        return next(self._ids)
+
+    def _push_deadline(self, game: Game):
+        if game.deadline is not None:
+            heapq.heappush(self.deadlines, (game.deadline, game.id))
+
+    async def join_game(self, peer_id: int, vk_ids: list[int], status: str,
+                        closed: Iterable[str] = ()) -> Optional[tuple[Game, bool]]:
+        game = self._game(peer_id)
+        if game is not None and game.status in closed:
+            return None
+        created = game is None
+        if created:
+            game = Game(
+                id=self._next_id(),
+                start_time=None,
+                end_time=None,
+                status=status,
+                peer_id=peer_id,
+                word_id=None,
+                word_state=None,
+                whos_step=None,
+                deadline=None,
+            )
+            self.games[game.id] = game
+            self.games_by_peer[peer_id] = game.id
+        order = self.step_orders[game.id]
+        for vk_id in vk_ids:
+            user_id = self.users_by_vk.get(vk_id)
+            if user_id is None:
+                user = User(id=self._next_id(), vk_id=vk_id)
+                self.users[user.id] = user
+                user_id = self.users_by_vk[vk_id] = user.id
+            order.setdefault(user_id)
+        return replace(game), created
+
+    def _game(self, peer_id: int) -> Optional[Game]:
+        game_id = self.games_by_peer.get(peer_id)
+        return self.games.get(game_id) if game_id is not None else None
+
+    async def get_game(self, peer_id: int) -> Optional[Game]:
+        game = self._game(peer_id)
+        return replace(game) if game else None
+
+    async def cas_update_game(self, game: Game, **values) -> bool:
+        stored = self.games.get(game.id)
+        if stored is None or stored.version != game.version:
+            return False
+        for key, value in values.items():
+            setattr(stored, key, value)
+        stored.version += 1
+        if "deadline" in values:
+            self._push_deadline(stored)
+        return True
+
+    async def set_game_status(self, peer_id: int, status: str, unless: Iterable[str] = ()) -> Optional[Game]:
+        game = self._game(peer_id)
+        if game is None or game.status in unless:
+            return None
+        game.end_time = datetime.now()
+        game.status = status
+        # Запись в куче дедлайнов станет устаревшей и выбросится при чтении
+        game.deadline = None
+        game.version += 1
+        return replace(game)
+
+    async def expired_games(self, status: str, now: datetime) -> list[int]:
+        expired = []
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, game_id = heapq.heappop(self.deadlines)
+            game = self.games.get(game_id)
+            if game is None or game.deadline != deadline or game.status != status:
+                continue
+            expired.append((deadline, game_id))
+        # Актуальные записи возвращаются в кучу: пока ход не передан, игра остаётся просроченной
+        for entry in expired:
+            heapq.heappush(self.deadlines, entry)
+        return list(dict.fromkeys(self.games[game_id].peer_id for _, game_id in expired))
+
+    async def games_with_status(self, status: str) -> list[Game]:
+        return [replace(game) for game in self.games.values() if game.status == status]
+
+    async def shift_deadlines(self, status: str, delta: timedelta, peers: Optional[list[int]] = None):
+        for game in self.games.values():
+            if game.status == status and (peers is None or game.peer_id in peers):
+                if game.deadline is not None:
+                    game.deadline += delta
+                    self._push_deadline(game)
+                game.version += 1
+
+    async def get_word_and_game(self, peer_id: int) -> Optional[tuple[str, Game]]:
+        game = self._game(peer_id)
+        if game is None or game.word_id not in self.words:
+            return None
+        return self.words[game.word_id].key, replace(game)
+
+    async def get_user_by_vk_id(self, vk_id: int) -> Optional[User]:
+        user_id = self.users_by_vk.get(vk_id)
+        return self.users[user_id] if user_id is not None else None
+
+    async def get_user_by_id(self, _id: int) -> Optional[User]:
+        return self.users.get(_id)
+
+    async def get_step_order(self, game_id: int) -> list[int]:
+        return [self.users[user_id].vk_id for user_id in self.step_orders.get(game_id, ())]
+
+    async def add_score(self, user_id: int, game_id: int, score: int) -> Score:
+        self.scores[game_id][self.users[user_id].vk_id] += score
+        return Score(id=self._next_id(), user_id=user_id, game_id=game_id, score=score)
+
+    async def game_results(self, game_id: int) -> list[tuple[int, int]]:
+        return self.scores[game_id].most_common() if game_id in self.scores else []
+
+    async def append_events(self, events: list[GameEvent]):
+        for event in events:
+            self.events[event.game_id].append(replace(event, id=self._next_id()))
+
+    async def game_events(self, game_id: int) -> list[GameEvent]:
+        return [replace(event) for event in self.events.get(game_id, ())]
+
+    async def archive_games(self, statuses: list[str], ended_before: datetime, limit: int,
+                            peer_id: Optional[int] = None) -> list[int]:
+        candidates = [self._game(peer_id)] if peer_id is not None else self.games.values()
+        moved = heapq.nsmallest(limit, (
+            (game.end_time, game.id) for game in candidates
+            if game and game.status in statuses and game.end_time is not None and game.end_time < ended_before
+        ))
+        peers = []
+        for _, game_id in moved:
+            game = self.games.pop(game_id)
+            del self.games_by_peer[game.peer_id]
+            totals = self.scores.pop(game_id, Counter())
+            self.archive[game_id] = (
+                game,
+                list(self.step_orders.pop(game_id, ())),
+                {self.users_by_vk[vk_id]: total for vk_id, total in totals.items()},
+            )
+            peers.append(game.peer_id)
+        return peers
+
+    def _add_word(self, key: str, desc: str, is_used: bool = False) -> Word:
+        word = Word(id=self._next_id(), key=key, desc=desc, is_used=is_used)
+        self.words[word.id] = word
+        self.words_by_key[key] = word.id
+        self.word_ids.append(word.id)
+        if not is_used:
+            self.unused[word.id] = None
+        self.word_trigrams[word.id] = (trigrams(key), trigrams(desc))
+        self.word_changes += 1
+        return word
+
+    async def create_word(self, key: str, desc: str) -> Word:
+        if key in self.words_by_key:
+            raise ValueError("word {!r} already exists".format(key))
+        return replace(self._add_word(key, desc))
+
+    async def create_words(self, words: list[dict]) -> int:
+        inserted = 0
+        for word in words:
+            if word["key"] not in self.words_by_key:
+                self._add_word(word["key"], word["desc"], word.get("is_used", False))
+                inserted += 1
+        return inserted
+
+    async def mark_word_used(self, _id: int):
+        word = self.words.get(_id)
+        if word:
+            word.is_used = True
+            self.unused.pop(_id, None)
+            self.word_changes += 1
+
+    async def get_word_by_key(self, key: str) -> Optional[Word]:
+        word_id = self.words_by_key.get(key)
+        return replace(self.words[word_id]) if word_id is not None else None
+
+    def _iter_words(self, after_id: int = 0, is_used: Optional[bool] = None,
+                    prefix: Optional[str] = None) -> typing.Iterator[Word]:
+        for word_id in itertools.islice(self.word_ids, bisect_right(self.word_ids, after_id), None):
+            word = self.words[word_id]
+            if is_used is not None and word.is_used != is_used:
+                continue
+            if prefix and not word.key.startswith(prefix):
+                continue
+            yield replace(word)
+
+    async def list_words(self, after_id: int = 0, limit: int = 100, is_used: Optional[bool] = None,
+                         prefix: Optional[str] = None) -> list[Word]:
+        return list(itertools.islice(self._iter_words(after_id, is_used, prefix), limit))
+
+    # Похожесть считается по триграммам, как pg_trgm, но без его нормализации; полный перебор словаря
+    async def search_words(self, query: str, limit: int = 20) -> list[tuple[Word, float]]:
+        query_trigrams = trigrams(query)
+        similar = len(query) >= MIN_SIMILAR_QUERY
+        found = []
+        for word_id, (key_trigrams, desc_trigrams) in self.word_trigrams.items():
+            word = self.words[word_id]
+            score = max(similarity(key_trigrams, query_trigrams), similarity(desc_trigrams, query_trigrams))
+            is_prefix = word.key.startswith(query)
+            if is_prefix or similar and score >= SIMILARITY_THRESHOLD:
+                found.append((not is_prefix, -score, word_id))
+        return [
+            (replace(self.words[word_id]), -score)
+            for _, score, word_id in heapq.nsmallest(limit, found)
+        ]
+
+    async def stream_words(self, is_used: Optional[bool] = None, prefix: Optional[str] = None,
+                           chunk_size: int = 1000) -> AsyncIterator[list[Word]]:
+        words = self._iter_words(0, is_used, prefix)
+        while True:
+            chunk = list(itertools.islice(words, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    async def words_version(self) -> int:
+        return self.word_changes
+
+    async def unused_words(self, limit: int) -> list[tuple[str, str, int]]:
+        return [
+            (self.words[word_id].key, self.words[word_id].desc, word_id)
+            for word_id in itertools.islice(self.unused, limit)
+        ]
+
+    async def load_state(self, scope: str = "") -> dict[str, str]:
+        return scoped_state(scope, self.state)
+
+    async def save_state(self, scope: str = "", **values):
+        self.state.update({state_key(scope, key): str(value) for key, value in values.items() if value is not None})
+
+    async def delete_state(self, scope: str, *keys: str):
+        for key in keys:
+            self.state.pop(state_key(scope, key), None)
+
+    async def claim_chats(self, owner: str, peers: list[int], ttl: float) -> dict[int, Optional[str]]:
+        now = time.monotonic()
+        owners = {}
+        for peer in peers:
+            lease = self.leases.get(peer)
+            if lease is None or lease[0] == owner or lease[1] < now:
+                self.leases[peer] = (owner, now + ttl)
+            owners[peer] = self.leases[peer][0]
+        return owners
+
+    async def renew_chats(self, owner: str, peers: list[int], ttl: float) -> list[int]:
+        now = time.monotonic()
+        renewed = []
+        for peer in peers:
+            lease = self.leases.get(peer)
+            if lease and lease[0] == owner:
+                self.leases[peer] = (owner, now + ttl)
+                renewed.append(peer)
+        return renewed
+
+    async def release_chats(self, owner: str, peers: list[int]):
+        for peer in peers:
+            if self.leases.get(peer, ("",))[0] == owner:
+                self.leases[peer] = (owner, 0.0)
+
+    async def leased_chats(self, owner: str) -> list[int]:
+        return [peer for peer, lease in self.leases.items() if lease[0] == owner]
+
+    async def load_marks(self, peers: list[int]) -> dict[int, int]:
+        return {peer: self.marks[peer] for peer in peers if peer in self.marks}
+
+    async def save_marks(self, marks: dict[int, int]):
+        for peer, message_id in marks.items():
+            self.marks[peer] = max(self.marks.get(peer, 0), message_id)
@@ -0,0 +1,578 @@
+import typing
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, Optional
+
+from sqlalchemy import delete, func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.admin.models import Word, WordModel
+from app.game.models import (
+    BotStateModel,
+    ChatLeaseModel,
+    Game,
+    GameEvent,
+    GameEventModel,
+    GameModel,
+    PeerMarkModel,
+    Score,
+    ScoreModel,
+    StepOrderModel,
+    TableVersionModel,
+    User,
+    UserModel,
+)
+from app.store.storage.base import MIN_SIMILAR_QUERY, Storage, scoped_state, state_key
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+# Каналы NOTIFY, в которые пишут триггеры на games и words
+GAME_CHANNEL = "game_changes"
+WORD_CHANNEL = "word_changes"
+
+# Вступление одним запросом: игра чата и игроки находятся или создаются через ON CONFLICT,
+# новые игроки встают в конец очереди в порядке vk_ids. Пустой DO UPDATE нужен, чтобы
+# RETURNING вернул и уже существующие строки; xmax = 0 только у только что вставленной.
+# Законченная игра (статус из :closed) не обновляется, и запрос не возвращает ни строки.
+# max(step_number) читается по снимку начала запроса, поэтому два одновременных вступления
+# в одну игру могут взять одно место; уникальный индекс (game_id, step_number) отклоняет
+# второе, и оно повторяется уже с новым снимком.
+JOIN_GAME = text("""
+WITH game AS (
+    INSERT INTO games (peer_id, status) VALUES (:peer_id, :status)
+    ON CONFLICT (peer_id) DO UPDATE SET peer_id = excluded.peer_id
+    WHERE games.status IS NULL OR games.status <> ALL(CAST(:closed AS text[]))
+    RETURNING *, xmax = 0 AS created
+), joined AS (
+    SELECT vk_id, ord FROM unnest(CAST(:vk_ids AS bigint[])) WITH ORDINALITY AS t(vk_id, ord)
+), players AS (
+    INSERT INTO users (vk_id) SELECT vk_id FROM joined
+    ON CONFLICT (vk_id) DO UPDATE SET vk_id = excluded.vk_id
+    RETURNING id, vk_id
+), last_step AS (
+    SELECT coalesce(max(step_number), 0) AS step_number
+    FROM step_orders WHERE game_id = (SELECT id FROM game)
+), steps AS (
+    INSERT INTO step_orders (user_id, game_id, step_number)
+    SELECT players.id, game.id, last_step.step_number + row_number() OVER (ORDER BY joined.ord)
+    FROM joined
+    JOIN players ON players.vk_id = joined.vk_id
+    CROSS JOIN game
+    CROSS JOIN last_step
+    WHERE NOT EXISTS (SELECT 1 FROM step_orders s WHERE s.game_id = game.id AND s.user_id = players.id)
+    ON CONFLICT (game_id, user_id) DO NOTHING
+)
+SELECT * FROM game
+""")
+
+STEP_NUMBER_INDEX = "ix_step_orders_game_step"
+JOIN_RETRIES = 5
+
+# Аренда чатов одним запросом: свободные и просроченные забираются, свои продлеваются,
+# для остальных возвращается текущий владелец (NULL, если чат только что взял другой экземпляр)
+CLAIM_CHATS = text("""
+WITH wanted AS (
+    SELECT unnest(CAST(:peers AS bigint[])) AS peer_id
+), claimed AS (
+    INSERT INTO chat_leases (peer_id, owner, expires_at)
+    SELECT peer_id, :owner, now() + make_interval(secs => CAST(:ttl AS double precision)) FROM wanted
+    ON CONFLICT (peer_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+    WHERE chat_leases.owner = excluded.owner OR chat_leases.expires_at < now()
+    RETURNING peer_id
+)
+SELECT wanted.peer_id, CASE WHEN claimed.peer_id IS NULL THEN chat_leases.owner ELSE :owner END AS owner
+FROM wanted
+LEFT JOIN claimed ON claimed.peer_id = wanted.peer_id
+LEFT JOIN chat_leases ON chat_leases.peer_id = wanted.peer_id
+""")
+
+# Перенос пачки законченных игр одним запросом. Строки, которые держит другая транзакция,
+# пропускаются (SKIP LOCKED) и уйдут в следующую пачку, так что блокировки короткие.
+ARCHIVE_GAMES = text("""
+WITH moved AS (
+    SELECT id FROM games
+    WHERE status = ANY(CAST(:statuses AS text[])) AND end_time < :ended_before
+      AND (CAST(:peer_id AS bigint) IS NULL OR peer_id = CAST(:peer_id AS bigint))
+    ORDER BY end_time
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+), archived AS (
+    INSERT INTO games_archive (id, peer_id, status, start_time, end_time, word_id, archived_at)
+    SELECT games.id, peer_id, status, start_time, end_time, word_id, now()
+    FROM games JOIN moved ON moved.id = games.id
+), steps AS (
+    DELETE FROM step_orders USING moved WHERE step_orders.game_id = moved.id
+    RETURNING step_orders.game_id, step_orders.user_id, step_orders.step_number
+), archived_steps AS (
+    INSERT INTO step_orders_archive (game_id, user_id, step_number)
+    SELECT game_id, user_id, step_number FROM steps
+), scores AS (
+    DELETE FROM scores USING moved WHERE scores.game_id = moved.id
+    RETURNING scores.game_id, scores.user_id, scores.score
+), totals AS (
+    INSERT INTO score_totals_archive (game_id, user_id, total)
+    SELECT game_id, user_id, sum(coalesce(score, 0)) FROM scores GROUP BY game_id, user_id
+)
+DELETE FROM games USING moved WHERE games.id = moved.id
+RETURNING games.peer_id
+""")
+
+
+def key_prefix(prefix: str):
+    # Шаблон собирается целиком, а не через startswith (key LIKE :p || '%'): с готовым шаблоном
+    # планировщик видит префикс и берёт индекс ix_words_key_prefix
+    pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return WordModel.key.like(pattern + "%")
+
+
+def to_game(model: GameModel) -> Game:
+    return Game(
+        id=model.id,
+        start_time=model.start_time,
+        end_time=model.end_time,
+        status=model.status,
+        peer_id=model.peer_id,
+        word_id=model.word_id,
+        word_state=model.word_state,
+        whos_step=model.whos_step,
+        deadline=model.deadline,
+        version=model.version
+    )
+
+
+class PostgresStorage(Storage):
+    """Хранилище в Postgres.
+
+    С storage.notify игры кэшируются по peer_id: свои изменения кэш обновляют
+    сами, чужие (другой экземпляр бота, админка) приходят через LISTEN/NOTIFY
+    и выбрасывают из кэша ровно изменённые игры. CAS по version всё равно
+    сверяется с базой, так что устаревшая запись не приведёт к потере хода.
+    """
+
+    def __init__(self, app: "Application"):
+        super().__init__(app)
+        self.database = app.database
+        self.games: OrderedDict[int, Game] = OrderedDict()
+        self.cache_size = 0
+        self.tracks_word_changes = False
+
+    async def connect(self, *_: list, **__: dict):
+        await self.database.connect()
+        config = self.app.config.storage
+        if config.notify:
+            await self.database.listen(GAME_CHANNEL, self.on_games_changed)
+            await self.database.listen(WORD_CHANNEL, self.on_words_changed)
+            # Без уведомлений кэш не узнал бы о чужих изменениях
+            self.cache_size = config.game_cache_size
+            self.tracks_word_changes = True
+
+    def _cached_game(self, peer_id: int) -> Optional[Game]:
+        game = self.games.get(peer_id)
+        if game is None:
+            return None
+        self.games.move_to_end(peer_id)
+        return replace(game)
+
+    def _remember(self, game: Game):
+        if not self.cache_size:
+            return
+        self.games[game.peer_id] = replace(game)
+        self.games.move_to_end(game.peer_id)
+        while len(self.games) > self.cache_size:
+            self.games.popitem(last=False)
+
+    def on_games_changed(self, message: Optional[dict]):
+        if message is None or message["games"] is None:
+            self.games.clear()
+            self.app.metrics.inc("storage.game_cache.flushed")
+            return
+        for peer_id, version in message["games"]:
+            cached = self.games.get(peer_id)
+            if cached and (message["op"] == "DELETE" or cached.version != version):
+                del self.games[peer_id]
+                self.app.metrics.inc("storage.game_cache.invalidated")
+
+    def on_words_changed(self, message: Optional[dict]):
+        ids = message["ids"] if message else None
+        for listener in self.word_listeners:
+            listener(ids)
+
+    async def warm_up(self):
+        await self.database.warm_up()
+
+    async def disconnect(self, *_: list, **__: dict):
+        await self.database.disconnect()
+
+    async def join_game(self, peer_id: int, vk_ids: list[int], status: str,
+                        closed: Iterable[str] = ()) -> Optional[tuple[Game, bool]]:
+        params = {"peer_id": peer_id, "status": status, "vk_ids": list(dict.fromkeys(vk_ids)), "closed": list(closed)}
+        for attempt in range(JOIN_RETRIES):
+            try:
+                async with self.database.session.begin() as session:
+                    row = (await session.execute(JOIN_GAME, params)).first()
+                break
+            except IntegrityError as e:
+                if STEP_NUMBER_INDEX not in str(e) or attempt == JOIN_RETRIES - 1:
+                    raise
+        if row is None:
+            return None
+        game = to_game(row)
+        self._remember(game)
+        return game, row.created
+
+    async def get_game(self, peer_id: int) -> Optional[Game]:
+        game = self._cached_game(peer_id)
+        if game:
+            return game
+        async with self.database.session() as session:
+            res = (await session.execute(
+                select(GameModel)
+                .where(GameModel.peer_id == peer_id)
+            )).scalars().first()
+            if res:
+                game = to_game(res)
+                self._remember(game)
+                return game
+
+    async def cas_update_game(self, game: Game, **values) -> bool:
+        async with self.database.session() as session:
+            res = await session.execute(
+                update(GameModel).
+                where(GameModel.id == game.id, GameModel.version == game.version).
+                values(version=GameModel.version + 1, **values)
+            )
+            await session.commit()
+        if res.rowcount == 1:
+            self._remember(replace(game, version=game.version + 1, **values))
+            return True
+        # Игру изменили в обход кэша, а уведомление ещё не дошло: перечитывать надо из базы
+        self.games.pop(game.peer_id, None)
+        return False
+
+    async def set_game_status(self, peer_id: int, status: str, unless: Iterable[str] = ()) -> Optional[Game]:
+        Q = update(GameModel).where(GameModel.peer_id == peer_id)
+        unless = list(unless)
+        if unless:
+            Q = Q.where(GameModel.status.notin_(unless))
+        async with self.database.session() as session:
+            row = (await session.execute(
+                Q.values(
+                    end_time=datetime.now(),
+                    status=status,
+                    deadline=None,
+                    version=GameModel.version + 1
+                ).returning(*GameModel.__table__.c)
+            )).first()
+            await session.commit()
+        if row is None:
+            self.games.pop(peer_id, None)
+            return None
+        game = to_game(row)
+        self._remember(game)
+        return game
+
+    async def expired_games(self, status: str, now: datetime) -> list[int]:
+        async with self.database.session() as session:
+            return (await session.execute(
+                select(GameModel.peer_id)
+                .where(GameModel.status == status)
+                .where(GameModel.deadline <= now)
+            )).scalars().all()
+
+    async def games_with_status(self, status: str) -> list[Game]:
+        async with self.database.session() as session:
+            res = (await session.execute(
+                select(GameModel)
+                .where(GameModel.status == status)
+            )).scalars().all()
+        games = [to_game(row) for row in res]
+        # Кэш ограничен cache_size, остальные игры прочитаются при первой команде
+        for game in games[:self.cache_size]:
+            self._remember(game)
+        return games
+
+    async def shift_deadlines(self, status: str, delta: timedelta, peers: Optional[list[int]] = None):
+        stmt = update(GameModel).where(GameModel.status == status)
+        if peers is not None:
+            stmt = stmt.where(GameModel.peer_id.in_(peers))
+        async with self.database.session.begin() as session:
+            await session.execute(
+                stmt.values(
+                    deadline=GameModel.deadline + delta,
+                    version=GameModel.version + 1
+                )
+            )
+        self.games.clear()
+
+    async def get_word_and_game(self, peer_id: int) -> Optional[tuple[str, Game]]:
+        async with self.database.session() as session:
+            res = (await session.execute(
+                select(WordModel.key, GameModel)
+                .join(GameModel, WordModel.id == GameModel.word_id)
+                .where(GameModel.peer_id == peer_id)
+            )).first()
+        if res:
+            game = to_game(res.GameModel)
+            self._remember(game)
+            return res.key, game
+
+    async def get_user_by_vk_id(self, vk_id: int) -> Optional[User]:
+        async with self.database.session() as session:
+            res = (await session.execute(
+                select(UserModel)
+                .where(UserModel.vk_id == vk_id)
+            )).scalars().first()
+            if res:
+                return User(id=res.id, vk_id=res.vk_id)
+
+    async def get_user_by_id(self, _id: int) -> Optional[User]:
+        async with self.database.session() as session:
+            res = (await session.execute(
+                select(UserModel)
+                .where(UserModel.id == _id)
+            )).scalars().first()
+            if res:
+                return User(id=res.id, vk_id=res.vk_id)
+
+    async def get_step_order(self, game_id: int) -> list[int]:
+        async with self.database.session() as session:
+            return (await session.execute(
+                select(UserModel.vk_id)
+                .join(StepOrderModel, StepOrderModel.user_id == UserModel.id)
+                .where(StepOrderModel.game_id == game_id)
+                .order_by(StepOrderModel.step_number)
+            )).scalars().all()
+
+    async def add_score(self, user_id: int, game_id: int, score: int) -> Score:
+        new_score = ScoreModel(user_id=user_id, game_id=game_id, score=score)
+        async with self.database.session() as session:
+            session.add(new_score)
+            await session.commit()
+        return Score(id=new_score.id, user_id=new_score.user_id, game_id=new_score.game_id, score=new_score.score)
+
+    async def game_results(self, game_id: int) -> list[tuple[int, int]]:
+        async with self.database.session() as session:
+            res = (await session.execute(
+                select(UserModel.vk_id, func.sum(ScoreModel.score))
+                .join(UserModel, UserModel.id == ScoreModel.user_id)
+                .where(ScoreModel.game_id == game_id)
+                .group_by(UserModel.vk_id)
+                .order_by(func.sum(ScoreModel.score).desc())
+            )).all()
+        return [tuple(row) for row in res]
+
+    async def append_events(self, events: list[GameEvent]):
+        async with self.database.session.begin() as session:
+            await session.execute(insert(GameEventModel), [
+                {
+                    "game_id": event.game_id,
+                    "peer_id": event.peer_id,
+                    "kind": event.kind,
+                    "vk_id": event.vk_id,
+                    "data": event.data,
+                    "created_at": event.created_at,
+                }
+                for event in events
+            ])
+
+    async def game_events(self, game_id: int) -> list[GameEvent]:
+        async with self.database.session() as session:
+            res = (await session.execute(
+                select(GameEventModel)
+                .where(GameEventModel.game_id == game_id)
+                .order_by(GameEventModel.id)
+            )).scalars().all()
+        return [
+            GameEvent(
+                game_id=row.game_id,
+                peer_id=row.peer_id,
+                kind=row.kind,
+                vk_id=row.vk_id,
+                data=row.data,
+                created_at=row.created_at,
+                id=row.id,
+            )
+            for row in res
+        ]
+
+    async def archive_games(self, statuses: list[str], ended_before: datetime, limit: int,
+                            peer_id: Optional[int] = None) -> list[int]:
+        async with self.database.session.begin() as session:
+            peers = (await session.execute(ARCHIVE_GAMES, {
+                "statuses": list(statuses), "ended_before": ended_before, "limit": limit, "peer_id": peer_id,
+            })).scalars().all()
+        # Уведомления о своих изменениях не приходят, поэтому кэш чистится здесь
+        for archived in peers:
+            self.games.pop(archived, None)
+        return peers
+
+    async def create_word(self, key: str, desc: str) -> Word:
+        new_word = WordModel(key=key, desc=desc)
+        async with self.database.session.begin() as session:
+            session.add(new_word)
+        return Word(id=new_word.id, key=new_word.key, desc=new_word.desc, is_used=new_word.is_used)
+
+    async def create_words(self, words: list[dict]) -> int:
+        if not words:
+            return 0
+        async with self.database.session.begin() as session:
+            res = await session.execute(
+                insert(WordModel)
+                .values(words)
+                .on_conflict_do_nothing(index_elements=["key"])
+                .returning(WordModel.id)
+            )
+            return len(res.all())
+
+    async def mark_word_used(self, _id: int):
+        async with self.database.session.begin() as session:
+            await session.execute(
+                update(WordModel)
+                .where(WordModel.id == _id)
+                .values(is_used=True)
+            )
+
+    async def get_word_by_key(self, key: str) -> Optional[Word]:
+        async with self.database.session() as session:
+            res = (await session.execute(
+                select(WordModel)
+                .where(WordModel.key == key)
+            )).scalars().first()
+            if res:
+                return Word(id=res.id, key=res.key, desc=res.desc, is_used=res.is_used)
+
+    @staticmethod
+    def _words_query(after_id: int = 0, is_used: Optional[bool] = None, prefix: Optional[str] = None):
+        Q = (
+            select(WordModel.id, WordModel.key, WordModel.desc, WordModel.is_used)
+            .where(WordModel.id > after_id)
+            .order_by(WordModel.id)
+        )
+        if is_used is not None:
+            Q = Q.where(WordModel.is_used == is_used)
+        if prefix:
+            Q = Q.where(key_prefix(prefix))
+        return Q
+
+    # Keyset-пагинация: следующая страница начинается после последнего id предыдущей
+    async def list_words(self, after_id: int = 0, limit: int = 100, is_used: Optional[bool] = None,
+                         prefix: Optional[str] = None) -> list[Word]:
+        Q = self._words_query(after_id, is_used, prefix).limit(limit)
+        async with self.database.session() as session:
+            res = (await session.execute(Q)).all()
+            return [Word(*row) for row in res]
+
+    # Поиск похожих слов по key и desc через pg_trgm; совпадения по префиксу ключа идут первыми
+    async def search_words(self, query: str, limit: int = 20) -> list[tuple[Word, float]]:
+        score = func.greatest(func.similarity(WordModel.key, query), func.similarity(WordModel.desc, query))
+        is_prefix = key_prefix(query)
+        if len(query) >= MIN_SIMILAR_QUERY:
+            matches = or_(WordModel.key.op("%")(query), WordModel.desc.op("%")(query), is_prefix)
+        else:
+            matches = is_prefix
+        Q = (
+            select(WordModel.id, WordModel.key, WordModel.desc, WordModel.is_used, score)
+            .where(matches)
+            .order_by(is_prefix.desc(), score.desc(), WordModel.id)
+            .limit(limit)
+        )
+        async with self.database.session() as session:
+            res = (await session.execute(Q)).all()
+            return [(Word(*row[:4]), row[4]) for row in res]
+
+    # Выгрузка всех слов серверным курсором, в памяти одновременно не больше chunk_size строк
+    async def stream_words(self, is_used: Optional[bool] = None, prefix: Optional[str] = None,
+                           chunk_size: int = 1000) -> AsyncIterator[list[Word]]:
+        Q = self._words_query(0, is_used, prefix).execution_options(yield_per=chunk_size)
+        async with self.database.session() as session:
+            result = await session.stream(Q)
+            async for rows in result.partitions(chunk_size):
+                yield [Word(*row) for row in rows]
+
+    # Версию ведёт триггер на words, так что её видят все экземпляры и изменения в обход бота
+    async def words_version(self) -> int:
+        async with self.database.session() as session:
+            return (await session.execute(
+                select(TableVersionModel.version)
+                .where(TableVersionModel.name == "words")
+            )).scalar_one()
+
+    async def unused_words(self, limit: int) -> list[tuple[str, str, int]]:
+        async with self.database.session() as session:
+            res = (await session.execute(
+                select(WordModel.key, WordModel.desc, WordModel.id)
+                .where(WordModel.is_used == False)
+                .limit(limit)
+            )).all()
+        return [tuple(row) for row in res]
+
+    async def load_state(self, scope: str = "") -> dict[str, str]:
+        async with self.database.session() as session:
+            rows = (await session.execute(select(BotStateModel.key, BotStateModel.value))).all()
+        return scoped_state(scope, dict(rows))
+
+    async def save_state(self, scope: str = "", **values):
+        values = {state_key(scope, key): str(value) for key, value in values.items() if value is not None}
+        if not values:
+            return
+        stmt = insert(BotStateModel).values([{"key": key, "value": value} for key, value in values.items()])
+        stmt = stmt.on_conflict_do_update(index_elements=[BotStateModel.key], set_={"value": stmt.excluded.value})
+        async with self.database.session.begin() as session:
+            await session.execute(stmt)
+
+    async def delete_state(self, scope: str, *keys: str):
+        keys = [state_key(scope, key) for key in keys]
+        async with self.database.session.begin() as session:
+            await session.execute(delete(BotStateModel).where(BotStateModel.key.in_(keys)))
+
+    async def claim_chats(self, owner: str, peers: list[int], ttl: float) -> dict[int, Optional[str]]:
+        async with self.database.session.begin() as session:
+            rows = (await session.execute(CLAIM_CHATS, {"peers": peers, "owner": owner, "ttl": ttl})).all()
+        return dict(rows)
+
+    async def renew_chats(self, owner: str, peers: list[int], ttl: float) -> list[int]:
+        async with self.database.session.begin() as session:
+            return (await session.execute(
+                update(ChatLeaseModel)
+                .where(ChatLeaseModel.owner == owner, ChatLeaseModel.peer_id.in_(peers))
+                .values(expires_at=func.now() + timedelta(seconds=ttl))
+                .returning(ChatLeaseModel.peer_id)
+            )).scalars().all()
+
+    async def release_chats(self, owner: str, peers: list[int]):
+        async with self.database.session.begin() as session:
+            # Строка остаётся: по последнему владельцу перезапущенный экземпляр находит свои чаты
+            await session.execute(
+                update(ChatLeaseModel)
+                .where(ChatLeaseModel.owner == owner, ChatLeaseModel.peer_id.in_(peers))
+                .values(expires_at=func.now())
+            )
+
+    async def leased_chats(self, owner: str) -> list[int]:
+        async with self.database.session() as session:
+            return (await session.execute(
+                select(ChatLeaseModel.peer_id).where(ChatLeaseModel.owner == owner)
+            )).scalars().all()
+
+    async def load_marks(self, peers: list[int]) -> dict[int, int]:
+        async with self.database.session() as session:
+            rows = (await session.execute(
+                select(PeerMarkModel.peer_id, PeerMarkModel.message_id).where(PeerMarkModel.peer_id.in_(peers))
+            )).all()
+        return dict(rows)
+
+    async def save_marks(self, marks: dict[int, int]):
+        if not marks:
+            return
+        stmt = insert(PeerMarkModel).values(
+            [{"peer_id": peer, "message_id": message_id} for peer, message_id in marks.items()]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PeerMarkModel.peer_id],
+            set_={"message_id": func.greatest(PeerMarkModel.message_id, stmt.excluded.message_id)},
+        )
+        async with self.database.session.begin() as session:
+            await session.execute(stmt)
@@ -1,12 +1,16 @@
+import random
 import time
 import typing
+from collections import Counter
 from typing import Optional
 
-from aiohttp.client import ClientSession
-
 from app.base.base_accessor import BaseAccessor
-from app.store.vk_api.dataclasses import Message, Update, UpdateObject, UpdateMessage
+from app.diagnostics.budget import count_vk_call
+from app.store.vk_api.dataclasses import Message
+from app.store.vk_api.decoder import PollUpdate, decode_long_poll, decode_updates
 from app.store.vk_api.poller import Poller
+from app.store.vk_api.recorder import PollRecorder
+from app.store.vk_api.transport import VkApiError, VkTransport, VkUnavailable
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
@@ -15,98 +19,114 @@ if typing.TYPE_CHECKING:
 class VkApiAccessor(BaseAccessor):
     def __init__(self, app: "Application", *args, **kwargs):
         super().__init__(app, *args, **kwargs)
-        self.session: Optional[ClientSession] = None
+        self.transport = VkTransport(app, app.config.vk_http)
         self.key: Optional[str] = None
         self.server: Optional[str] = None
         self.poller: Optional[Poller] = None
         self.ts: Optional[int] = None
+        self.recorder: Optional[PollRecorder] = None
 
     async def connect(self, app: "Application"):
-        self.session = ClientSession()
+        await self.transport.open()
+        if self.app.config.recorder.enabled:
+            self.recorder = PollRecorder(self.app.config.recorder.path)
 
-        resp = await self.session.get(
-            self._build_query(
-                "https://api.vk.com/method/",
-                "groups.getLongPollServer",
-                {
-                    "access_token": self.app.config.bot.token,
-                    "group_id": self.app.config.bot.group_id,
-                    "v": "5.131",
-                    "wait": 30,
-                }
-            )
-        )
-        data = await resp.json()
-        self.ts = data['response']['ts']
-        self.key = data['response']['key']
-        self.server = data['response']['server']
-        poller = Poller(store=app.store)
-        await poller.start()
+    # Сервер long poll, курсор и поллер запускаются шагами app.web.bootstrap
+    async def restore_cursor(self, state: dict[str, str]):
+        # Продолжаем с сохранённого ts: сообщения, пришедшие за время перезапуска, не теряются.
+        # Устаревший ts VK вернёт как failed=1 вместе с новым.
+        if state.get("ts"):
+            self.ts = state["ts"]
+
+    async def start_polling(self):
+        self.poller = Poller(store=self.app.store, drain_timeout=self.app.config.bot.drain_timeout)
+        await self.poller.start()
 
     async def disconnect(self, app: "Application"):
-        if self.session:
-            await self.session.close()
+        # Сначала дорабатывают обработчики, потом сохраняется курсор, и только потом закрывается сессия
         if self.poller:
             await self.poller.stop()
+        await app.store.bots_manager.shutdown()
+        try:
+            await self.app.storage.save_state(
+                app.store.bots_manager.leases.state_scope,
+                ts=self.ts, key=self.key, server=self.server, stopped_at=time.time()
+            )
+        except Exception:
+            self.logger.exception("Could not save long poll state")
+        await self.transport.close()
+        if self.recorder:
+            self.recorder.close()
 
-    @staticmethod
-    def _build_query(host: str, method: str, params: dict) -> str:
-        url = host + method + "?"
-        if "v" not in params:
-            params["v"] = "5.131"
-        url += "&".join([f"{k}={v}" for k, v in params.items()])
-        return url
-
-    async def _get_long_poll_service(self):
-        params = {
-            "act": "a_check",
-            "key": self.key,
-            "ts": self.ts,
-            "wait": 5,  # TODO: 30
-        }
-        return self._build_query(self.server, '', params)
+    async def get_long_poll_server(self):
+        data = await self.transport.call("groups.getLongPollServer", {"group_id": self.app.config.bot.group_id})
+        self.ts = data['response']['ts']
+        self.key = data['response']['key']
+        self.server = data['response']['server']
 
     async def poll(self):
-        resp = await self.session.get(
-            await self._get_long_poll_service()
+        wait = self.app.config.vk_http.long_poll_wait
+        started = time.perf_counter()
+        raw = await self.transport.long_poll(
+            self.server, {"act": "a_check", "key": self.key, "ts": self.ts, "wait": wait}, wait
         )
-        data = await resp.json()
-        self.ts = data['ts']
-        updates = [
-            Update(
-                type=upd['type'],
-                object=UpdateObject(
-                    message=UpdateMessage(
-                        vk_user_id=upd['object']['message']['from_id'],
-                        from_id=upd['object']['message']['peer_id'],
-                        text=upd['object']['message']['text'],
-                        id=upd['object']['message']['id'],
-                    )
-                ),
-            )
-            for upd in data['updates']
-        ]
+        duration = time.perf_counter() - started
+        if self.recorder:
+            self.recorder.write(raw)
+        dropped = Counter()
+        ts, updates, failed = decode_long_poll(raw, dropped)
+        if ts is not None:
+            self.ts = ts
+        if failed in (2, 3):
+            # Ключ истёк (2) или потеряна история (3): нужен новый сервер, при 3 - и новый ts
+            ts = self.ts
+            await self.get_long_poll_server()
+            if failed == 2:
+                self.ts = ts
+        self.count_dropped(dropped)
+        return self.assign_traces(updates, started, duration)
+
+    def parse_updates(self, data: dict) -> list[PollUpdate]:
+        dropped = Counter()
+        updates = decode_updates(data, dropped)
+        self.count_dropped(dropped)
+        return self.assign_traces(updates)
+
+    def count_dropped(self, dropped: Counter):
+        for reason, count in dropped.items():
+            self.app.metrics.inc("bot.ingress.dropped", count, reason=reason)
+
+    def assign_traces(self, updates: list[PollUpdate], started: Optional[float] = None,
+                      duration: Optional[float] = None) -> list[PollUpdate]:
+        for update in updates:
+            update.trace_id = self.app.tracer.new_trace(started, duration)
         return updates
 
     async def send_message(self, message: Message) -> None:
         params = {
-            "access_token": self.app.config.bot.token,
             "group_id": self.app.config.bot.group_id,
-            "random_id": int(time.time() * 100),
+            # Время в сотых секунды совпадало у ответов, отправленных подряд, и VK отбрасывал их как повтор
+            "random_id": random.getrandbits(31),
             "message": message.text,
             "peer_id": message.user_id,
         }
-        resp = await self.session.post(
-            self._build_query('https://api.vk.com/method/', 'messages.send', params)
-        )
+        count_vk_call()
+        with self.app.tracer.span("reply"):
+            try:
+                await self.transport.call("messages.send", params)
+            except VkUnavailable as err:
+                # Ответ теряется, но состояние игры уже записано, и команда доигрывается до конца
+                self.app.metrics.inc("vk.degraded", method="messages.send")
+                self.logger.warning("%s", err)
+            except VkApiError as err:
+                # Как и раньше, ошибка VK на ответ не прерывает обработку команды
+                self.logger.warning("%s", err)
 
-    async def get_user_info(self, _id):
+    async def get_user_info(self, _id) -> dict:
         params = {
-            "access_token": self.app.config.bot.token,
             "user_ids": _id,
             "name_case": "nom",
         }
-        resp = await self.session.get(
-            self._build_query('https://api.vk.com/method/', 'users.get', params)
-        )
-        return resp
+        count_vk_call()
+        with self.app.tracer.span("vk.users.get"):
+            return await self.transport.call("users.get", params)
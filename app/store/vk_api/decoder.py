@@ -0,0 +1,84 @@
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from app.base.json_codec import loads
+
+MESSAGE_NEW = "message_new"
+COMMAND_PREFIX = "/"
+
+
+# Те же поля, что у UpdateMessage, UpdateObject и Update из dataclasses.py (их менять нельзя),
+# но со slots: на каждый long poll их создаётся много, так они компактнее и быстрее
+@dataclass(slots=True)
+class PollMessage:
+    vk_user_id: int
+    from_id: int
+    text: str
+    id: int
+
+
+@dataclass(slots=True)
+class PollObject:
+    message: PollMessage
+
+
+@dataclass(slots=True)
+class PollUpdate:
+    type: str
+    object: PollObject
+    trace_id: Optional[str] = None
+    # Когда бот получил обновление (time.monotonic); 0 - неизвестно
+    received: float = 0.0
+
+
+def decode_updates(data: dict, dropped: Optional[Counter] = None) -> list[PollUpdate]:
+    """Оставляет только команды из message_new; отброшенное считается в dropped по причинам."""
+    updates = []
+    received = time.monotonic()
+    for upd in data.get("updates", ()):
+        # Остальные события боту не нужны, объекты под них не создаются
+        if upd.get("type") != MESSAGE_NEW:
+            if dropped is not None:
+                dropped["event"] += 1
+            continue
+        message = upd["object"]["message"]
+        text = message["text"]
+        # Обычная переписка в чате: бот на неё не отвечает
+        if not text.startswith(COMMAND_PREFIX):
+            if dropped is not None:
+                dropped["chatter"] += 1
+            continue
+        # В беседах без прав администратора id приходит нулевым, и такие сообщения дедупликация пропускает:
+        # conversation_message_id - другая нумерация, сравнивать его с отметками по id нельзя
+        updates.append(PollUpdate(
+            MESSAGE_NEW,
+            PollObject(PollMessage(message["from_id"], message["peer_id"], text, message["id"])),
+            received=received,
+        ))
+    return updates
+
+
+def encode_update(update) -> dict:
+    """Обратно в формат события long poll - для пересылки другому экземпляру бота."""
+    message = update.object.message
+    return {
+        "type": MESSAGE_NEW,
+        "object": {
+            "message": {
+                "id": message.id,
+                "from_id": message.vk_user_id,
+                "peer_id": message.from_id,
+                "text": message.text,
+            }
+        },
+    }
+
+
+def decode_long_poll(
+        raw: Union[bytes, str], dropped: Optional[Counter] = None
+) -> tuple[Optional[str], list[PollUpdate], Optional[int]]:
+    """Ответ a_check -> (ts, команды из message_new, код failed)."""
+    data = loads(raw)
+    return data.get("ts"), decode_updates(data, dropped), data.get("failed")
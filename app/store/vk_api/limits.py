@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class LimitExceeded(Exception):
+    pass
+
+
+class AimdLimiter:
+    """Адаптивный предел одновременных вызовов (AIMD).
+
+    Пока ответы быстрее latency_target, предел растёт примерно на единицу
+    за каждые limit вызовов; на медленном ответе или ошибке умножается на
+    backoff, но не чаще раза за окно: вызовы, начатые до последнего
+    уменьшения, предел больше не уменьшают. Кто не поместился, ждёт в очереди не дольше queue_timeout,
+    а при переполненной очереди сразу получает LimitExceeded.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, latency_target: float,
+                 max_queue: int, queue_timeout: float, backoff: float = 0.5):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.inflight = 0
+        self.waiting = 0
+        # Когда предел последний раз уменьшался (time.perf_counter)
+        self.decreased_at = float("-inf")
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _has_room(self) -> bool:
+        return self.inflight < int(self.limit)
+
+    async def acquire(self) -> float:
+        """Занимает место; возвращает время начала вызова для release."""
+        if not self._has_room():
+            if self.waiting >= self.max_queue:
+                raise LimitExceeded("queue is full")
+            if self._cond is None:
+                self._cond = asyncio.Condition()
+            self.waiting += 1
+            try:
+                async with self._cond:
+                    await asyncio.wait_for(self._cond.wait_for(self._has_room), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise LimitExceeded("waited more than {}s".format(self.queue_timeout))
+            finally:
+                self.waiting -= 1
+        self.inflight += 1
+        return time.perf_counter()
+
+    async def release(self, started: float, ok: Optional[bool]) -> bool:
+        """Освобождает место; True, если предел был уменьшен. ok=None - исход неизвестен, предел не меняется."""
+        self.inflight -= 1
+        latency = time.perf_counter() - started
+        decreased = False
+        if ok is not None:
+            if not ok or latency > self.latency_target:
+                # Вызовы одного окна обычно тормозят вместе; их перегрузку уже учло одно уменьшение
+                if started > self.decreased_at:
+                    decreased = self.limit > self.min_limit
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.decreased_at = time.perf_counter()
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        if self._cond is not None and self.waiting:
+            async with self._cond:
+                self._cond.notify_all()
+        return decreased
+
+
+class CircuitBreaker:
+    """Размыкается после failure_threshold ошибок подряд и reset_timeout секунд отвечает отказом.
+
+    Затем пропускает один пробный вызов: успех замыкает цепь, ошибка снова размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return self.state != self.OPEN
+
+    def success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def cancelled(self):
+        # Отменённый пробный вызов ничего не показал, следующий может попробовать снова
+        self._probing = False
+
+    def failure(self) -> bool:
+        """Учитывает ошибку; True, если цепь только что разомкнулась."""
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            opened = self.state != self.OPEN
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            return opened
+        return False
@@ -1,30 +1,52 @@
 import asyncio
 
 from asyncio import Task
+from logging import getLogger
 from typing import Optional
 
 from app.store import Store
 
 
 class Poller:
-    def __init__(self, store: Store):
+    def __init__(self, store: Store, drain_timeout: float = 10.0):
         self.store = store
+        self.drain_timeout = drain_timeout
+        self.logger = getLogger("poller")
         self.is_running = False
+        # Идёт обработка полученной пачки, а не ожидание long poll
+        self.is_handling = False
         self.poll_task: Optional[Task] = None
 
     async def start(self):
+        self.is_running = True
         self.poll_task = asyncio.create_task(self.poll())
 
     async def stop(self):
-        if self.poll_task:
-            try:
-                await asyncio.wait_for(self.poll_task, timeout=None)
-            except asyncio.TimeoutError:
-                print('timeout!')
+        self.is_running = False
+        if not self.poll_task or self.poll_task.done():
+            return
+        if not self.is_handling:
+            # Ждём только ответа long poll: ts ещё не сдвинут, ничего не теряется
+            self.poll_task.cancel()
+        try:
+            await asyncio.wait_for(self.poll_task, timeout=self.drain_timeout)
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            self.logger.warning("Handlers did not finish in %.1fs, cancelled", self.drain_timeout)
 
     async def poll(self):
-        updates = await self.store.vk_api.poll()
-        if updates:
-            await self.store.bots_manager.handle_updates(updates=updates)
-        # Заново ждем сообщений
-        await self.start()
+        while self.is_running:
+            try:
+                updates = await self.store.vk_api.poll()
+                if updates:
+                    self.is_handling = True
+                    try:
+                        await self.store.bots_manager.handle_updates(updates=updates)
+                    finally:
+                        self.is_handling = False
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception("Poll failed")
+                await asyncio.sleep(1)
@@ -0,0 +1,27 @@
+import time
+from typing import Iterator
+
+from app.base.json_codec import loads
+
+
+class PollRecorder:
+    """Дописывает сырые ответы long poll в файл: одна строка {"t": время, "r": ответ}."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "ab")
+
+    def write(self, raw: bytes):
+        # Переводы строк внутри JSON-строк экранированы, остальные можно выбросить
+        self._file.write(b'{"t":%.6f,"r":%s}\n' % (time.time(), raw.replace(b"\n", b"")))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_recording(path: str) -> Iterator[tuple[float, dict]]:
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                record = loads(line)
+                yield record["t"], record["r"]
@@ -0,0 +1,155 @@
+import asyncio
+import time
+import typing
+from logging import getLogger
+from typing import Optional
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector, TraceConfig
+
+from app.base.json_codec import loads
+from app.store.vk_api.limits import AimdLimiter, CircuitBreaker, LimitExceeded
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+    from app.web.config import VkHttpConfig
+
+
+# Ошибки VK, говорящие о перегрузке на его стороне: 6 - слишком много запросов, 10 - внутренняя ошибка
+OVERLOAD_CODES = (6, 10)
+
+
+class VkApiError(Exception):
+    def __init__(self, method: str, code: Optional[int], message: str):
+        super().__init__("{} failed with {}: {}".format(method, code, message))
+        self.method = method
+        self.code = code
+
+
+class VkUnavailable(VkApiError):
+    """VK не ответил, отвечает слишком медленно или цепь разомкнута - вызов не выполнен."""
+
+    def __init__(self, method: str, message: str):
+        super().__init__(method, None, message)
+
+
+class VkTransport:
+    """HTTP-клиент VK API: общий пул keep-alive соединений, параметры - телом POST.
+
+    Токен и текст сообщений не попадают в URL: там нет ограничения на длину
+    и они не оседают в логах прокси. Создание и переиспользование соединений
+    считается в метриках vk.http.connections.
+    """
+
+    def __init__(self, app: "Application", config: "VkHttpConfig"):
+        self.app = app
+        self.config = config
+        self.logger = getLogger("vk_transport")
+        self.session: Optional[ClientSession] = None
+        # Предел общий на все методы: медленный VK тормозит их одинаково
+        self.limiter = AimdLimiter(
+            initial=config.initial_concurrency,
+            min_limit=config.min_concurrency,
+            max_limit=config.max_concurrency,
+            latency_target=config.latency_target,
+            max_queue=config.max_queue,
+            queue_timeout=config.queue_timeout,
+        )
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    async def open(self):
+        trace_config = TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection("created"))
+        trace_config.on_connection_reuseconn.append(self._on_connection("reused"))
+        trace_config.on_dns_cache_miss.append(self._on_connection("dns_miss"))
+        connector = TCPConnector(
+            limit=self.config.limit,
+            limit_per_host=self.config.limit_per_host,
+            ttl_dns_cache=self.config.dns_cache_ttl,
+            keepalive_timeout=self.config.keepalive_timeout,
+        )
+        self.session = ClientSession(
+            connector=connector,
+            timeout=ClientTimeout(total=self.config.timeout),
+            trace_configs=[trace_config],
+        )
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    def _on_connection(self, event: str):
+        async def handler(session, context, params):
+            self.app.metrics.inc("vk.http.connections", event=event)
+
+        return handler
+
+    def breaker(self, method: str) -> CircuitBreaker:
+        breaker = self.breakers.get(method)
+        if breaker is None:
+            breaker = self.breakers[method] = CircuitBreaker(self.config.breaker_failures, self.config.breaker_reset)
+        return breaker
+
+    async def call(self, method: str, params: dict, timeout: Optional[float] = None) -> dict:
+        breaker = self.breaker(method)
+        if not breaker.allow():
+            self.app.metrics.inc("vk.breaker.rejected", method=method)
+            raise VkUnavailable(method, "circuit is open")
+        try:
+            started = await self.limiter.acquire()
+        except LimitExceeded as err:
+            # Вызов так и не ушёл в VK: пробный вызов полуоткрытой цепи может сделать следующий
+            breaker.cancelled()
+            self.app.metrics.inc("vk.limiter.rejected", method=method)
+            raise VkUnavailable(method, str(err))
+        except asyncio.CancelledError:
+            breaker.cancelled()
+            raise
+        # None - вызов отменён (например, при остановке), на предел и цепь он не влияет
+        ok = None
+        try:
+            body = await self._post(method, params, timeout)
+            ok = body.get("error", {}).get("error_code") not in OVERLOAD_CODES
+        except (ClientError, asyncio.TimeoutError, ValueError) as err:
+            ok = False
+            raise VkUnavailable(method, repr(err)) from err
+        finally:
+            if await self.limiter.release(started, ok):
+                self.app.metrics.inc("vk.limiter.decreased")
+            if ok is None:
+                breaker.cancelled()
+            elif ok:
+                breaker.success()
+            elif breaker.failure():
+                self.app.metrics.inc("vk.breaker.opened", method=method)
+                self.logger.warning("Circuit for %s is open for %.0fs", method, self.config.breaker_reset)
+        if "error" in body:
+            error = body["error"]
+            self.app.metrics.inc("vk.http.errors", method=method, code=error.get("error_code"))
+            raise VkApiError(method, error.get("error_code"), error.get("error_msg"))
+        return body
+
+    async def _post(self, method: str, params: dict, timeout: Optional[float]) -> dict:
+        data = {
+            "access_token": self.app.config.bot.token,
+            "v": self.config.api_version,
+            **{key: value for key, value in params.items() if value is not None},
+        }
+        started = time.perf_counter()
+        # Тело читается целиком внутри async with: соединение сразу возвращается в пул
+        async with self.session.post(
+            self.app.config.bot.api_url + method,
+            data=data,
+            timeout=ClientTimeout(total=timeout or self.config.timeout),
+        ) as resp:
+            body = loads(await resp.read())
+        self.app.metrics.observe("vk.http.latency", time.perf_counter() - started, method=method)
+        return body
+
+    async def long_poll(self, server: str, params: dict, wait: int) -> bytes:
+        # Ответ long poll может идти до wait секунд, таймаут с запасом сверху
+        async with self.session.get(
+            server,
+            params={key: str(value) for key, value in params.items()},
+            timeout=ClientTimeout(total=wait + self.config.long_poll_margin),
+        ) as resp:
+            return await resp.read()
@@ -1,20 +1,32 @@
-from typing import Optional
+from typing import Callable, Optional
 
 from aiohttp.web import (
     Application as AiohttpApplication,
     Request as AiohttpRequest,
     View as AiohttpView,
 )
+from app.diagnostics.loop_monitor import LoopMonitor, setup_monitoring
+from app.diagnostics.metrics import Metrics, setup_metrics
+from app.diagnostics.profiler import Profiler, setup_profiling
+from app.diagnostics.tracing import Tracer, setup_tracing
 from app.store.database.database import Database
+from app.store.storage.base import Storage
 from app.store import Store, setup_store
 from app.web.config import Config, setup_config
 from app.web.routes import setup_routes
+from app.web.bootstrap import Bootstrap, setup_bootstrap
 
 
 class Application(AiohttpApplication):
     config: Optional[Config] = None
     database: Optional[Database] = None
+    storage: Optional[Storage] = None
     store: Optional[Store] = None
+    tracer: Optional[Tracer] = None
+    loop_monitor: Optional[LoopMonitor] = None
+    metrics: Optional[Metrics] = None
+    profiler: Optional[Profiler] = None
+    bootstrap: Optional[Bootstrap] = None
 
 
 class Request(AiohttpRequest):
@@ -45,8 +57,16 @@ class View(AiohttpView):
 app = Application()
 
 
-def setup_app(config_path: str) -> Application:
+def setup_app(config_path: str, configure: Optional[Callable[[Config], None]] = None) -> Application:
+    """configure правит прочитанный конфиг до того, как по нему собираются хранилище и accessor'ы."""
     setup_config(app, config_path)
+    if configure:
+        configure(app.config)
+    setup_metrics(app)
+    setup_tracing(app)
+    setup_monitoring(app)
+    setup_profiling(app)
     setup_routes(app)
     setup_store(app)
+    setup_bootstrap(app)
     return app
@@ -0,0 +1,151 @@
+import asyncio
+import time
+import typing
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Optional
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+
+@dataclass
+class Step:
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    after: list[str] = field(default_factory=list)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+    result: Any = None
+
+
+class Bootstrap:
+    """Запуск приложения шагами с явными зависимостями.
+
+    Независимые шаги идут параллельно, каждый - как только готовы его
+    зависимости. Всё выполняется в фоне: HTTP-сервер поднимается сразу,
+    /healthz отвечает, а /readyz - только когда отработали все шаги.
+    """
+
+    def __init__(self, app: "Application"):
+        self.app = app
+        self.logger = getLogger("bootstrap")
+        self.steps: dict[str, Step] = {}
+        self.ready = False
+        self.error: Optional[str] = None
+        self.began: Optional[float] = None
+        self.total: Optional[float] = None
+        self.first_reply: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, func: Callable[[], Awaitable[Any]], after: tuple[str, ...] = ()):
+        for dependency in after:
+            if dependency not in self.steps:
+                raise ValueError("Step {} depends on unknown step {}".format(name, dependency))
+        self.steps[name] = Step(name=name, func=func, after=list(after))
+
+    def result(self, name: str) -> Any:
+        return self.steps[name].result
+
+    async def start(self, app: "Application"):
+        self.began = time.perf_counter()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self, app: "Application"):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def wait_ready(self):
+        await self._task
+        if self.error:
+            raise RuntimeError(self.error)
+
+    async def run(self):
+        if self.began is None:
+            self.began = time.perf_counter()
+        tasks: dict[str, asyncio.Task] = {}
+        for step in self.steps.values():
+            tasks[step.name] = asyncio.create_task(self._run_step(step, [tasks[name] for name in step.after]))
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        self.total = time.perf_counter() - self.began
+        failed = [step for step in self.steps.values() if step.error]
+        if failed:
+            self.error = "; ".join("{}: {}".format(step.name, step.error) for step in failed)
+            self.logger.error("Startup failed after %.3fs: %s", self.total, self.error)
+            return
+        self.ready = True
+        self.logger.info("Ready in %.3fs: %s", self.total, ", ".join(
+            "{} {:.3f}s".format(step.name, step.finished - step.started) for step in self.steps.values()
+        ))
+
+    async def _run_step(self, step: Step, dependencies: list[asyncio.Task]):
+        try:
+            await asyncio.gather(*dependencies)
+        except Exception:
+            step.error = "dependency failed"
+            raise
+        step.started = time.perf_counter() - self.began
+        try:
+            step.result = await step.func()
+        except Exception as err:
+            step.error = repr(err)
+            self.logger.exception("Startup step %s failed", step.name)
+            raise
+        step.finished = time.perf_counter() - self.began
+
+    def mark_first_reply(self):
+        if self.first_reply is None and self.began is not None:
+            self.first_reply = time.perf_counter() - self.began
+            self.logger.info("First reply %.3fs after start", self.first_reply)
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "total": self.total,
+            "first_reply": self.first_reply,
+            "steps": {
+                step.name: {
+                    "after": step.after,
+                    "started": step.started,
+                    "duration": step.finished - step.started if step.finished is not None else None,
+                    "error": step.error,
+                }
+                for step in self.steps.values()
+            },
+        }
+
+
+def setup_bootstrap(app: "Application"):
+    bootstrap = Bootstrap(app)
+    app.bootstrap = bootstrap
+    store = app.store
+    bootstrap.add("storage", app.storage.connect)
+    bootstrap.add("storage.warm_up", app.storage.warm_up, after=("storage",))
+    bootstrap.add("vk.server", store.vk_api.get_long_poll_server)
+    bootstrap.add(
+        "state", lambda: app.storage.load_state(store.bots_manager.leases.state_scope), after=("storage",)
+    )
+    bootstrap.add(
+        "vk.cursor", lambda: store.vk_api.restore_cursor(bootstrap.result("state")), after=("vk.server", "state")
+    )
+    bootstrap.add("words", store.bots_manager.fill_word_pool, after=("storage",))
+    bootstrap.add("games", lambda: store.bots_manager.warm_start(bootstrap.result("state")), after=("state",))
+    # Таймер хода стартует после сдвига дедлайнов на время простоя
+    bootstrap.add("timer", store.bots_manager.start_timer, after=("games",))
+    bootstrap.add("events", store.bots_manager.event_log.start, after=("storage",))
+    bootstrap.add("archive", store.bots_manager.archiver.start, after=("storage",))
+    ready = ("storage.warm_up", "vk.cursor", "words", "games")
+    if app.config.leases.enabled:
+        bootstrap.add("leases", store.bots_manager.leases.start, after=("storage",))
+        ready += ("leases",)
+    # Сообщения начинают читаться, только когда всё остальное готово
+    bootstrap.add("poller", store.vk_api.start_polling, after=ready)
+    app.on_startup.append(bootstrap.start)
+    # Незавершённый запуск отменяется раньше, чем начнут закрываться accessor'ы
+    app.on_cleanup.insert(0, bootstrap.stop)
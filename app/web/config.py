@@ -1,5 +1,5 @@
 import typing
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 import yaml
 
@@ -11,6 +11,30 @@ if typing.TYPE_CHECKING:
 class BotConfig:
     token: str
     group_id: int
+    api_url: str = "https://api.vk.com/method/"
+    drain_timeout: float = 10.0
+    word_pool_size: int = 50
+
+
+@dataclass
+class VkHttpConfig:
+    api_version: str = "5.131"
+    limit: int = 100
+    limit_per_host: int = 30
+    keepalive_timeout: float = 60.0
+    dns_cache_ttl: int = 300
+    timeout: float = 10.0
+    long_poll_wait: int = 25
+    long_poll_margin: float = 10.0
+    initial_concurrency: int = 10
+    min_concurrency: int = 1
+    max_concurrency: int = 50
+    latency_target: float = 1.0
+    max_queue: int = 100
+    queue_timeout: float = 2.0
+    breaker_failures: int = 5
+    breaker_reset: float = 30.0
+    names_ttl: float = 3600.0
 
 
 @dataclass
@@ -20,12 +44,123 @@ class DatabaseConfig:
     user: str = "postgres"
     password: str = "postgres"
     database: str = "miracle_filed"
+    echo: bool = True
+    warm_connections: int = 5
+
+
+@dataclass
+class StorageConfig:
+    # postgres или memory: всё в памяти процесса, без базы и без сохранения между перезапусками
+    backend: str = "postgres"
+    # Только для postgres: подписка на изменения через LISTEN/NOTIFY и кэш игр, который она поддерживает
+    notify: bool = True
+    game_cache_size: int = 10000
+
+
+@dataclass
+class TracingConfig:
+    enabled: bool = False
+    path: str = "traces.jsonl"
+    sample_rate: float = 0.1
+    max_bytes: int = 10 * 1024 * 1024
+    backup_count: int = 5
+
+
+@dataclass
+class MonitorConfig:
+    enabled: bool = True
+    interval: float = 1.0
+    lag_threshold: float = 0.1
+    stuck_threshold: float = 60.0
+    history: int = 300
+    ignore: list[str] = field(default_factory=lambda: ["_run_app", "RequestHandler.start", "Poller.poll"])
+
+
+@dataclass
+class ProfilingConfig:
+    enabled: bool = False
+    sort: str = "cumulative"
+    limit: int = 50
+    tracemalloc_frames: int = 10
+
+
+@dataclass
+class RecorderConfig:
+    enabled: bool = False
+    path: str = "longpoll.rec"
+
+
+@dataclass
+class IngressConfig:
+    enabled: bool = True
+    user_rate: float = 1.0
+    user_burst: int = 5
+    chat_rate: float = 5.0
+    chat_burst: int = 20
+    max_keys: int = 10000
+    # Сообщения, ждущие обработки дольше max_lag секунд с получения, отбрасываются с ответом busy_text
+    max_lag: float = 10.0
+    busy_text: str = "Бот перегружен, повторите команду чуть позже"
+
+
+@dataclass
+class DedupConfig:
+    size: int = 10000
+    persist: bool = False
+
+
+@dataclass
+class LeasesConfig:
+    # Несколько экземпляров бота: каждый чат ведёт только арендовавший его экземпляр
+    enabled: bool = False
+    # Имя экземпляра, постоянное между перезапусками: под ним записываются аренда и состояние бота.
+    # Пустое - имя хоста; экземплярам на одной машине нужны разные имена
+    node: str = ""
+    ttl: float = 15.0
+    heartbeat: float = 5.0
+    # Аренда чата без команд дольше этого отпускается, чтобы чаты перераспределялись
+    idle_release: float = 300.0
+    # Пересылать владельцу команды его чатов. При long poll не нужно: события получают все экземпляры
+    forward: bool = False
+
+
+@dataclass
+class ArchiveConfig:
+    # Законченные игры переносятся из горячих таблиц в архивные фоновой задачей
+    enabled: bool = True
+    interval: float = 60.0
+    batch_size: int = 100
+    # Пауза между пачками, чтобы перенос не занимал базу надолго
+    pause: float = 0.1
+    # Сколько секунд законченная игра остаётся на месте: пока подводятся итоги
+    grace: float = 10.0
+
+
+@dataclass
+class EventsConfig:
+    # Журнал событий игр пишется пачками из памяти
+    enabled: bool = True
+    flush_interval: float = 1.0
+    batch_size: int = 500
+    # Если база недоступна, столько событий ждёт в памяти, остальные теряются
+    max_pending: int = 50000
 
 
 @dataclass
 class Config:
     bot: BotConfig = None
+    vk_http: VkHttpConfig = None
     database: DatabaseConfig = None
+    storage: StorageConfig = None
+    tracing: TracingConfig = None
+    monitor: MonitorConfig = None
+    profiling: ProfilingConfig = None
+    recorder: RecorderConfig = None
+    ingress: IngressConfig = None
+    dedup: DedupConfig = None
+    leases: LeasesConfig = None
+    archive: ArchiveConfig = None
+    events: EventsConfig = None
 
 
 def setup_config(app: "Application", config_path: str):
@@ -36,6 +171,20 @@ def setup_config(app: "Application", config_path: str):
         bot=BotConfig(
             token=raw_config["bot"]["token"],
             group_id=raw_config["bot"]["group_id"],
+            api_url=raw_config["bot"].get("api_url", BotConfig.api_url),
+            drain_timeout=raw_config["bot"].get("drain_timeout", BotConfig.drain_timeout),
+            word_pool_size=raw_config["bot"].get("word_pool_size", BotConfig.word_pool_size),
         ),
+        vk_http=VkHttpConfig(**raw_config.get("vk_http", {})),
         database=DatabaseConfig(**raw_config["database"]),
+        storage=StorageConfig(**raw_config.get("storage", {})),
+        tracing=TracingConfig(**raw_config.get("tracing", {})),
+        monitor=MonitorConfig(**raw_config.get("monitor", {})),
+        profiling=ProfilingConfig(**raw_config.get("profiling", {})),
+        recorder=RecorderConfig(**raw_config.get("recorder", {})),
+        ingress=IngressConfig(**raw_config.get("ingress", {})),
+        dedup=DedupConfig(**raw_config.get("dedup", {})),
+        leases=LeasesConfig(**raw_config.get("leases", {})),
+        archive=ArchiveConfig(**raw_config.get("archive", {})),
+        events=EventsConfig(**raw_config.get("events", {})),
     )
@@ -1,6 +1,8 @@
 from aiohttp.web_app import Application
 from app.admin.routes import setup_routes as admin_setup_routes
+from app.diagnostics.routes import setup_routes as diagnostics_setup_routes
 
 
 def setup_routes(app: Application):
     admin_setup_routes(app)
+    diagnostics_setup_routes(app)
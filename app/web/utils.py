@@ -0,0 +1,19 @@
+from typing import Optional
+
+from aiohttp.web_response import Response, json_response as aiohttp_json_response
+
+from app.base.json_codec import dumps
+
+
+def json_response(data=None, **kwargs) -> Response:
+    return aiohttp_json_response(data=data, dumps=dumps, **kwargs)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли etag с одним из тегов If-None-Match; "*" совпадает с любым, W/ не учитывается."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags:
+        return True
+    return etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
@@ -0,0 +1,138 @@
+"""Бюджеты запросов к базе и вызовов VK API на команду (app.diagnostics.budget.BUDGETS).
+
+Партия из трёх игроков проходит через каждую команду, и после каждой
+вызывается check_budget, так что N+1 в обработчике роняет тесты.
+VK заглушен. На хранилище в памяти запросом считается каждый вызов
+хранилища: в Postgres каждый из них - один запрос или меньше (кэш игр),
+так что это оценка сверху. Если локальный Postgres из config.yml доступен,
+та же партия прогоняется и на нём с настоящим счётчиком запросов.
+"""
+import asyncio
+import functools
+import inspect
+import random
+from collections import deque
+
+import pytest
+
+from app.diagnostics.budget import check_budget, collect_update_stats, count_query
+from app.store.bot.manager import CANCEL, FINISH, GAME_OVER, PREPARE, START, command_name
+from app.store.storage.base import Storage
+from tools.common import boot_app, close_app, make_update
+
+PEER_ID = 5000000000
+PLAYERS = [910000001, 910000002, 910000003]
+WORD = "пароход"
+
+
+def count_storage_calls(storage: Storage):
+    """Каждый вызов метода хранилища засчитывается как запрос к базе."""
+    for name, method in inspect.getmembers(storage, inspect.iscoroutinefunction):
+        if name.startswith("_") or not hasattr(Storage, name):
+            continue
+
+        def counted(method):
+            @functools.wraps(method)
+            async def wrapper(*args, **kwargs):
+                count_query()
+                return await method(*args, **kwargs)
+            return wrapper
+
+        setattr(storage, name, counted(method))
+
+
+class Party:
+    def __init__(self, app, stub):
+        self.app = app
+        self.stub = stub
+        self.manager = app.store.bots_manager
+        self.peer_id = PEER_ID + random.randint(1, 10 ** 6)
+        self.sent = []
+        send = stub.send_message
+
+        async def send_message(message):
+            self.sent.append(message.text)
+            await send(message)
+
+        app.store.vk_api.send_message = send_message
+
+    async def game(self):
+        return await self.app.storage.get_game(self.peer_id)
+
+    async def send(self, user_id: int, text: str):
+        """Команда под счётчиком; возвращает тексты ответов."""
+        self.sent.clear()
+        with collect_update_stats(command_name(text)) as stats:
+            await self.manager.handle_update(make_update(self.peer_id, user_id, text))
+        check_budget(stats)
+        # Каждая команда отвечает в чат: без ответа бюджет проверялся бы на пустом месте
+        assert stats.vk_calls >= 1, "{} did nothing".format(text)
+        return list(self.sent)
+
+    async def timeout(self):
+        with collect_update_stats("turn_timeout") as stats:
+            await self.manager.change_player(self.peer_id)
+        check_budget(stats)
+        assert stats.vk_calls >= 1
+
+    async def prepare_word(self) -> str:
+        key = "{}{}{}".format(WORD, self.peer_id, random.randint(0, 10 ** 6))
+        word = await self.app.storage.create_word(key, "Проверка бюджета")
+        self.manager.word_pool = deque([(word.key, word.desc, word.id)])
+        return key
+
+    async def play(self):
+        a, b, c = PLAYERS
+        for player in PLAYERS:
+            await self.send(player, "/играть")
+        assert (await self.game()).status == PREPARE
+        key = await self.prepare_word()
+        await self.send(a, "/начать")
+        assert (await self.game()).status == START
+        assert await self.send(b, "/буква п") == ["Сейчас не Ваш ход"]
+        await self.send(a, "/буква п")
+        await self.send(a, "/буква ю")
+        assert (await self.game()).whos_step == b
+        await self.send(b, "/буква а")
+        await self.send(b, "/буква ю")
+        await self.send(c, "/слово неверно")
+        assert (await self.game()).whos_step == a
+        await self.timeout()
+        assert (await self.game()).whos_step == b
+        await self.send(b, "/слово {}".format(key))
+        assert (await self.game()).status == FINISH
+        await self.send(a, "/помощь")
+        assert await self.send(a, "/начать") == [GAME_OVER]
+
+        # Новая партия в том же чате: прошлая игра сразу уходит в архив
+        self.app.config.archive.grace = 0
+        await self.send(a, "/играть")
+        await self.send(b, "/играть")
+        game = await self.game()
+        assert game.status == PREPARE
+        assert await self.app.storage.get_step_order(game.id) == [a, b]
+        await self.prepare_word()
+        await self.send(a, "/начать")
+        await self.send(a, "/завершить")
+        assert (await self.game()).status == CANCEL
+
+
+async def play(storage: str):
+    try:
+        app, stub = await asyncio.wait_for(boot_app(storage=storage), timeout=5)
+    except (OSError, asyncio.TimeoutError) as err:
+        pytest.skip("{} storage is not available: {!r}".format(storage, err))
+    try:
+        if storage == "memory":
+            count_storage_calls(app.storage)
+        await Party(app, stub).play()
+    finally:
+        await close_app(app)
+
+
+def test_budgets_memory():
+    asyncio.run(play("memory"))
+
+
+def test_budgets_postgres():
+    asyncio.run(play("postgres"))
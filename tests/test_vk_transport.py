@@ -0,0 +1,60 @@
+"""Цепь и предел вызовов VkTransport без настоящего VK: _post подменяется."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.diagnostics.metrics import Metrics
+from app.store.vk_api.limits import CircuitBreaker
+from app.store.vk_api.transport import VkTransport, VkUnavailable
+from app.web.config import VkHttpConfig
+
+
+def make_transport(**config) -> VkTransport:
+    app = SimpleNamespace(metrics=Metrics())
+    transport = VkTransport(app, VkHttpConfig(breaker_failures=1, breaker_reset=0, **config))
+
+    async def post(method, params, timeout):
+        return {"response": 1}
+
+    transport._post = post
+    return transport
+
+
+def half_open(transport: VkTransport, method: str) -> CircuitBreaker:
+    breaker = transport.breaker(method)
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_probe_rejected_by_limiter_does_not_wedge_breaker():
+    async def scenario():
+        transport = make_transport(initial_concurrency=1, min_concurrency=1, max_queue=0)
+        breaker = half_open(transport, "messages.send")
+        # Единственное место занято, очереди нет: пробный вызов отклоняет предел
+        started = await transport.limiter.acquire()
+        with pytest.raises(VkUnavailable, match="queue is full"):
+            await transport.call("messages.send", {})
+        await transport.limiter.release(started, None)
+        assert await transport.call("messages.send", {}) == {"response": 1}
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_probe_cancelled_in_limiter_queue_does_not_wedge_breaker():
+    async def scenario():
+        transport = make_transport(initial_concurrency=1, min_concurrency=1, queue_timeout=10)
+        breaker = half_open(transport, "messages.send")
+        started = await transport.limiter.acquire()
+        probe = asyncio.create_task(transport.call("messages.send", {}))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        await transport.limiter.release(started, None)
+        assert await transport.call("messages.send", {}) == {"response": 1}
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+"""Импорт слов через /admin.import_words на хранилище в памяти.
+
+Тело подаётся кусками, как его отдаёт сеть, в том числе с разрывом посреди
+многобайтовой буквы и поля в кавычках.
+"""
+import asyncio
+from unittest import mock
+
+from aiohttp.streams import StreamReader
+from aiohttp.test_utils import make_mocked_request
+
+from app.admin.views import WordImportView
+from app.base.json_codec import loads
+from tools.common import boot_app, close_app
+
+
+async def post_import(app, body: bytes, content_type: str, chunk_size: int = 7) -> dict:
+    payload = StreamReader(mock.Mock(_reading_paused=False), 2 ** 16, loop=asyncio.get_running_loop())
+    for start in range(0, len(body), chunk_size):
+        payload.feed_data(body[start:start + chunk_size])
+    payload.feed_eof()
+    request = make_mocked_request(
+        "POST", "/admin.import_words", headers={"Content-Type": content_type}, app=app, payload=payload
+    )
+    response = await WordImportView(request)
+    return loads(response.body)
+
+
+def test_csv_import_with_multiline_field_and_duplicates():
+    async def scenario():
+        app, _ = await boot_app(storage="memory")
+        try:
+            await app.storage.create_words([{"key": "кот", "desc": "уже есть"}])
+            body = (
+                'key,desc\n'
+                'пароход,"судно\nс паровым двигателем, ""колёсное"""\n'
+                'кот,животное\n'
+                'пароход,повтор в том же файле\n'
+                'без описания\n'
+                'самолёт,летает'
+            ).encode()
+            result = await post_import(app, body, "text/csv")
+            assert result == {"inserted": 2, "duplicates": 2, "invalid": 1}
+            word = await app.storage.get_word_by_key("пароход")
+            assert word.desc == 'судно\nс паровым двигателем, "колёсное"'
+            assert (await app.storage.get_word_by_key("самолёт")).desc == "летает"
+        finally:
+            await close_app(app)
+
+    asyncio.run(scenario())
+
+
+def test_csv_import_unclosed_quote_is_invalid():
+    async def scenario():
+        app, _ = await boot_app(storage="memory")
+        try:
+            result = await post_import(app, 'лес,деревья\nполе,"без конца\n'.encode(), "text/csv")
+            assert result == {"inserted": 1, "duplicates": 0, "invalid": 1}
+        finally:
+            await close_app(app)
+
+    asyncio.run(scenario())
+
+
+def test_ndjson_import():
+    async def scenario():
+        app, _ = await boot_app(storage="memory")
+        try:
+            body = '{"key": "река", "desc": "вода"}\n{"key": "река", "desc": "снова"}\nне json\n'.encode()
+            result = await post_import(app, body, "application/x-ndjson")
+            assert result == {"inserted": 1, "duplicates": 1, "invalid": 1}
+        finally:
+            await close_app(app)
+
+    asyncio.run(scenario())
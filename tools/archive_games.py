@@ -0,0 +1,37 @@
+"""Разовый перенос всех законченных игр в архив, например после обновления.
+
+Делает то же, что фоновая задача бота: пачки по --batch-size с паузой
+между ними, законченные меньше --grace секунд назад игры не трогаются.
+
+    python -m tools.archive_games --batch-size 500
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from tools.common import CONFIG_PATH, boot_app, close_app
+
+
+async def main(args: argparse.Namespace) -> int:
+    app, _ = await boot_app(args.config)
+    config = app.config.archive
+    config.batch_size = args.batch_size
+    config.pause = args.pause
+    config.grace = args.grace
+    try:
+        started = time.perf_counter()
+        moved = await app.store.bots_manager.archiver.run_once()
+        print("archived {} games in {:.1f}s".format(moved, time.perf_counter() - started))
+    finally:
+        await close_app(app)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move all finished games into the archive tables")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1)
+    parser.add_argument("--grace", type=float, default=10.0)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,113 @@
+"""Скорость разбора ответов long poll.
+
+Корпус - запись tools.replay / recorder (--recording) или синтетические
+ответы. Сравнивается прежний разбор (stdlib json + dataclass через kwargs),
+decode_updates поверх stdlib json и decode_long_poll (orjson, если есть).
+
+    python -m tools.bench_decode --recording longpoll.rec
+"""
+import argparse
+import json
+import random
+import time
+
+from app.base import json_codec
+from app.store.vk_api.dataclasses import Update, UpdateObject, UpdateMessage
+from app.store.vk_api.decoder import PollUpdate, decode_long_poll, decode_updates
+from app.store.vk_api.recorder import read_recording
+
+
+def synthetic_corpus(payloads: int, per_payload: int, chatter: float) -> list[bytes]:
+    corpus = []
+    message_id = 0
+    for ts in range(payloads):
+        updates = []
+        for _ in range(per_payload):
+            message_id += 1
+            if random.random() < chatter:
+                updates.append({"type": "message_typing_state", "object": {"state": "typing", "from_id": 1}})
+                continue
+            updates.append({
+                "type": "message_new",
+                "event_id": "e{}".format(message_id),
+                "group_id": 1,
+                "object": {
+                    "message": {
+                        "id": message_id,
+                        "date": 1666000000 + message_id,
+                        "from_id": random.randint(1, 10 ** 6),
+                        "peer_id": 2000000000 + random.randint(1, 1000),
+                        "text": random.choice(["/буква а", "/слово машина", "/играть", "привет всем"]),
+                        "attachments": [],
+                        "conversation_message_id": message_id,
+                        "fwd_messages": [],
+                    },
+                    "client_info": {"button_actions": ["text"], "keyboard": True, "lang_id": 0},
+                },
+            })
+        corpus.append(json.dumps({"ts": str(ts), "updates": updates}).encode())
+    return corpus
+
+
+def baseline(raw: bytes) -> list[Update]:
+    data = json.loads(raw)
+    return [
+        Update(
+            type=upd["type"],
+            object=UpdateObject(
+                message=UpdateMessage(
+                    vk_user_id=upd["object"]["message"]["from_id"],
+                    from_id=upd["object"]["message"]["peer_id"],
+                    text=upd["object"]["message"]["text"],
+                    id=upd["object"]["message"]["id"],
+                )
+            ),
+        )
+        for upd in data["updates"] if upd["type"] == "message_new"
+    ]
+
+
+def stdlib_lean(raw: bytes) -> list[PollUpdate]:
+    return decode_updates(json.loads(raw))
+
+
+def fast(raw: bytes) -> list[PollUpdate]:
+    return decode_long_poll(raw)[1]
+
+
+def measure(decode, corpus: list[bytes], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for raw in corpus:
+            decode(raw)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark long poll decoding")
+    parser.add_argument("--recording", help="recorder file to use as the corpus")
+    parser.add_argument("--payloads", type=int, default=1000)
+    parser.add_argument("--per-payload", type=int, default=20)
+    parser.add_argument("--chatter", type=float, default=0.3, help="share of non message_new events")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(1)
+    if args.recording:
+        corpus = [json.dumps(data).encode() for _, data in read_recording(args.recording)]
+    else:
+        corpus = synthetic_corpus(args.payloads, args.per_payload, args.chatter)
+    size = sum(len(raw) for raw in corpus) * args.rounds
+    # Считаются все события на входе: новый разбор отбрасывает часть из них
+    events = sum(len(json.loads(raw)["updates"]) for raw in corpus) * args.rounds
+
+    print("{} payloads, {:.1f} MB per round, fast codec: {}".format(
+        len(corpus), size / args.rounds / 2 ** 20, "orjson" if json_codec.orjson else "stdlib json"
+    ))
+    for name, decode in (("baseline", baseline), ("lean+stdlib", stdlib_lean), ("lean+codec", fast)):
+        elapsed = measure(decode, corpus, args.rounds)
+        print("{:<12} {:>10.0f} events/s {:>8.1f} MB/s".format(name, events / elapsed, size / elapsed / 2 ** 20))
+
+
+if __name__ == "__main__":
+    main()
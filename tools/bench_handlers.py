@@ -0,0 +1,245 @@
+"""Бенчмарк обработчиков BotManager на локальном Postgres.
+
+Команды подаются прямо в BotManager.handle_updates, исходящие вызовы VK
+подменены заглушкой. Таблицы заполняются до реалистичных размеров
+(--seed, по умолчанию 1M scores, 100k games, 50k words).
+
+    python -m tools.bench_handlers --seed --save bench/baseline.json
+    python -m tools.bench_handlers --compare bench/baseline.json --threshold 0.1
+
+С --storage memory база не нужна: остаётся только стоимость самих обработчиков.
+
+    python -m tools.bench_handlers --storage memory
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select, text, update
+
+from app.admin.models import WordModel
+from app.game.models import GameModel
+from app.web.app import Application
+from tools.common import CONFIG_PATH, boot_app, close_app, make_update, percentile
+
+# peer_id для посеянных данных и для чатов бенчмарка не пересекаются
+SEED_PEER_OFFSET = 3000000000
+BENCH_PEER_OFFSET = 4000000000
+BENCH_USER_OFFSET = 900000000
+BENCH_WORD = "бенчмаркинг"
+MISSING_LETTER = "ю"
+
+
+async def seed(app: Application, words: int, games: int, scores: int, users: int):
+    """Заполняет таблицы через generate_series, если в них меньше строк, чем нужно."""
+    async with app.database.session.begin() as session:
+        have_games = (await session.execute(select(func.count(GameModel.id)))).scalar()
+        if have_games >= games:
+            return
+        print("Seeding {} words, {} users, {} games, {} scores...".format(words, users, games, scores))
+        await session.execute(text(
+            "INSERT INTO words (key, \"desc\", is_used) "
+            "SELECT 'seed' || g, 'seed word ' || g, true FROM generate_series(1, :n) g "
+            "ON CONFLICT (key) DO NOTHING"
+        ), {"n": words})
+        await session.execute(text(
+            "INSERT INTO users (vk_id) SELECT g FROM generate_series(1, :n) g"
+        ), {"n": users})
+        await session.execute(text(
+            "INSERT INTO games (start_time, end_time, status, peer_id, word_state) "
+            "SELECT now() - interval '1 day', now(), 'finished', :offset + g, 'seed' "
+            "FROM generate_series(1, :n) g"
+        ), {"n": games, "offset": SEED_PEER_OFFSET})
+        await session.execute(text(
+            "INSERT INTO scores (user_id, game_id, score) "
+            "SELECT u.id, g.id, 50 FROM generate_series(1, :n) s "
+            "JOIN users u ON u.id = 1 + (s * 7919) % :users "
+            "JOIN games g ON g.id = 1 + (s * 104729) % :games"
+        ), {"n": scores, "users": users, "games": games})
+    async with app.database._engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE"))
+
+
+class Bench:
+    def __init__(self, app: Application, iterations: int):
+        self.app = app
+        self.manager = app.store.bots_manager
+        self.iterations = iterations
+        self.queries = 0
+        self._peer = BENCH_PEER_OFFSET + random.randint(0, 10 ** 6) * 1000
+        if app.database:
+            event.listen(app.database._engine.sync_engine, "after_cursor_execute", self._count_query)
+
+    def _count_query(self, *_):
+        self.queries += 1
+
+    def next_peer(self) -> int:
+        self._peer += 1
+        return self._peer
+
+    async def send(self, peer_id: int, user_id: int, text: str):
+        await self.manager.handle_updates([make_update(peer_id, user_id, text)])
+
+    async def add_bench_word(self):
+        key = "{}{}".format(BENCH_WORD, self._peer)
+        if not self.app.database:
+            while words := await self.app.storage.unused_words(1000):
+                for _, _, word_id in words:
+                    await self.app.storage.mark_word_used(word_id)
+            await self.app.storage.create_word(key, "бенчмарк")
+            self.manager.word_pool.clear()
+            return
+        async with self.app.database.session.begin() as session:
+            await session.execute(
+                update(WordModel).where(WordModel.is_used == False).values(is_used=True)
+            )
+            session.add(WordModel(key=key, desc="бенчмарк", is_used=False))
+        # Слова из пула только что помечены использованными
+        self.manager.word_pool.clear()
+
+    async def joined(self, players: int = 2) -> int:
+        peer_id = self.next_peer()
+        for i in range(players):
+            await self.send(peer_id, BENCH_USER_OFFSET + i, "/играть")
+        return peer_id
+
+    async def started(self) -> int:
+        peer_id = await self.joined()
+        await self.add_bench_word()
+        await self.send(peer_id, BENCH_USER_OFFSET, "/начать")
+        return peer_id
+
+    async def expired(self) -> int:
+        peer_id = await self.started()
+        game = await self.app.storage.get_game(peer_id)
+        await self.app.storage.cas_update_game(game, deadline=datetime.now() - timedelta(seconds=1))
+        return peer_id
+
+    def scenarios(self) -> dict:
+        player = BENCH_USER_OFFSET
+        return {
+            "join": (self.next_peer, lambda p: self.send(p, player, "/играть")),
+            "start": (self.joined, lambda p: self.send(p, player, "/начать")),
+            "letter_hit": (self.started, lambda p: self.send(p, player, "/буква н")),
+            "letter_miss": (self.started, lambda p: self.send(p, player, "/буква " + MISSING_LETTER)),
+            "word_hit": (self.started, lambda p: self.send(p, player, "/слово {}{}".format(BENCH_WORD, p))),
+            "word_miss": (self.started, lambda p: self.send(p, player, "/слово неверно")),
+            # Срабатывание таймера хода: change_step вызывает change_player для каждой просроченной игры
+            "turn_timeout": (self.expired, lambda p: self.manager.change_player(p)),
+            "finish": (self.started, lambda p: self.send(p, player, "/завершить")),
+        }
+
+    async def run_scenario(self, prepare, action) -> dict:
+        timings = []
+        queries = []
+        for i in range(self.iterations + 1):
+            prepared = prepare()
+            peer_id = await prepared if asyncio.iscoroutine(prepared) else prepared
+            before = self.queries
+            started = time.perf_counter()
+            await action(peer_id)
+            elapsed = time.perf_counter() - started
+            # Первая итерация - прогрев
+            if i:
+                timings.append(elapsed)
+                queries.append(self.queries - before)
+        return {
+            "iterations": len(timings),
+            "mean_ms": statistics.mean(timings) * 1000,
+            "median_ms": statistics.median(timings) * 1000,
+            "p95_ms": percentile(timings, 0.95) * 1000,
+            "min_ms": min(timings) * 1000,
+            "stdev_ms": statistics.pstdev(timings) * 1000,
+            "queries": statistics.median(queries),
+        }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    print("{:<14} {:>11} {:>11} {:>8}".format("scenario", "base ms", "now ms", "change"))
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        change = result["median_ms"] / base["median_ms"] - 1
+        mark = ""
+        if change > threshold:
+            regressions.append(name)
+            mark = "  REGRESSION"
+        print("{:<14} {:>11.2f} {:>11.2f} {:>+7.1f}%{}".format(
+            name, base["median_ms"], result["median_ms"], change * 100, mark
+        ))
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    random.seed(args.random_seed)
+    app, _ = await boot_app(args.config, args.storage)
+    try:
+        if not app.database:
+            # В памяти размер таблиц на поиск не влияет, нужны только слова для /начать
+            await app.store.admins.create_words([
+                {"key": "seed{}".format(i), "desc": "seed word {}".format(i)} for i in range(args.iterations + 1)
+            ])
+        elif args.seed:
+            await seed(app, args.words, args.games, args.scores, args.users)
+        bench = Bench(app, args.iterations)
+        scenarios = bench.scenarios()
+        selected = args.only.split(",") if args.only else list(scenarios)
+        results = {}
+        for name in selected:
+            prepare, action = scenarios[name]
+            results[name] = await bench.run_scenario(prepare, action)
+            r = results[name]
+            print("{:<14} median {:>8.2f}ms  p95 {:>8.2f}ms  queries {:>5}".format(
+                name, r["median_ms"], r["p95_ms"], r["queries"]
+            ))
+    finally:
+        await close_app(app)
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "iterations": args.iterations,
+            "storage": app.config.storage.backend,
+            "sizes": {"words": args.words, "games": args.games, "scores": args.scores, "users": args.users},
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions over {:.0f}%: {}".format(args.threshold * 100, ", ".join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark BotManager command handlers")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--only", help="comma separated scenario names")
+    parser.add_argument("--storage", choices=("postgres", "memory"), help="override the storage backend")
+    parser.add_argument("--seed", action="store_true", help="fill tables up to the sizes below (postgres only)")
+    parser.add_argument("--words", type=int, default=50000)
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--scores", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown of the median")
+    sys.exit(asyncio.run(main(parser.parse_args())))
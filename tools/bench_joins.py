@@ -0,0 +1,115 @@
+"""Наплыв вступлений: --players игроков пишут /играть в один чат.
+
+Сравнивает два режима: каждое /играть отдельной пачкой long poll и все
+сразу одной пачкой, где вступления чата сливаются в один запрос. После
+каждого прогона проверяется, что в очереди ходов все игроки по одному
+разу и номера ходов идут подряд. VK заглушен.
+
+    python -m tools.bench_joins --players 50 --rounds 20
+    python -m tools.bench_joins --storage memory
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import event, select
+
+from app.game.models import StepOrderModel
+from tools.common import CONFIG_PATH, boot_app, close_app, make_update
+
+PEER_OFFSET = 6000000000
+USER_OFFSET = 920000000
+
+
+class JoinStorm:
+    def __init__(self, app, players: int):
+        self.app = app
+        self.manager = app.store.bots_manager
+        self.players = players
+        self.queries = 0
+        self._peer = PEER_OFFSET + random.randint(0, 10 ** 6) * 1000
+        if app.database:
+            event.listen(app.database._engine.sync_engine, "after_cursor_execute", self._count_query)
+
+    def _count_query(self, *_):
+        self.queries += 1
+
+    def updates(self, peer_id: int) -> list:
+        return [make_update(peer_id, USER_OFFSET + i, "/играть") for i in range(self.players)]
+
+    async def one_by_one(self, peer_id: int):
+        for update in self.updates(peer_id):
+            await self.manager.handle_updates([update])
+
+    async def batched(self, peer_id: int):
+        await self.manager.handle_updates(self.updates(peer_id))
+
+    async def check(self, peer_id: int):
+        game = await self.app.storage.get_game(peer_id)
+        order = await self.app.storage.get_step_order(game.id)
+        expected = [USER_OFFSET + i for i in range(self.players)]
+        if order != expected:
+            raise AssertionError("chat {}: step order {} != {}".format(peer_id, order[:5], expected[:5]))
+        if self.app.database:
+            async with self.app.database.session() as session:
+                steps = (await session.execute(
+                    select(StepOrderModel.step_number)
+                    .where(StepOrderModel.game_id == game.id)
+                    .order_by(StepOrderModel.step_number)
+                )).scalars().all()
+            if steps != list(range(1, self.players + 1)):
+                raise AssertionError("chat {}: step numbers {}".format(peer_id, steps[:10]))
+
+    async def run(self, mode, rounds: int, stub) -> dict:
+        timings = []
+        queries = []
+        vk_calls = []
+        for i in range(rounds + 1):
+            self._peer += 1
+            before_queries = self.queries
+            before_vk = sum(stub.calls.values())
+            started = time.perf_counter()
+            await mode(self._peer)
+            elapsed = time.perf_counter() - started
+            await self.check(self._peer)
+            # Первый прогон - прогрев
+            if i:
+                timings.append(elapsed)
+                queries.append(self.queries - before_queries)
+                vk_calls.append(sum(stub.calls.values()) - before_vk)
+        return {
+            "median_ms": statistics.median(timings) * 1000,
+            "max_ms": max(timings) * 1000,
+            "queries": statistics.median(queries),
+            "vk_calls": statistics.median(vk_calls),
+        }
+
+
+async def main(args: argparse.Namespace) -> int:
+    random.seed(args.random_seed)
+    app, stub = await boot_app(args.config, args.storage)
+    try:
+        storm = JoinStorm(app, args.players)
+        print("{} players per chat, {} storage".format(args.players, app.config.storage.backend))
+        print("{:<12} {:>10} {:>10} {:>8} {:>8}".format("mode", "median ms", "max ms", "queries", "vk"))
+        for name, mode in (("one_by_one", storm.one_by_one), ("batched", storm.batched)):
+            r = await storm.run(mode, args.rounds, stub)
+            print("{:<12} {:>10.2f} {:>10.2f} {:>8} {:>8}".format(
+                name, r["median_ms"], r["max_ms"], r["queries"], r["vk_calls"]
+            ))
+    finally:
+        await close_app(app)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark many players joining one chat at once")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--storage", choices=("postgres", "memory"), help="override the storage backend")
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--random-seed", type=int, default=1)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,98 @@
+"""Бенчмарк /admin.search_words (WordAccessor.search_words) на локальном Postgres.
+
+Миграции должны быть накатаны (pg_trgm и GIN-индексы). --seed дозаполняет
+words синтетическими словами до --words строк.
+
+    python -m tools.bench_search --seed --words 1000000 --queries 200
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import func, select, text
+
+from app.admin.models import WordModel
+from tools.common import CONFIG_PATH, boot_app, close_app, percentile
+
+# md5 в hex переводится в кириллицу, чтобы триграммы были похожи на настоящие слова
+SEED_SQL = (
+    "INSERT INTO words (key, \"desc\", is_used) "
+    "SELECT translate(substr(md5(g::text), 1, 6 + g % 5), '0123456789abcdef', 'абвгдежзиклмнопр'), "
+    "'загадка ' || translate(substr(md5((g * 7)::text), 1, 12), '0123456789abcdef', 'абвгдежзиклмнопр'), "
+    "false FROM generate_series(:start, :stop) g "
+    "ON CONFLICT (key) DO NOTHING"
+)
+
+
+async def seed(app, words: int):
+    async with app.database.session.begin() as session:
+        have = (await session.execute(select(func.count(WordModel.id)))).scalar()
+        if have >= words:
+            return
+        print("Seeding {} words...".format(words - have))
+        for start in range(have + 1, words + 1, 100000):
+            await session.execute(text(SEED_SQL), {"start": start, "stop": min(words, start + 99999)})
+    async with app.database._engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE words"))
+
+
+def mutate(key: str) -> str:
+    # Опечатка или окончание, как у "машина" / "машины"
+    if len(key) > 4 and random.random() < 0.5:
+        return key[:-1] + random.choice("аыеи")
+    return key[:max(3, len(key) - 2)]
+
+
+async def main(args: argparse.Namespace) -> int:
+    random.seed(args.random_seed)
+    app, _ = await boot_app(args.config)
+    try:
+        if args.seed:
+            await seed(app, args.words)
+        async with app.database.session() as session:
+            keys = (await session.execute(
+                select(WordModel.key).order_by(func.random()).limit(args.queries)
+            )).scalars().all()
+        if not keys:
+            print("words table is empty, run with --seed")
+            return 1
+        queries = [mutate(key) for key in keys]
+
+        async with app.database.session() as session:
+            plan = (await session.execute(text(
+                'EXPLAIN SELECT id FROM words WHERE key % :q OR "desc" % :q OR key LIKE :q || \'%\' LIMIT 20'
+            ), {"q": queries[0]})).scalars().all()
+        print("\n".join(plan))
+
+        timings = []
+        hits = []
+        for query in queries:
+            started = time.perf_counter()
+            found = await app.store.admins.search_words(query, args.limit)
+            timings.append(time.perf_counter() - started)
+            hits.append(len(found))
+    finally:
+        await close_app(app)
+
+    print("{} queries: p50 {:.2f}ms, p95 {:.2f}ms, p99 {:.2f}ms, max {:.2f}ms; {:.1f} hits on average".format(
+        len(timings),
+        percentile(timings, 0.5) * 1000, percentile(timings, 0.95) * 1000,
+        percentile(timings, 0.99) * 1000, max(timings) * 1000,
+        statistics.mean(hits),
+    ))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark trigram word search")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--seed", action="store_true")
+    parser.add_argument("--words", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--random-seed", type=int, default=1)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,75 @@
+import os
+from collections import Counter
+from typing import Optional
+
+from app.diagnostics.budget import count_vk_call
+from app.store.vk_api.decoder import PollMessage, PollObject, PollUpdate
+from app.web.app import Application, setup_app
+from app.web.config import Config
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "config.yml")
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def make_update(peer_id: int, user_id: int, text: str, message_id: int = 0) -> PollUpdate:
+    return PollUpdate(
+        type="message_new",
+        object=PollObject(
+            message=PollMessage(
+                vk_user_id=user_id,
+                from_id=peer_id,
+                text=text,
+                id=message_id,
+            )
+        ),
+    )
+
+
+class StubVkApi:
+    """Подменяет исходящие вызовы VkApiAccessor и только считает их."""
+
+    def __init__(self):
+        self.calls = Counter()
+
+    async def send_message(self, message) -> None:
+        self.calls["messages.send"] += 1
+        count_vk_call()
+
+    async def get_user_info(self, _id):
+        self.calls["users.get"] += 1
+        count_vk_call()
+        return {"response": [
+            {"id": int(user_id), "first_name": "Player", "last_name": user_id}
+            for user_id in str(_id).split(",")
+        ]}
+
+
+async def boot_app(config_path: str = CONFIG_PATH, storage: Optional[str] = None) -> tuple[Application, StubVkApi]:
+    """Приложение с подключённым хранилищем, но без long poll и без обращений к VK.
+
+    storage подменяет backend из конфига, например memory - без базы.
+    """
+    def configure(config: Config):
+        if storage:
+            config.storage.backend = storage
+        config.database.echo = False
+        # Сценарии шлют команды одного игрока без пауз, лимиты их бы отбросили
+        config.ingress.enabled = False
+
+    app = setup_app(config_path, configure)
+    await app.storage.connect()
+    stub = StubVkApi()
+    app.store.vk_api.send_message = stub.send_message
+    app.store.vk_api.get_user_info = stub.get_user_info
+    return app, stub
+
+
+async def close_app(app: Application):
+    await app.store.bots_manager.shutdown()
+    await app.storage.disconnect()
@@ -0,0 +1,158 @@
+"""Локальная замена VK API для нагрузочного тестирования.
+
+Отдаёт методы, которые использует VkApiAccessor: groups.getLongPollServer,
+messages.send, users.get, execute и long poll сервер (act=a_check).
+
+    python -m tools.fake_vk --port 8081
+
+и в config.yml: bot.api_url: http://127.0.0.1:8081/method/
+Сообщения от "игроков" добавляются через POST /_push {"peer_id", "from_id", "text"}.
+Задержка и ошибки методов (не long poll) задаются --latency/--jitter/--error-rate
+или на лету через POST /_chaos {"latency", "jitter", "error_rate"}.
+"""
+import argparse
+import asyncio
+import random
+import time
+import typing
+from collections import Counter
+
+from aiohttp import web
+
+PEER_OFFSET = 2000000000
+
+
+class FakeVk:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.events: list[dict] = []
+        self.calls: Counter = Counter()
+        self.sent: list[tuple[float, int, str]] = []
+        self.on_send: typing.Optional[typing.Callable[[int, str], None]] = None
+        self._new_events = asyncio.Event()
+        self._message_id = 0
+        self._runner: typing.Optional[web.AppRunner] = None
+
+    @property
+    def api_url(self) -> str:
+        return "http://{}:{}/method/".format(self.host, self.port)
+
+    def push_message(self, peer_id: int, from_id: int, text: str) -> int:
+        self._message_id += 1
+        self.events.append({
+            "type": "message_new",
+            "object": {
+                "message": {
+                    "id": self._message_id,
+                    "from_id": from_id,
+                    "peer_id": peer_id,
+                    "text": text,
+                    "date": int(time.time()),
+                }
+            },
+        })
+        self._new_events.set()
+        return self._message_id
+
+    async def _params(self, request: web.Request) -> dict:
+        params = dict(request.query)
+        if request.can_read_body:
+            params.update(await request.post())
+        return params
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls[method] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.calls["errors"] += 1
+            return web.json_response({"error": {"error_code": 10, "error_msg": "Internal server error"}})
+        if method == "groups.getLongPollServer":
+            response = {
+                "key": "fake",
+                "server": "http://{}:{}/lp".format(self.host, self.port),
+                "ts": str(len(self.events) + 1),
+            }
+        elif method == "messages.send":
+            peer_id = int(params["peer_id"])
+            text = params.get("message", "")
+            self.sent.append((time.perf_counter(), peer_id, text))
+            if self.on_send:
+                self.on_send(peer_id, text)
+            response = len(self.sent)
+        elif method == "users.get":
+            response = [
+                {"id": int(_id), "first_name": "Player", "last_name": str(_id)}
+                for _id in str(params.get("user_ids", "")).split(",") if _id
+            ]
+        elif method == "execute":
+            response = []
+        else:
+            return web.json_response({"error": {"error_code": 3, "error_msg": "Unknown method passed"}})
+        return web.json_response({"response": response})
+
+    async def handle_long_poll(self, request: web.Request) -> web.Response:
+        self.calls["a_check"] += 1
+        ts = int(request.query.get("ts", len(self.events) + 1))
+        wait = float(request.query.get("wait", 25))
+        if ts > len(self.events):
+            self._new_events.clear()
+            try:
+                await asyncio.wait_for(self._new_events.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        updates = self.events[ts - 1:]
+        return web.json_response({"ts": str(len(self.events) + 1), "updates": updates})
+
+    async def handle_push(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        message_id = self.push_message(int(data["peer_id"]), int(data["from_id"]), data["text"])
+        return web.json_response({"id": message_id})
+
+    async def handle_chaos(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        self.latency = float(data.get("latency", self.latency))
+        self.jitter = float(data.get("jitter", self.jitter))
+        self.error_rate = float(data.get("error_rate", self.error_rate))
+        return web.json_response({"latency": self.latency, "jitter": self.jitter, "error_rate": self.error_rate})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/method/{method}", self.handle_method)
+        app.router.add_get("/lp", self.handle_long_poll)
+        app.router.add_post("/_push", self.handle_push)
+        app.router.add_post("/_chaos", self.handle_chaos)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake VK API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every method call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with error 10")
+    args = parser.parse_args()
+    fake = FakeVk(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    web.run_app(fake.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
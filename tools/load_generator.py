@@ -0,0 +1,213 @@
+"""Синтетическая нагрузка на бота без обращения к настоящему VK.
+
+Поднимает tools.fake_vk, запускает приложение бота в этом же процессе
+(база из config.yml, схема должна быть накатана alembic upgrade head)
+и разыгрывает полные игры в N чатах по M игроков.
+
+    python -m tools.load_generator --chats 20 --players 4 --games 2 --rate 5
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Optional
+
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+
+from app.admin.models import WordModel
+from app.web.app import setup_app
+from tools.common import CONFIG_PATH, percentile
+from tools.fake_vk import FakeVk, PEER_OFFSET
+
+LETTERS = "абвгдежзийклмнопрстуфхцчшщыэюя"
+
+
+def random_words(count: int) -> dict[str, str]:
+    words = {}
+    keys = set()
+    while len(words) < count:
+        key = "".join(random.choice(LETTERS) for _ in range(random.randint(5, 9)))
+        if key not in keys:
+            keys.add(key)
+            words["Загадка №{}".format(len(words))] = key
+    return words
+
+
+class Chat:
+    def __init__(self, peer_id: int, players: list[int]):
+        self.peer_id = peer_id
+        self.players = players
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.current: Optional[int] = None
+        self.word: Optional[str] = None
+        self.state: Optional[str] = None
+        self.finished = False
+
+
+class LoadGenerator:
+    def __init__(self, fake: FakeVk, args: argparse.Namespace, words: dict[str, str]):
+        self.fake = fake
+        self.args = args
+        self.words = words
+        self.chats: dict[int, Chat] = {}
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.sent: Counter = Counter()
+        self.timeouts: Counter = Counter()
+        fake.on_send = self.on_send
+
+    def on_send(self, peer_id: int, text: str):
+        chat = self.chats.get(peer_id)
+        if chat:
+            chat.inbox.put_nowait((time.perf_counter(), text))
+
+    def observe(self, chat: Chat, text: str):
+        if text.startswith("Ходит "):
+            try:
+                chat.current = int(text.rsplit(" ", 1)[1])
+            except ValueError:
+                pass
+        elif "Загадка: " in text:
+            chat.state = text.split("\n", 1)[0]
+            chat.word = self.words.get(text.split("Загадка: ", 1)[1].strip())
+        elif text.startswith("Буква ") and "есть в слове: " in text:
+            chat.state = text.rsplit(": ", 1)[1]
+        elif text.startswith("Вы завершили игру"):
+            chat.finished = True
+
+    def drain(self, chat: Chat):
+        while not chat.inbox.empty():
+            self.observe(chat, chat.inbox.get_nowait()[1])
+
+    async def command(self, chat: Chat, from_id: int, text: str):
+        self.drain(chat)
+        name = text.split(" ", 1)[0]
+        self.sent[name] += 1
+        started = time.perf_counter()
+        self.fake.push_message(chat.peer_id, from_id, text)
+        try:
+            received, reply = await asyncio.wait_for(chat.inbox.get(), timeout=self.args.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[name] += 1
+            return
+        self.latencies[name].append(received - started)
+        self.observe(chat, reply)
+        # Дочитываем остальные ответы на эту команду
+        while True:
+            try:
+                _, reply = await asyncio.wait_for(chat.inbox.get(), timeout=self.args.settle)
+            except asyncio.TimeoutError:
+                break
+            self.observe(chat, reply)
+
+    def next_move(self, chat: Chat, tried: set[str]) -> str:
+        miss = random.random() < self.args.miss_ratio
+        hidden = chat.state.count("*") if chat.state else len(chat.word)
+        if hidden <= len(chat.word) // 2:
+            return "/слово {}".format(chat.word[::-1] if miss else chat.word)
+        letters = set(chat.word) - tried if not miss else set(LETTERS) - set(chat.word) - tried
+        letter = random.choice(sorted(letters or set(LETTERS) - tried))
+        tried.add(letter)
+        return "/буква {}".format(letter)
+
+    async def play_chat(self, chat: Chat):
+        interval = 1 / self.args.rate
+        for _ in range(self.args.games):
+            chat.word, chat.state, chat.finished = None, None, False
+            for player in chat.players:
+                await self.command(chat, player, "/играть")
+                await asyncio.sleep(interval)
+            chat.current = chat.players[0]
+            await self.command(chat, chat.players[0], "/начать")
+            tried: set[str] = set()
+            moves = 0
+            while chat.word and not chat.finished and moves < self.args.max_moves:
+                await asyncio.sleep(interval)
+                await self.command(chat, chat.current or chat.players[0], self.next_move(chat, tried))
+                moves += 1
+            if not chat.finished:
+                await self.command(chat, chat.players[0], "/завершить")
+
+    async def run(self) -> float:
+        for i in range(self.args.chats):
+            peer_id = PEER_OFFSET + i + 1
+            players = [(i + 1) * 1000 + j + 1 for j in range(self.args.players)]
+            self.chats[peer_id] = Chat(peer_id, players)
+        started = time.perf_counter()
+        await asyncio.gather(*(self.play_chat(chat) for chat in self.chats.values()))
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float, queries: int):
+        answered = sum(len(v) for v in self.latencies.values())
+        total = sum(self.sent.values())
+        print("Commands sent: {}, answered: {}, timed out: {}".format(total, answered, sum(self.timeouts.values())))
+        print("Elapsed: {:.2f}s, throughput: {:.1f} cmd/s".format(elapsed, answered / elapsed if elapsed else 0))
+        print("DB queries: {} ({:.1f} per command)".format(queries, queries / total if total else 0))
+        print("VK calls: {}".format(dict(self.fake.calls)))
+        print("{:<12} {:>7} {:>9} {:>9} {:>9} {:>8}".format("command", "count", "p50 ms", "p95 ms", "p99 ms", "timeout"))
+        every = [v for values in self.latencies.values() for v in values]
+        for name, values in sorted(self.latencies.items()) + [("all", every)]:
+            print("{:<12} {:>7} {:>9.1f} {:>9.1f} {:>9.1f} {:>8}".format(
+                name, len(values),
+                percentile(values, 0.5) * 1000, percentile(values, 0.95) * 1000, percentile(values, 0.99) * 1000,
+                self.timeouts[name] if name != "all" else sum(self.timeouts.values()),
+            ))
+
+
+async def seed_words(app, words: dict[str, str]):
+    async with app.database.session.begin() as session:
+        await session.execute(
+            insert(WordModel)
+            .values([{"key": key, "desc": desc, "is_used": False} for desc, key in words.items()])
+            .on_conflict_do_nothing(index_elements=["key"])
+        )
+
+
+async def main(args: argparse.Namespace):
+    random.seed(args.seed)
+    fake = FakeVk(port=args.port)
+    await fake.start()
+
+    app = setup_app(args.config)
+    app.config.bot.api_url = fake.api_url
+    app.config.database.echo = False
+    app.config.ingress.enabled = not args.no_ingress
+    words = random_words(args.chats * args.games * 2)
+    generator = LoadGenerator(fake, args, words)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await app.bootstrap.wait_ready()
+    print("Ready in {:.3f}s".format(app.bootstrap.total))
+    queries = Counter()
+    event.listen(app.database._engine.sync_engine, "after_cursor_execute",
+                 lambda *_: queries.update(["total"]))
+    try:
+        await seed_words(app, words)
+        # Пул слов заполнен при запуске, до засева
+        app.store.bots_manager.word_pool.clear()
+        queries.clear()
+        elapsed = await generator.run()
+        generator.report(elapsed, queries["total"])
+    finally:
+        await runner.cleanup()
+        await fake.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic load for the bot against a fake VK API")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--no-ingress", action="store_true", help="disable rate limits and load shedding")
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--games", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=5.0, help="commands per second per chat")
+    parser.add_argument("--miss-ratio", type=float, default=0.3)
+    parser.add_argument("--max-moves", type=int, default=40)
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for a reply")
+    parser.add_argument("--settle", type=float, default=0.05, help="seconds to collect follow-up replies")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,134 @@
+"""Несколько экземпляров бота на одном Postgres с арендой чатов.
+
+Поднимает tools.fake_vk и --nodes процессов бота с leases.enabled, которые
+читают один long poll. Раунд за раундом в каждый из --chats чатов пишется
+неизвестная команда; на неё бот отвечает правилами, и ответ в раунде должен
+быть ровно один. После --kill-after раундов первый экземпляр убивается
+SIGKILL: его чаты молчат, пока не истечёт аренда (--ttl), затем их
+забирают оставшиеся.
+
+Аренда и пересылка живут в Postgres, поэтому и сценарий только для него:
+с storage.backend: memory у каждого экземпляра своя память и аренда не
+работает. В тесты он не входит, его запускают вручную на стенде с базой.
+
+    python -m tools.multi_node --nodes 3 --chats 30 --ttl 6
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from app.store.bot.manager import GAME_RULES
+from app.web.app import setup_app
+from app.web.config import Config
+from tools.common import CONFIG_PATH
+from tools.fake_vk import FakeVk, PEER_OFFSET
+
+PLAYER = 940000001
+
+
+async def node(args: argparse.Namespace) -> int:
+    def configure(config: Config):
+        config.bot.api_url = args.api_url
+        config.database.echo = False
+        config.ingress.enabled = False
+        config.leases.enabled = True
+        config.leases.node = args.name
+        config.leases.ttl = args.ttl
+        config.leases.heartbeat = args.ttl / 3
+
+    app = setup_app(args.config, configure)
+    if app.config.storage.backend != "postgres":
+        print("multi_node needs storage.backend: postgres", file=sys.stderr)
+        return 1
+    runner = web.AppRunner(app)
+    # Запуск и остановка те же, что у web.run_app, но без HTTP-сервера
+    await runner.setup()
+    try:
+        await app.bootstrap.wait_ready()
+        print(app.store.bots_manager.leases.node, flush=True)
+        stopped = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+        await stopped.wait()
+    finally:
+        await runner.cleanup()
+    return 0
+
+
+async def start_node(args: argparse.Namespace, api_url: str, name: str) -> tuple[asyncio.subprocess.Process, str]:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "tools.multi_node", "--config", args.config, "--node", "--name", name,
+        "--api-url", api_url, "--ttl", str(args.ttl),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    name = (await process.stdout.readline()).decode().strip()
+    if not name:
+        raise RuntimeError("node {} exited before it was ready".format(process.pid))
+    return process, name
+
+
+async def main(args: argparse.Namespace) -> int:
+    fake = FakeVk(port=args.port)
+    replies = Counter()
+    fake.on_send = lambda peer_id, text: replies.update([peer_id]) if text == GAME_RULES else None
+    await fake.start()
+    nodes = []
+    # Каждый прогон - свои чаты, чтобы не наткнуться на аренду прошлого
+    first_peer = PEER_OFFSET + os.getpid() % 10000 * 1000
+    peers = [first_peer + i for i in range(args.chats)]
+    totals = Counter()
+    try:
+        for number in range(args.nodes):
+            nodes.append(await start_node(args, fake.api_url, "node-{}-{}".format(os.getpid(), number)))
+        print("nodes: {}".format(", ".join(name for _, name in nodes)))
+        print("{:>5} {:>8} {:>6} {:>6} {:>6}".format("round", "t, s", "ok", "lost", "dup"))
+        killed_at = None
+        began = time.monotonic()
+        for round_number in range(1, args.rounds + 1):
+            if round_number == args.kill_after + 1:
+                nodes[0][0].send_signal(signal.SIGKILL)
+                killed_at = time.monotonic()
+                print("killed {}".format(nodes[0][1]))
+            replies.clear()
+            for peer_id in peers:
+                fake.push_message(peer_id, PLAYER, "/помощь")
+            await asyncio.sleep(args.interval)
+            counts = Counter(min(replies[peer_id], 2) for peer_id in peers)
+            totals.update(ok=counts[1], lost=counts[0], dup=counts[2])
+            print("{:>5} {:>8.1f} {:>6} {:>6} {:>6}".format(
+                round_number, time.monotonic() - began, counts[1], counts[0], counts[2]
+            ))
+            if killed_at and not counts[0]:
+                print("all chats answered {:.1f}s after the kill".format(time.monotonic() - killed_at))
+                killed_at = None
+    finally:
+        for process, _ in nodes:
+            if process.returncode is None:
+                process.send_signal(signal.SIGTERM)
+        for process, _ in nodes:
+            await process.wait()
+        await fake.stop()
+    print("total ok {ok}, lost {lost}, duplicated {dup}".format(**totals))
+    return 0 if not totals["dup"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several bot instances with chat leases against a fake VK")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--port", type=int, default=8083)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--chats", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--kill-after", type=int, default=4, help="rounds before the first node is killed")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between rounds")
+    parser.add_argument("--ttl", type=float, default=6.0, help="lease ttl, heartbeat is a third of it")
+    parser.add_argument("--node", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--name", help=argparse.SUPPRESS)
+    parser.add_argument("--api-url", help=argparse.SUPPRESS)
+    parsed = parser.parse_args()
+    sys.exit(asyncio.run(node(parsed) if parsed.node else main(parsed)))
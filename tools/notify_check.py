@@ -0,0 +1,92 @@
+"""Проверка инвалидации кэшей через LISTEN/NOTIFY двумя экземплярами бота на одном Postgres.
+
+Первый экземпляр (этот процесс) создаёт игру, кэширует её и выборку слов,
+затем запускает второй экземпляр отдельным процессом. Тот добавляет слово
+и отменяет игру, а первый ждёт, пока ровно эти записи выпадут из его кэшей,
+и печатает задержку уведомления.
+
+    python -m tools.notify_check
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from app.store.bot.manager import CANCEL
+from app.store.storage.postgres import GAME_CHANNEL
+from tools.common import CONFIG_PATH, boot_app, close_app
+
+PEER_OFFSET = 7000000000
+PLAYER = 930000001
+
+
+async def other_instance(args: argparse.Namespace) -> int:
+    app, _ = await boot_app(args.config)
+    try:
+        await app.store.admins.create_word("notify{}".format(args.peer), "Проверка уведомлений")
+        # Время до изменения: в задержку входит и сам UPDATE
+        print(time.time(), flush=True)
+        await app.storage.set_game_status(args.peer, CANCEL)
+    finally:
+        await close_app(app)
+    return 0
+
+
+async def wait_for(condition, timeout: float) -> bool:
+    stop_at = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > stop_at:
+            return False
+        await asyncio.sleep(0.005)
+    return True
+
+
+async def main(args: argparse.Namespace) -> int:
+    app, _ = await boot_app(args.config)
+    storage = app.storage
+    admins = app.store.admins
+    peer_id = PEER_OFFSET + random.randint(1, 10 ** 6)
+    other_peer = peer_id + 1
+    try:
+        if not getattr(storage, "cache_size", 0):
+            print("Needs the postgres storage with storage.notify on")
+            return 1
+        await app.store.bots_manager.join_players(peer_id, [PLAYER])
+        await app.store.bots_manager.join_players(other_peer, [PLAYER])
+        version = await admins.current_version()
+        notified = []
+        await app.database.listen(GAME_CHANNEL, lambda message: notified.append(time.time()))
+        child = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "tools.notify_check", "--config", args.config, "--child", "--peer", str(peer_id),
+            stdout=asyncio.subprocess.PIPE,
+        )
+        out, _ = await child.communicate()
+        changed_at = float(out.split()[-1])
+        game_evicted = await wait_for(lambda: peer_id not in storage.games, args.timeout)
+        words_bumped = await wait_for(lambda: admins.version is None, args.timeout)
+        words_bumped = words_bumped and await admins.current_version() > version
+        game = await storage.get_game(peer_id)
+        checks = {
+            "game evicted": game_evicted,
+            "fresh status read": game is not None and game.status == CANCEL,
+            "other game kept": other_peer in storage.games,
+            "word caches reset": words_bumped,
+        }
+        for name, ok in checks.items():
+            print("{:<20} {}".format(name, "ok" if ok else "FAIL"))
+        if notified:
+            print("change to notification {:.1f}ms".format((notified[-1] - changed_at) * 1000))
+        return 0 if all(checks.values()) else 1
+    finally:
+        await close_app(app)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check cross-instance cache invalidation over LISTEN/NOTIFY")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--peer", type=int, help=argparse.SUPPRESS)
+    parsed = parser.parse_args()
+    sys.exit(asyncio.run(other_instance(parsed) if parsed.child else main(parsed)))
@@ -0,0 +1,104 @@
+"""Воспроизведение записанного long poll трафика через Poller и BotManager.
+
+Запись включается в config.yml (recorder.enabled). Исходящие вызовы VK
+заглушены, база - локальный Postgres из конфига.
+
+    python -m tools.replay longpoll.rec --speed 1     # как в оригинале
+    python -m tools.replay longpoll.rec --speed 10    # в 10 раз быстрее
+    python -m tools.replay longpoll.rec --speed 0     # без пауз
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from app.store.vk_api.poller import Poller
+from app.store.vk_api.recorder import read_recording
+from tools.common import CONFIG_PATH, boot_app, close_app, percentile
+
+
+class ReplaySource:
+    """Подставляется вместо VkApiAccessor.poll и отдаёт записанные пачки по расписанию."""
+
+    def __init__(self, app, path: str, speed: float):
+        self.app = app
+        self.records = list(read_recording(path))
+        self.speed = speed
+        self.position = 0
+        self.started = None
+        self.lags: list[float] = []
+        self.batch_times: list[float] = []
+        self.updates = 0
+        self.done = asyncio.Event()
+        self._handled_at = None
+
+    async def poll(self):
+        now = time.perf_counter()
+        if self._handled_at is not None:
+            self.batch_times.append(now - self._handled_at)
+        if self.position >= len(self.records):
+            self.done.set()
+            await asyncio.Event().wait()
+        if self.started is None:
+            self.started = now
+        recorded_at, data = self.records[self.position]
+        if self.speed > 0:
+            due = self.started + (recorded_at - self.records[0][0]) / self.speed
+            if due > now:
+                await asyncio.sleep(due - now)
+            self.lags.append(max(0.0, time.perf_counter() - due))
+        self.position += 1
+        updates = self.app.store.vk_api.parse_updates(data)
+        self.updates += len(updates)
+        self._handled_at = time.perf_counter()
+        return updates
+
+
+async def main(args: argparse.Namespace) -> int:
+    app, stub = await boot_app(args.config)
+    source = ReplaySource(app, args.path, args.speed)
+    if not source.records:
+        print("Recording is empty")
+        return 1
+    app.store.vk_api.poll = source.poll
+    poller = Poller(store=app.store)
+    started = time.perf_counter()
+    try:
+        await poller.start()
+        await source.done.wait()
+        elapsed = time.perf_counter() - started
+        await poller.stop()
+    finally:
+        await close_app(app)
+
+    result = {
+        "batches": len(source.records),
+        "updates": source.updates,
+        "elapsed_s": elapsed,
+        "updates_per_s": source.updates / elapsed if elapsed else 0,
+        "batch_p50_ms": percentile(source.batch_times, 0.5) * 1000,
+        "batch_p95_ms": percentile(source.batch_times, 0.95) * 1000,
+        "max_lag_ms": max(source.lags, default=0) * 1000,
+        "vk_calls": dict(stub.calls),
+        "metrics": app.metrics.snapshot()["summaries"],
+    }
+    print("Replayed {batches} batches, {updates} updates in {elapsed_s:.2f}s ({updates_per_s:.1f} updates/s)".format(
+        **result
+    ))
+    print("Handler time per batch: p50 {batch_p50_ms:.1f}ms, p95 {batch_p95_ms:.1f}ms; "
+          "max lag behind schedule {max_lag_ms:.1f}ms".format(**result))
+    print("VK calls: {}".format(result["vk_calls"]))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded long poll traffic")
+    parser.add_argument("path")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = original pace, N = N times faster, 0 = no pauses")
+    parser.add_argument("--save", help="write the summary as JSON")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,66 @@
+"""Сверка игр с журналом событий.
+
+Для каждой идущей игры (или для чатов из --peer) состояние собирается из
+game_events и сравнивается со строкой games и очками из scores. Так
+проверяется, что по журналу можно восстановить игру и таблицу очков.
+
+    python -m tools.replay_events
+    python -m tools.replay_events --peer 2000000001 --verbose
+"""
+import argparse
+import asyncio
+import sys
+
+from app.store.bot.manager import PREPARE, START
+from tools.common import CONFIG_PATH, boot_app, close_app
+
+
+async def check_chat(app, peer_id: int, verbose: bool) -> bool:
+    game = await app.storage.get_game(peer_id)
+    if game is None:
+        print("{}: no game".format(peer_id))
+        return False
+    state = await app.store.bots_manager.event_log.rebuild(game.id)
+    if state is None:
+        print("{}: game {} has no events".format(peer_id, game.id))
+        return False
+    results = dict(await app.storage.game_results(game.id))
+    mismatches = {
+        name: (expected, actual)
+        for name, expected, actual in (
+            ("status", game.status, state.status),
+            ("word_state", game.word_state, state.word_state),
+            ("whos_step", game.whos_step, state.whos_step),
+            ("scores", results, dict(state.scores)),
+        )
+        if expected != actual
+    }
+    if mismatches or verbose:
+        print("{}: game {}, {} players, {} turns{}".format(
+            peer_id, game.id, len(state.players), state.turns,
+            "".join(", {} {!r} != {!r}".format(name, *values) for name, values in mismatches.items()),
+        ))
+    return not mismatches
+
+
+async def main(args: argparse.Namespace) -> int:
+    app, _ = await boot_app(args.config)
+    try:
+        peers = args.peer or [
+            peer_id for status in (PREPARE, START) for peer_id in await app.storage.games_with_status(status)
+        ]
+        ok = 0
+        for peer_id in peers:
+            ok += await check_chat(app, peer_id, args.verbose)
+        print("{} of {} games match their event log".format(ok, len(peers)))
+    finally:
+        await close_app(app)
+    return 0 if ok == len(peers) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild games from the event log and compare with the games table")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--peer", type=int, action="append", help="chat to check, repeatable")
+    parser.add_argument("--verbose", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
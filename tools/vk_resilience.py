@@ -0,0 +1,97 @@
+"""Поведение исходящих вызовов VK при деградации: AIMD-предел и размыкатель цепи.
+
+Поднимает tools.fake_vk и гоняет --callers параллельных "обработчиков"
+(messages.send + имена через BotManager.get_names) по фазам: VK здоров,
+VK тормозит, VK отвечает ошибками, VK восстановился. База не нужна.
+
+    python -m tools.vk_resilience --callers 50 --phase-seconds 10
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import Counter
+
+from app.store.vk_api.dataclasses import Message
+from app.web.app import setup_app
+from tools.common import CONFIG_PATH, percentile
+from tools.fake_vk import FakeVk, PEER_OFFSET
+
+PHASES = [
+    ("healthy", {"latency": 0.02, "jitter": 0.02, "error_rate": 0.0}),
+    ("slow", {"latency": 2.0, "jitter": 1.0, "error_rate": 0.0}),
+    ("failing", {"latency": 0.05, "jitter": 0.0, "error_rate": 1.0}),
+    ("recovered", {"latency": 0.02, "jitter": 0.02, "error_rate": 0.0}),
+]
+
+
+def degraded_calls(app) -> float:
+    return sum(value for key, value in app.metrics.counters.items() if key.startswith("vk.degraded"))
+
+
+async def caller(app, stop_at: float, latencies: list[float], outcomes: Counter):
+    manager = app.store.bots_manager
+    while time.monotonic() < stop_at:
+        player = random.randint(1, 200)
+        started = time.perf_counter()
+        before = degraded_calls(app)
+        await app.store.vk_api.send_message(Message(user_id=PEER_OFFSET + 1, text="Ходит игрок"))
+        await manager.get_names([player])
+        latencies.append(time.perf_counter() - started)
+        # Счётчик общий, поэтому при параллельных вызовах оценка приблизительная
+        outcomes["degraded" if degraded_calls(app) > before else "ok"] += 1
+        await asyncio.sleep(0.05)
+
+
+async def main(args: argparse.Namespace) -> int:
+    random.seed(1)
+    fake = FakeVk(port=args.port)
+    await fake.start()
+    app = setup_app(args.config)
+    app.config.bot.api_url = fake.api_url
+    config = app.config.vk_http
+    config.timeout = args.timeout
+    config.breaker_reset = args.breaker_reset
+    config.queue_timeout = args.queue_timeout
+    # Кэш имён живёт недолго, чтобы users.get тоже попадал под деградацию
+    config.names_ttl = 1.0
+    vk = app.store.vk_api
+    await vk.transport.open()
+    transport = vk.transport
+    try:
+        print("{:<10} {:>7} {:>7} {:>9} {:>9} {:>9} {:>7} {:>10} {}".format(
+            "phase", "ok", "degr", "p50 ms", "p95 ms", "max ms", "limit", "vk calls", "breakers"
+        ))
+        for name, chaos in PHASES:
+            for key, value in chaos.items():
+                setattr(fake, key, value)
+            fake.calls.clear()
+            latencies: list[float] = []
+            outcomes = Counter()
+            stop_at = time.monotonic() + args.phase_seconds
+            await asyncio.gather(*(caller(app, stop_at, latencies, outcomes) for _ in range(args.callers)))
+            print("{:<10} {:>7} {:>7} {:>9.1f} {:>9.1f} {:>9.1f} {:>7.1f} {:>10} {}".format(
+                name, outcomes["ok"], outcomes["degraded"],
+                percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000,
+                max(latencies, default=0) * 1000, transport.limiter.limit,
+                sum(count for method, count in fake.calls.items() if method != "errors"),
+                {method: breaker.state for method, breaker in transport.breakers.items()},
+            ))
+    finally:
+        await transport.close()
+        await fake.stop()
+    print({key: value for key, value in app.metrics.snapshot()["counters"].items() if key.startswith("vk.")})
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exercise the VK limiter and circuit breaker against a fake VK")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--callers", type=int, default=50)
+    parser.add_argument("--phase-seconds", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=3.0, help="per-call VK timeout")
+    parser.add_argument("--queue-timeout", type=float, default=1.0)
+    parser.add_argument("--breaker-reset", type=float, default=3.0)
+    sys.exit(asyncio.run(main(parser.parse_args())))